@@ -0,0 +1,138 @@
+"""
+Admission control and LLM load shedding for the StyleMe RAG service.
+
+Two layers keep a traffic spike from cascading into Groq rate-limit errors
+and unbounded queues:
+
+- AdmissionController caps the search requests in flight per process.
+  Requests beyond the cap get 503 with Retry-After straight away.
+- LLMLimiter guards the LLM step. It uses a bounded concurrency semaphore
+  with a short wait queue and a token bucket for the provider's request
+  rate. A request that can't get a slot within its wait budget raises
+  LLMShedError, and the endpoint answers from retrieval alone instead.
+"""
+
+import threading
+import time
+from functools import wraps
+
+from flask import jsonify
+
+
+class LLMShedError(Exception):
+    """The LLM step was shed; `reason` is queue_full, timeout or rate_limited"""
+
+    def __init__(self, reason):
+        super().__init__(f"LLM call shed ({reason})")
+        self.reason = reason
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, up to `burst` saved up"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline):
+        """Take one token, waiting until `deadline` (monotonic); False if it can't be had in time"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            # Don't sleep if the token can't arrive before the deadline anyway
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class LLMLimiter:
+    """Concurrency semaphore + wait queue + optional token bucket around LLM calls"""
+
+    def __init__(self, max_concurrency=8, max_queue=32, rate=0.0, burst=1):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.active = 0
+
+    def acquire(self, timeout):
+        """Take an LLM slot, waiting up to `timeout` seconds; raises LLMShedError if none is free"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                raise LLMShedError('queue_full')
+            self.waiting += 1
+        try:
+            acquired = self._slots.acquire(timeout=max(timeout, 0))
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not acquired:
+            raise LLMShedError('timeout')
+
+        if self.bucket is not None and not self.bucket.acquire(deadline):
+            self._slots.release()
+            raise LLMShedError('rate_limited')
+        with self._lock:
+            self.active += 1
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+        self._slots.release()
+
+
+class AdmissionController:
+    """Process-wide cap on requests in flight; 0 disables the cap"""
+
+    def __init__(self, max_in_flight=64, retry_after=1, on_reject=None):
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.on_reject = on_reject
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def try_enter(self):
+        with self._lock:
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def admit(self, endpoint):
+        """Decorator: reject with 503 + Retry-After when the process is saturated"""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.try_enter():
+                    if self.on_reject:
+                        self.on_reject(endpoint)
+                    response = jsonify({
+                        'success': False,
+                        'error': 'Service is overloaded, please retry shortly'
+                    })
+                    response.status_code = 503
+                    response.headers['Retry-After'] = str(self.retry_after)
+                    return response
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.leave()
+            return wrapper
+        return decorator
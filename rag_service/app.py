@@ -1,6 +1,7 @@
 import os
 import time
 import json
+import threading
 import mysql.connector
 from dotenv import load_dotenv
 from flask import Flask, request, jsonify
@@ -8,12 +9,37 @@ from flask_cors import CORS
 
 # LangChain imports
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough, RunnableParallel
+from langchain_core.runnables import RunnablePassthrough, RunnableParallel, RunnableLambda
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.documents import Document
 from langchain_community.vectorstores import FAISS
 from langchain_huggingface import HuggingFaceEmbeddings
 
+import index_sync
+import index_versions
+import log_maintenance
+import memory_report
+import metrics
+from admission import AdmissionController, LLMLimiter, LLMShedError
+from binary_index import BinaryCodes
+from cache_warmer import CacheWarmer
+from catalog import CatalogSnapshot, parse_fields
+from embedding_batcher import EmbeddingBatcher, configure_inference_threads
+from create_vector_store import build_product_document, fetch_current_watermark, fetch_products, save_index_artifacts
+import profiler
+import tracing
+from history_cache import SearchHistoryCache
+from index_partitions import PartitionedIndex
+from live_attributes import LiveAttributes
+from preference_scoring import ProductAttributeMatrix, score_products
+from pagination import SearchCursors, SearchSession
+from shards import ShardedSearch, load_documents_only
+from query_cache import QueryCache, normalize_query
+from similar_products import SimilarProducts
+from stub_llm import StubChatModel, create_latency_sampler
+from suggest import SuggestionIndex, load_popular_queries
+from user_profiles import UserPreferenceVectors, blend
+
 # Groq imports
 try:
     from langchain_groq import ChatGroq
@@ -44,12 +70,63 @@ DB_CONFIG = {
 
 # Global LangChain components (initialized on startup)
 vector_store = None
-retriever = None
+embeddings = None
+embedding_batcher = None
+llm_model = None
 rag_chain = None
 current_provider = None
+product_attributes = None
+catalog = None
+live_attributes = None
+index_partitions = None
+binary_codes = None
+similar_products = None
+suggestions = None
+index_version = None
+index_watcher = None
+index_watermark = None
+product_syncer = None
+# False in prefork workers that leave cache warm-ups (at start and after index swaps) to another worker
+cache_warmup_enabled = True
+index_swap_lock = threading.Lock()
+# Searches share it; CDC upserts take it exclusively while they modify the index in place
+index_update_lock = index_sync.ReadWriteLock()
+max_retrieved_docs = int(os.getenv('MAX_RETRIEVED_DOCS', 20))
+out_of_stock_overfetch = float(os.getenv('OUT_OF_STOCK_OVERFETCH', 2))
+
+# Overload protection: LLM slots (concurrency, short queue, provider rate) and a global in-flight cap
+llm_limiter = LLMLimiter(
+    max_concurrency=int(os.getenv('LLM_MAX_CONCURRENCY', 8)),
+    max_queue=int(os.getenv('LLM_MAX_QUEUE', 32)),
+    rate=float(os.getenv('LLM_RATE_LIMIT', 0)),
+    burst=int(os.getenv('LLM_RATE_BURST', 10))
+)
+llm_wait_budget = float(os.getenv('LLM_QUEUE_TIMEOUT_MS', 500)) / 1000
+admission = AdmissionController(
+    max_in_flight=int(os.getenv('MAX_IN_FLIGHT_REQUESTS', 64)),
+    retry_after=int(os.getenv('RETRY_AFTER_SECONDS', 1)),
+    on_reject=lambda endpoint: metrics.ADMISSION_REJECTED.inc(endpoint=endpoint)
+)
+# Sharded mode: vectors live in shard_server.py processes and queries fan out to all of them
+shard_endpoints = [endpoint.strip() for endpoint in os.getenv('SHARD_ENDPOINTS', '').split(',') if endpoint.strip()]
+shard_search = ShardedSearch(
+    shard_endpoints,
+    timeout=float(os.getenv('SHARD_TIMEOUT_MS', 500)) / 1000,
+    on_shard=lambda endpoint, result, seconds: record_shard_request(endpoint, result, seconds)
+) if shard_endpoints else None
+
+metrics.LLM_QUEUE_DEPTH.set_function(lambda: llm_limiter.waiting)
+metrics.LLM_ACTIVE.set_function(lambda: llm_limiter.active)
+
+metrics.INDEX_SIZE.set_function(lambda: vector_store.index.ntotal if vector_store else 0)
+metrics.INDEX_SYNC_AGE.set_function(
+    lambda: time.time() - product_syncer.last_sync_time if product_syncer and product_syncer.last_sync_time else 0)
 
 def get_llm_provider():
-    """Determine which LLM provider to use - Groq only"""
+    """Determine which LLM provider to use - Groq, or the local stub for load tests"""
+    if os.getenv('LLM_PROVIDER', 'groq').lower() == 'stub':
+        return 'stub'
+
     if not GROQ_AVAILABLE:
         raise ValueError("Groq is not available. Install with: pip install langchain-groq groq")
     
@@ -59,7 +136,11 @@ def get_llm_provider():
     return 'groq'
 
 def create_llm():
-    """Create Groq LLM instance"""
+    """Create Groq LLM instance (or the stub model when LLM_PROVIDER=stub)"""
+    if current_provider == 'stub':
+        print("🧪 Using stub LLM - no Groq calls will be made")
+        return StubChatModel(latency_sampler=create_latency_sampler())
+
     return ChatGroq(
         model=os.getenv('GROQ_LLM_MODEL', 'llama-3.1-8b-instant'),
         temperature=float(os.getenv('TEMPERATURE', 0)),
@@ -67,9 +148,13 @@ def create_llm():
         groq_api_key=os.getenv('GROQ_API_KEY')
     )
 
-def initialize_rag_system():
-    """Initialize the LangChain RAG system components"""
-    global vector_store, retriever, rag_chain, current_provider
+def initialize_rag_system(background=True):
+    """Initialize the LangChain RAG system components.
+    
+    With background=False no threads are started (see start_background_tasks), so a
+    pre-fork master can load the model and index and then fork its workers safely.
+    """
+    global embeddings, embedding_batcher, llm_model, rag_chain, current_provider, max_retrieved_docs
     
     try:
         print("🚀 Initializing RAG system...")
@@ -90,29 +175,267 @@ def initialize_rag_system():
         )
         print("✅ HuggingFace embeddings loaded successfully")
         
-        # Load the local FAISS vector store
+        # Concurrent query embeddings share one batched forward pass
+        threads = configure_inference_threads(int(os.getenv('EMBEDDING_THREADS', 0)))
+        if threads:
+            print(f"🧵 Embedding inference threads: {threads}")
+        batch_wait_ms = float(os.getenv('EMBEDDING_BATCH_WAIT_MS', 3))
+        if batch_wait_ms > 0 and embedding_batcher is None:
+            embedding_batcher = EmbeddingBatcher(
+                embeddings.embed_documents,
+                max_batch_size=int(os.getenv('EMBEDDING_BATCH_MAX_SIZE', 32)),
+                max_wait_ms=batch_wait_ms,
+                on_batch=record_embedding_batch,
+                timeout=float(os.getenv('EMBEDDING_BATCH_TIMEOUT_MS', 2000)) / 1000,
+                fallback=embeddings.embed_query
+            )
+        
+        # Load the published index version (or a legacy unversioned index)
         vector_store_path = os.getenv('VECTOR_STORE_PATH', 'faiss_index')
-        if not os.path.exists(vector_store_path):
-            raise FileNotFoundError(f"Vector store not found at {vector_store_path}. Please run create_vector_store.py first.")
+        version, version_dir = index_versions.resolve(vector_store_path)
+        swap_index(version, version_dir)
+        
+        # Number of products retrieved per query
+        max_retrieved_docs = int(os.getenv('MAX_RETRIEVED_DOCS', 20))
+        
+        # Initialize the Groq LLM
+        llm_model = create_llm()
+        
+        # Build the retrieval + LLM chain
+        rag_chain = create_rag_chain()
+        
+        print(f"✅ RAG system initialized successfully with {current_provider.upper()}!")
+        if background:
+            start_background_tasks()
+        return True
         
-        vector_store = FAISS.load_local(
-            vector_store_path, 
+    except Exception as e:
+        print(f"❌ Failed to initialize RAG system: {e}")
+        return False
+
+def start_background_tasks(cache_warmup=True):
+    """Start this process's threads: embedding batcher, index watcher, CDC sync, cache warm-up and log maintenance"""
+    global cache_warmup_enabled
+    
+    cache_warmup_enabled = cache_warmup
+    if embedding_batcher is not None:
+        embedding_batcher.start()
+    start_index_watcher(os.getenv('VECTOR_STORE_PATH', 'faiss_index'))
+    start_product_sync()
+    warm_caches()
+    if log_maintainer.interval > 0:
+        log_maintainer.start()
+
+def load_index(version_dir):
+    """Load a FAISS index directory and the lookup structures built alongside it"""
+    if shard_search is not None:
+        # Documents only; shard servers hold the vectors (built with INDEX_SHARDS)
+        store = load_documents_only(version_dir, embeddings)
+    else:
+        store = FAISS.load_local(
+            version_dir, 
             embeddings, 
             allow_dangerous_deserialization=True
         )
-        
-        # Create retriever with configurable parameters
-        max_docs = int(os.getenv('MAX_RETRIEVED_DOCS', 20))
-        retriever = vector_store.as_retriever(
-            search_type="similarity",
-            search_kwargs={'k': max_docs}
+    
+    # Columnar product attributes for vectorized preference scoring
+    attributes = ProductAttributeMatrix.from_vector_store(store)
+    print(f"📊 Product attribute matrix built for {len(attributes)} products")
+    
+    # Catalog snapshot for hydrated search responses (saved with the index)
+    snapshot = CatalogSnapshot.load(version_dir)
+    if snapshot is None:
+        print("⚠️ No catalog snapshot found - rebuild the index for images and slugs in hydrated results")
+        docstore_ids = store.index_to_docstore_id
+        snapshot = CatalogSnapshot.from_documents(
+            [store.docstore.search(docstore_ids[row]) for row in range(len(docstore_ids))]
         )
+    print(f"🗂️ Catalog snapshot loaded with {len(snapshot)} products")
+    
+    # Price and stock, applied at query time and updated in place by the CDC sync
+    live = LiveAttributes.load(version_dir)
+    if live is None:
+        print("⚠️ No live attributes found - using catalog snapshot prices and stock (rebuild the index)")
+        live = LiveAttributes.from_catalog(snapshot)
+    
+    # Precomputed neighbour lists for /products/<id>/similar (built with SIMILAR_PRODUCTS_K)
+    similar = SimilarProducts.load(store, version_dir)
+    if similar is not None:
+        print(f"🧭 Loaded {similar.k} similar products for each of {len(similar.product_ids)} products")
+    
+    if shard_search is not None:
+        print(f"🧱 Searching {len(shard_search.endpoints)} shards: {', '.join(shard_search.endpoints)}")
+        return store, attributes, snapshot, live, None, None, similar
+    
+    # Per-gender/category sub-indexes for routed search (built with INDEX_PARTITION_BY)
+    partitions = PartitionedIndex.load(
+        store,
+        version_dir,
+        centroid_margin=float(os.getenv('PARTITION_CENTROID_MARGIN', 0.05)),
+        max_categories=int(os.getenv('PARTITION_MAX_CATEGORIES', 2))
+    )
+    if partitions is not None:
+        print(f"🧩 Loaded {len(partitions.partitions)} index partitions by {', '.join(partitions.partition_by)}")
+    
+    # 1-bit codes for two-stage search (built with INDEX_BINARY_CODES)
+    codes = None
+    oversample = int(os.getenv('BINARY_OVERSAMPLE', 20))
+    if oversample > 0:
+        codes = BinaryCodes.load(
+            store,
+            version_dir,
+            oversample=oversample,
+            rescore_depth=int(os.getenv('BINARY_RESCORE_DEPTH', 0))
+        )
+        if codes is not None:
+            print(f"🔢 Loaded binary codes for two-stage search (oversample {oversample}x)")
+    
+    return store, attributes, snapshot, live, partitions, codes, similar
+
+def swap_index(version, version_dir=None):
+    """Load an index version fully, then swap it in; in-flight requests finish on the old one"""
+    global vector_store, product_attributes, catalog, live_attributes, index_partitions, binary_codes, similar_products
+    global index_version, index_watermark
+    
+    vector_store_path = os.getenv('VECTOR_STORE_PATH', 'faiss_index')
+    with index_swap_lock:
+        if version is not None and version == index_version:
+            # A refresh in this process and the version watcher can both try to swap the same new version in
+            if index_watcher is not None:
+                index_watcher.version = version
+            print(f"📌 Index version {version} is already being served")
+            return
+        if version is not None:
+            if version not in {m['version'] for m in index_versions.list_versions(vector_store_path)}:
+                raise ValueError(f"Unknown index version: {version}")
+            version_dir = version_dir or index_versions.version_path(vector_store_path, version)
+            if not index_versions.verify(vector_store_path, version):
+                metrics.INDEX_RELOADS.inc(result='checksum_mismatch')
+                raise ValueError(f"Index version {version} failed checksum verification")
         
-        # Initialize the Groq LLM
-        model = create_llm()
-        
-        # Define the RAG prompt template (optimized for Groq)
-        template = """You are a helpful fashion assistant for StyleMe e-commerce store. Analyze the context and provide relevant product recommendations.
+        try:
+            loaded = load_index(version_dir)
+        except Exception:
+            metrics.INDEX_RELOADS.inc(result='failure')
+            raise
+        (vector_store, product_attributes, catalog, live_attributes,
+         index_partitions, binary_codes, similar_products) = loaded
+        index_version = version
+        watermark = index_versions.load_manifest(vector_store_path, version).get('source_watermark') if version else None
+        index_watermark = tuple(watermark) if watermark else None
+        if index_watcher is not None:
+            index_watcher.version = version
+    
+    # Cached answers refer to the old index's products
+    result_cache.clear()
+    warm_caches()
+    refresh_suggestions()
+    
+    # Re-apply product changes made since this version was built
+    if product_syncer is not None and index_watermark is not None:
+        product_syncer.reset(index_watermark)
+    
+    metrics.INDEX_RELOADS.inc(result='success')
+    print(f"📌 Serving index version {version or '(unversioned)'}")
+
+def refresh_suggestions():
+    """Rebuild the autocomplete index from the catalog snapshot and popular searches"""
+    global suggestions
+    
+    started = time.time()
+    popular = load_popular_queries(
+        connect=lambda: mysql.connector.connect(**DB_CONFIG),
+        window_hours=int(os.getenv('SUGGEST_WINDOW_HOURS', 720)),
+        limit=int(os.getenv('SUGGEST_QUERY_LIMIT', 5000))
+    )
+    suggestions = SuggestionIndex.build(catalog, popular, max_k=int(os.getenv('SUGGEST_MAX_K', 10)))
+    print(f"🔤 Suggestions built from {len(catalog)} products and {len(popular)} popular queries "
+          f"in {(time.time() - started) * 1000:.0f}ms")
+
+def start_index_watcher(vector_store_path):
+    """Watch the CURRENT pointer so refreshes and rollbacks by any worker reach this one"""
+    global index_watcher
+    
+    interval = float(os.getenv('INDEX_WATCH_INTERVAL', 2))
+    if index_watcher is not None or interval <= 0:
+        return
+    index_watcher = index_versions.VersionWatcher(
+        vector_store_path,
+        on_change=swap_index,
+        interval=interval,
+        version=index_version
+    ).start()
+    print(f"👀 Watching {vector_store_path} for new index versions every {interval:g}s")
+
+def apply_product_changes(products):
+    """Apply a batch of changed product rows: price/stock in place, re-embedding only changed documents"""
+    global product_attributes, catalog, similar_products
+    
+    with index_swap_lock:
+        # Price and stock are array writes; the index only changes when a product's document does
+        flipped = live_attributes.update(products)
+        changed = index_sync.document_changes(vector_store, product_attributes, products)
+        if changed and shard_search is not None:
+            # Shard servers hold the vectors; document changes wait for the next published version
+            print(f"⚠️ {len(changed)} changed product documents will be indexed with the next version")
+            changed = []
+        if changed:
+            # Embed first; searches only wait for the in-place upsert itself
+            documents, vectors = index_sync.embed_changes(embeddings, changed)
+            with index_update_lock.write():
+                removed, added = index_sync.apply_changes(vector_store, product_attributes, changed, documents, vectors)
+                product_attributes = product_attributes.updated(removed, documents)
+                if index_partitions is not None:
+                    index_partitions.upsert(removed, added)
+                if binary_codes is not None:
+                    binary_codes.upsert(removed, added)
+            catalog = catalog.with_changes(changed)
+            if similar_products is not None:
+                similar_products = similar_products.updated(vector_store, product_attributes, changed)
+    
+    # Cached answers may name products that changed or went out of (or back into) stock
+    if changed or flipped:
+        result_cache.clear()
+    metrics.INDEX_SYNC_CHANGES.inc(len(changed), action='upsert')
+    metrics.INDEX_SYNC_CHANGES.inc(len(products) - len(changed), action='attributes')
+    print(f"🔁 Synced {len(products)} changed products ({len(changed)} re-embedded, "
+          f"{len(products) - len(changed)} price/stock only, {flipped} availability changes)")
+
+# History, preferences and profile parts of the result cache key a warm-up writes (a guest's)
+WARMED_RESULT_KEY = ("No previous searches", json.dumps({}, sort_keys=True), None)
+
+def warm_query(query):
+    """Run one popular query as a guest so both query caches hold it"""
+    _, retrieval_only = run_rag_chain(query, "No previous searches")
+    if retrieval_only:
+        raise RuntimeError("LLM busy - answer not cached")
+
+def warm_caches():
+    """Start a background warm-up of the query caches from popular searches"""
+    if cache_warmup_enabled and cache_warmer.top_n > 0 and rag_chain is not None and cache_warmer.start():
+        print(f"🔥 Warming caches with the top {cache_warmer.top_n} queries of the last {cache_warmer.window_hours}h")
+
+def start_product_sync():
+    """Poll products.updated_at and apply changes to the index incrementally"""
+    global product_syncer
+    
+    interval = float(os.getenv('CDC_SYNC_INTERVAL', 5))
+    if product_syncer is not None or interval <= 0:
+        return
+    product_syncer = index_sync.ProductSyncer(
+        connect=lambda: mysql.connector.connect(**DB_CONFIG),
+        on_batch=apply_product_changes,
+        watermark=index_watermark,
+        interval=interval,
+        batch_size=int(os.getenv('CDC_BATCH_SIZE', 500)),
+        on_lag=metrics.INDEX_SYNC_LAG.observe
+    ).start()
+    print(f"🔁 Syncing product changes from products.updated_at every {interval:g}s")
+
+def create_rag_chain():
+    """Create the LCEL chain over the loaded vector store, embeddings and LLM"""
+    # Define the RAG prompt template (optimized for Groq)
+    template = """You are a helpful fashion assistant for StyleMe e-commerce store. Analyze the context and provide relevant product recommendations.
 
 PRODUCT CONTEXT:
 {context}
@@ -128,49 +451,202 @@ RESPONSE FORMAT: Only product IDs separated by commas (example: 12, 45, 8)
 
 Product IDs:"""
 
-        prompt = ChatPromptTemplate.from_template(template)
-        
-        # Create the LangChain Expression Language (LCEL) chain
-        rag_chain = (
-            RunnableParallel({
-                "context": lambda x: format_context(retriever.invoke(x["question"])),
-                "history": lambda x: x["history"],
-                "question": lambda x: x["question"]
-            })
-            | prompt
-            | model
-            | StrOutputParser()
-        )
-        
-        print(f"✅ RAG system initialized successfully with {current_provider.upper()}!")
-        return True
-        
-    except Exception as e:
-        print(f"❌ Failed to initialize RAG system: {e}")
-        return False
+    prompt = ChatPromptTemplate.from_template(template)
+    
+    # Create the LangChain Expression Language (LCEL) chain.
+    # Retrieval and the LLM call run as separate steps so each stage is timed.
+    return (
+        RunnableParallel({
+            "context": lambda x: build_context(x["question"], x.get("preferences"), x.get("profile"), x.get("docs")),
+            "history": lambda x: x["history"],
+            "question": lambda x: x["question"]
+        })
+        | prompt
+        | RunnableLambda(call_llm)
+        | StrOutputParser()
+    )
+
+def record_embedding_batch(batch_size, queue_delays):
+    metrics.EMBEDDING_BATCH_SIZE.observe(batch_size)
+    for delay in queue_delays:
+        metrics.EMBEDDING_QUEUE_DELAY.observe(delay)
+
+def record_shard_request(endpoint, result, seconds):
+    metrics.SHARD_REQUESTS.inc(shard=endpoint, result=result)
+    if result == 'ok':
+        metrics.SHARD_LATENCY.observe(seconds, shard=endpoint)
+
+def embed_query_cached(question):
+    """Embed a query, reusing the embedding of the same normalized query"""
+    cache_key = normalize_query(question)
+    query_vector = embedding_cache.get(cache_key)
+    if query_vector is not None:
+        cache_warmer.record_hit('embedding', cache_key)
+    else:
+        if embedding_batcher is not None:
+            query_vector = embedding_batcher.embed(question)
+        else:
+            query_vector = embeddings.embed_query(question)
+        embedding_cache.put(cache_key, query_vector)
+    return query_vector
+
+def retrieve_documents(question, k=None, preferences=None, profile=None):
+    """Top-k in-stock products for a question (stock is applied here from live attributes, not in the index)"""
+    k = k or max_retrieved_docs
+    if live_attributes is None:
+        return search_documents(question, k, preferences, profile)
+    
+    # Search deeper by up to OUT_OF_STOCK_OVERFETCH x k so dropping sold-out products still leaves k
+    docs = search_documents(question, live_attributes.fetch_depth(k, out_of_stock_overfetch), preferences, profile)
+    with metrics.stage_timer('stock_filter'):
+        available = live_attributes.in_stock([doc.metadata.get('product_id', -1) for doc in docs])
+        return [doc for doc, in_stock in zip(docs, available) if in_stock][:k]
+
+def search_documents(question, k, preferences=None, profile=None):
+    """Embed the query and run the FAISS similarity search (routed to partitions or two-stage when available)"""
+    with metrics.stage_timer('query_embedding'):
+        query_vector = embed_query_cached(question)
+    
+    # Routing uses the query alone; the search vector leans towards the user's profile
+    search_vector = blend(query_vector, profile, profile_blend_weight)
+    
+    if shard_search is not None:
+        # Scatter to every shard, gather and merge their top-k; a missing shard gives partial results
+        with metrics.stage_timer('shard_search'):
+            docs, failed = shard_search.search(search_vector, k)
+        if failed:
+            span = tracing.current_span()
+            if span is not None:
+                span.attributes['missing_shards'] = failed
+        return docs
+    
+    # CDC upserts change the index in place; they wait for searches in progress and vice versa
+    with index_update_lock.read():
+        return search_index(question, query_vector, search_vector, k, preferences)
+
+def search_index(question, query_vector, search_vector, k, preferences=None):
+    """Search the local FAISS index: routed partitions, two-stage binary or full (caller holds index_update_lock)"""
+    if index_partitions is not None:
+        with metrics.stage_timer('partition_routing'):
+            partitions, route = index_partitions.route(question, query_vector, preferences)
+            routing_span = tracing.current_span()
+            if routing_span is not None:
+                routing_span.attributes['route'] = route
+        
+        if partitions:
+            with metrics.stage_timer('faiss_search'):
+                docs, scanned = index_partitions.search(partitions, search_vector, k)
+            metrics.PARTITION_ROUTES.inc(route='routed')
+            metrics.VECTORS_SCANNED.inc(scanned, mode='partitioned')
+            return docs
+        metrics.PARTITION_ROUTES.inc(route='full')
+    
+    if binary_codes is not None:
+        # Hamming scan over 1-bit codes for candidates, then exact distances for those only
+        with metrics.stage_timer('binary_scan'):
+            rows = binary_codes.candidates(search_vector, k)
+        with metrics.stage_timer('exact_rescore'):
+            _, best = binary_codes.rescore(search_vector, rows, k)
+            docs = binary_codes.documents(best)
+        metrics.VECTORS_SCANNED.inc(binary_codes.ntotal, mode='binary')
+        metrics.VECTORS_SCANNED.inc(len(rows), mode='rescored')
+        return docs
+    
+    with metrics.stage_timer('faiss_search'):
+        docs = vector_store.similarity_search_by_vector(search_vector, k=k)
+    metrics.VECTORS_SCANNED.inc(vector_store.index.ntotal, mode='full')
+    return docs
+
+def run_rag_chain(question, history, preferences=None, profile=None):
+    """Invoke the RAG chain, answering repeated (query, history, preferences, profile) from the result cache.
+    
+    Returns (result string, retrieval_only) - retrieval_only is True when the LLM step was shed.
+    """
+    cache_key = (
+        normalize_query(question),
+        history,
+        json.dumps(preferences or {}, sort_keys=True),
+        profile.tobytes() if profile is not None else None
+    )
+    result = result_cache.get(cache_key)
+    if result is not None:
+        if cache_key[1:] == WARMED_RESULT_KEY:
+            cache_warmer.record_hit('result', cache_key[0])
+        return result, False
+    
+    # Retrieve before the chain so a shed LLM call can answer from the same documents
+    docs = retrieve_documents(question, preferences=preferences, profile=profile)
+    try:
+        result = rag_chain.invoke({
+            'question': question,
+            'history': history,
+            'preferences': preferences,
+            'profile': profile,
+            'docs': docs
+        })
+    except LLMShedError as e:
+        # Overloaded: answer in retrieval order instead of queueing for the LLM (not cached)
+        metrics.LLM_SHED.inc(reason=e.reason)
+        return ', '.join(str(doc.metadata.get('product_id')) for doc in docs[:10]), True
+    
+    result_cache.put(cache_key, result)
+    return result, False
+
+def retrieve_product_ids(question, k, preferences=None, profile=None):
+    """Product IDs in retrieval order, for extending a paginated result list"""
+    with metrics.stage_timer('pagination_retrieval'):
+        docs = retrieve_documents(question, k=k, preferences=preferences, profile=profile)
+    return [doc.metadata.get('product_id') for doc in docs]
+
+def build_context(question, preferences=None, profile=None, retrieved_docs=None):
+    """Format products for a question as prompt context, retrieving them unless the caller already has"""
+    if retrieved_docs is None:
+        retrieved_docs = retrieve_documents(question, preferences=preferences, profile=profile)
+    
+    with metrics.stage_timer('context_formatting'):
+        return format_context(retrieved_docs)
+
+def call_llm(prompt_value):
+    """Invoke the LLM within the concurrency/rate limiter, recording call latency and token usage"""
+    with metrics.stage_timer('llm_wait'):
+        llm_limiter.acquire(llm_wait_budget)
+    try:
+        with metrics.stage_timer('llm_call'):
+            message = llm_model.invoke(prompt_value)
+    finally:
+        llm_limiter.release()
+    
+    metrics.record_llm_usage(message)
+    return message
 
 def format_context(retrieved_docs):
     """Format retrieved documents for the prompt context"""
     if not retrieved_docs:
         return "No relevant products found."
     
+    # Current prices from the live attributes (they aren't part of the embedded text)
+    prices = live_attributes.effective_prices(
+        [doc.metadata.get('product_id', -1) for doc in retrieved_docs]) if live_attributes is not None else None
+    
     context_parts = []
     for i, doc in enumerate(retrieved_docs, 1):
         metadata = doc.metadata
         context_part = f"{i}. Product ID: {metadata.get('product_id', 'Unknown')}"
         context_part += f" | Content: {doc.page_content[:200]}..."
-        if metadata.get('price'):
-            context_part += f" | Price: Rs. {metadata['price']}"
+        price = prices[i - 1] if prices is not None else metadata.get('price')
+        if price:
+            context_part += f" | Price: Rs. {price:.2f}"
         context_parts.append(context_part)
     
     return "\n".join(context_parts)
 
-def get_user_search_history(user_id, limit=5):
-    """Retrieve recent search history for a user"""
+@metrics.timed('db_fetch_search_history')
+def fetch_search_history(user_id, limit):
+    """Read the most recent search queries for a user from the database"""
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+    
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        
         cursor.execute('''
             SELECT search_query 
             FROM user_search_history 
@@ -179,19 +655,142 @@ def get_user_search_history(user_id, limit=5):
             LIMIT %s
         ''', (user_id, limit))
         
-        history = [row[0] for row in cursor.fetchall()]
+        return [row[0] for row in cursor.fetchall()]
+    finally:
         cursor.close()
         conn.close()
+
+# Per-user ring buffers of recent queries, shared by both search endpoints
+history_cache = SearchHistoryCache(
+    fetch_search_history,
+    per_user=int(os.getenv('HISTORY_CACHE_PER_USER', max(int(os.getenv('HISTORY_LIMIT', 5)), 10))),
+    max_users=int(os.getenv('HISTORY_CACHE_MAX_USERS', 10000)),
+    max_bytes=int(os.getenv('HISTORY_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+)
+metrics.CACHE_REQUESTS.set_function(lambda: history_cache.hits, cache='history', result='hit')
+metrics.CACHE_REQUESTS.set_function(lambda: history_cache.misses, cache='history', result='miss')
+
+# Query embeddings (shared by all users) and LLM answers for repeated (query, history, preferences)
+embedding_cache = QueryCache(
+    max_entries=int(os.getenv('EMBEDDING_CACHE_SIZE', 10000)),
+    ttl=float(os.getenv('EMBEDDING_CACHE_TTL', 86400))
+)
+result_cache = QueryCache(
+    max_entries=int(os.getenv('RESULT_CACHE_SIZE', 5000)),
+    ttl=float(os.getenv('RESULT_CACHE_TTL', 3600))
+)
+metrics.CACHE_REQUESTS.set_function(lambda: embedding_cache.hits, cache='embedding', result='hit')
+metrics.CACHE_REQUESTS.set_function(lambda: embedding_cache.misses, cache='embedding', result='miss')
+metrics.CACHE_REQUESTS.set_function(lambda: result_cache.hits, cache='result', result='hit')
+metrics.CACHE_REQUESTS.set_function(lambda: result_cache.misses, cache='result', result='miss')
+
+# Warms both caches with popular searches (as a guest) after startup and index swaps
+cache_warmer = CacheWarmer(
+    connect=lambda: mysql.connector.connect(**DB_CONFIG),
+    warm_query=lambda query: warm_query(query),
+    top_n=int(os.getenv('CACHE_WARM_TOP_N', 100)),
+    window_hours=int(os.getenv('CACHE_WARM_WINDOW_HOURS', 168)),
+    concurrency=int(os.getenv('CACHE_WARM_CONCURRENCY', 2))
+)
+metrics.CACHE_WARM_COVERAGE.set_function(cache_warmer.embedding_coverage)
+metrics.CACHE_WARM_HITS.set_function(lambda: cache_warmer.hits['embedding'], cache='embedding')
+metrics.CACHE_WARM_HITS.set_function(lambda: cache_warmer.hits['result'], cache='result')
+
+# Indexes, daily rollups and retention pruning of the search log tables (one process at a time)
+log_maintainer = log_maintenance.from_env(
+    connect=lambda: mysql.connector.connect(**DB_CONFIG),
+    on_prune=lambda table, rows: metrics.LOG_ROWS_PRUNED.inc(rows, table=table)
+)
+
+# Ranked candidate lists behind search cursors; later pages are served from these
+search_cursors = SearchCursors(
+    retrieve=lambda question, k, preferences, profile: retrieve_product_ids(question, k, preferences, profile),
+    max_entries=int(os.getenv('PAGINATION_CACHE_SIZE', 10000)),
+    ttl=float(os.getenv('PAGINATION_TTL', 600)),
+    page_size=int(os.getenv('PAGINATION_PAGE_SIZE', 10)),
+    base_depth=max_retrieved_docs,
+    max_depth=int(os.getenv('PAGINATION_MAX_DEPTH', 200))
+)
+
+# Per-user exponentially decayed mean of query embeddings, blended into retrieval
+user_profiles = UserPreferenceVectors(
+    seed_loader=lambda user_id: [
+        embed_query_cached(query)
+        for query in reversed(history_cache.get(user_id, int(os.getenv('PROFILE_SEED_QUERIES', 10))))
+    ],
+    decay=float(os.getenv('PROFILE_DECAY', 0.8)),
+    max_users=int(os.getenv('PROFILE_MAX_USERS', 20000))
+)
+profile_blend_weight = float(os.getenv('PROFILE_BLEND_WEIGHT', 0.25))
+history_summary_max_chars = int(os.getenv('HISTORY_SUMMARY_MAX_CHARS', 100))
+
+def get_user_profile(user_id):
+    """Preference vector for a registered user, or None (guests, no history, errors)"""
+    try:
+        if not user_id or int(user_id) <= 0 or profile_blend_weight <= 0:
+            return None
+        return user_profiles.get(int(user_id))
+    except Exception as e:
+        metrics.record_error('user_profile', e)
+        print(f"Error loading user profile: {e}")
+        return None
+
+def update_user_profile(user_id, query):
+    """Fold a search into the user's preference vector"""
+    try:
+        if not user_id or int(user_id) <= 0 or profile_blend_weight <= 0:
+            return
+        user_profiles.update(int(user_id), embed_query_cached(query))
+    except Exception as e:
+        metrics.record_error('user_profile', e)
+        print(f"Error updating user profile: {e}")
+
+def parse_user_id(value):
+    """user_id from a request body (the PHP frontend sends it as a string); 0 for guests, ValueError if not an integer"""
+    if value in (None, ''):
+        return 0
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(value)
+    return int(value)
+
+def summarize_history(queries, max_chars=None):
+    """Distinct recent queries, newest first, cut to a fixed length for the prompt"""
+    max_chars = max_chars or history_summary_max_chars
+    seen, parts, length = set(), [], 0
+    for query in queries:
+        key = normalize_query(query)
+        if not key or key in seen:
+            continue
+        if parts and length + len(query) + 2 > max_chars:
+            break
+        seen.add(key)
+        parts.append(query[:max_chars])
+        length += len(parts[-1]) + 2
+    return ', '.join(parts)
+
+def get_user_search_history(user_id, limit=5):
+    """Short summary of a user's recent searches for the prompt (bounded length)"""
+    try:
+        # Guest users have no stored history
+        if not user_id or user_id <= 0:
+            return "No previous searches"
         
-        return ', '.join(history) if history else "No previous searches"
+        history = history_cache.get(user_id, limit)
+        return summarize_history(history) if history else "No previous searches"
         
     except Exception as e:
+        metrics.record_error('db_fetch_search_history', e)
         print(f"Error fetching search history: {e}")
         return "No previous searches"
 
+@metrics.timed('db_store_search_history')
 def store_search_history(user_id, query):
-    """Store user search query in history"""
+    """Store user search query in history (write-through to the history cache)"""
     try:
+        # Skip guest users - user_search_history requires a registered user
+        if not user_id or user_id <= 0:
+            return
+        
         conn = mysql.connector.connect(**DB_CONFIG)
         cursor = conn.cursor()
         
@@ -204,7 +803,10 @@ def store_search_history(user_id, query):
         cursor.close()
         conn.close()
         
+        history_cache.record(user_id, query)
+        
     except Exception as e:
+        metrics.record_error('db_store_search_history', e)
         print(f"Error storing search history: {e}")
 
 def format_search_history(history):
@@ -242,6 +844,7 @@ def parse_product_ids(result_str):
         
     return []
 
+@metrics.timed('db_log_user_search')
 def log_user_search(user_id, query, product_ids, preferences):
     """Log enhanced search with preferences for learning"""
     try:
@@ -262,8 +865,10 @@ def log_user_search(user_id, query, product_ids, preferences):
         conn.close()
         
     except Exception as e:
+        metrics.record_error('db_log_user_search', e)
         print(f"Error logging user search: {e}")
 
+@metrics.timed('db_log_search')
 def log_search(user_id, query, results_count, processing_time, enhanced_query=None):
     """Log search details for analytics"""
     try:
@@ -283,6 +888,7 @@ def log_search(user_id, query, results_count, processing_time, enhanced_query=No
         conn.close()
         
     except Exception as e:
+        metrics.record_error('db_log_search', e)
         print(f"Error logging search: {e}")
 
 @app.route('/')
@@ -304,6 +910,9 @@ def health_check():
     })
 
 @app.route('/search', methods=['POST'])
+@metrics.track_request('search')
+@tracing.traced_request('search')
+@admission.admit('search')
 def handle_search():
     """Handle search requests using LangChain RAG pipeline"""
     if not rag_chain:
@@ -326,66 +935,70 @@ def handle_search():
         if not all([user_id, query]):
             return jsonify({'error': 'Missing user_id or query'}), 400
         
+        try:
+            user_id = parse_user_id(user_id)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'user_id must be an integer'}), 400
+        
         if not query.strip():
             return jsonify({'error': 'Query cannot be empty'}), 400
         
+        try:
+            fields = parse_fields(data.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # Preference vector from earlier searches (before this one is stored)
+        profile = get_user_profile(user_id)
+        
         # Store search history
         store_search_history(user_id, query)
         
-        # Get user's search history for context
+        # Short summary of the user's recent searches for the prompt
         history = get_user_search_history(user_id, int(os.getenv('HISTORY_LIMIT', 5)))
         
         # Execute RAG chain
-        result_str = rag_chain.invoke({
-            'question': query.strip(),
-            'history': history
-        })
+        with tracing.span('rag_chain'):
+            result_str, retrieval_only = run_rag_chain(query.strip(), history, profile=profile)
+        
+        update_user_profile(user_id, query.strip())
         
         # Parse the comma-separated string of IDs into a list of integers
-        product_ids = []
-        try:
-            if result_str and result_str.strip():
-                # Clean and parse the result
-                cleaned_result = result_str.strip()
-                # Remove any non-numeric characters except commas and spaces
-                import re
-                cleaned_result = re.sub(r'[^\d,\s]', '', cleaned_result)
-                
-                # Split by comma and convert to integers
-                id_parts = [part.strip() for part in cleaned_result.split(',') if part.strip()]
-                product_ids = []
-                
-                for part in id_parts:
-                    if part.isdigit():
-                        product_ids.append(int(part))
-                
-                # Remove duplicates while preserving order
-                seen = set()
-                product_ids = [x for x in product_ids if not (x in seen or seen.add(x))]
-                
-        except (ValueError, AttributeError) as e:
-            print(f"Error parsing product IDs from result: {result_str}, Error: {e}")
-            product_ids = []
+        with metrics.stage_timer('id_parsing'):
+            product_ids = parse_product_ids(result_str)
         
         # Calculate processing time
         processing_time = round(time.time() - start_time, 3)
         
-        # Log the search for analytics
-        log_search(user_id, query, len(product_ids), processing_time, result_str)
+        # Log the search for analytics (the parsed IDs, not the raw LLM output)
+        log_search(user_id, query, len(product_ids), processing_time, ','.join(map(str, product_ids)))
+        
+        # Later pages continue from this ranking without another LLM call
+        next_cursor = search_cursors.start(SearchSession(query.strip(), product_ids, profile=profile), len(product_ids))
         
         # Return results with provider information
-        return jsonify({
+        response_data = {
             'success': True,
             'product_ids': product_ids,
             'query': query,
             'results_count': len(product_ids),
+            'next_cursor': next_cursor,
             'processing_time': processing_time,
             'history_considered': history != "No previous searches",
+            'profile_applied': profile is not None,
+            'retrieval_only': retrieval_only,
             'provider_used': current_provider,
             'service_version': '2.1.0-multi-provider'
-        })
+        }
+        
+        # Optional hydrated product records from the in-memory catalog snapshot
+        if fields:
+            response_data['products'] = catalog.hydrate(product_ids, fields, live_attributes)
+        
+        return jsonify(response_data)
         
     except Exception as e:
+        metrics.record_error('search', e)
         processing_time = round(time.time() - start_time, 3)
         error_message = f"Error processing search: {str(e)}"
         print(error_message)
@@ -397,6 +1010,9 @@ def handle_search():
         }), 500
 
 @app.route('/search_with_preferences', methods=['POST'])
+@metrics.track_request('search_with_preferences')
+@tracing.traced_request('search_with_preferences')
+@admission.admit('search_with_preferences')
 def search_with_preferences():
     """Enhanced search endpoint with user preferences and matching scores"""
     try:
@@ -408,40 +1024,60 @@ def search_with_preferences():
         
         if not query:
             return jsonify({'success': False, 'message': 'Query is required'}), 400
+        
+        try:
+            user_id = parse_user_id(user_id)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'user_id must be an integer'}), 400
+        
+        try:
+            fields = parse_fields(data.get('fields'))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
             
         print(f"🔍 Enhanced search: '{query}' for user {user_id}")
         print(f"📋 Preferences: {preferences}")
         
-        # Get user search history
-        history = get_user_search_history(user_id)
+        # Preference vector from earlier searches, then store and summarise history
+        profile = get_user_profile(user_id)
+        store_search_history(user_id, query)
+        history = get_user_search_history(user_id, int(os.getenv('HISTORY_LIMIT', 5)))
         
         # Create enhanced query incorporating preferences
-        enhanced_query = create_enhanced_query(query, preferences, context)
+        with metrics.stage_timer('query_enhancement'):
+            enhanced_query = create_enhanced_query(query, preferences, context)
         
         start_time = time.time()
         
         # Get search results
         print(f"🤖 Invoking RAG chain with enhanced query: {enhanced_query}")
-        results = rag_chain.invoke({
-            "question": enhanced_query,
-            "history": format_search_history(history)
-        })
+        with tracing.span('rag_chain'):
+            results, retrieval_only = run_rag_chain(enhanced_query, format_search_history(history), preferences, profile)
+        
+        update_user_profile(user_id, query)
         
         print(f"🔍 RAG chain raw results: {results}")
         
         processing_time = time.time() - start_time
         
         # Parse and validate product IDs
-        product_ids = parse_product_ids(results)
+        with metrics.stage_timer('id_parsing'):
+            product_ids = parse_product_ids(results)
         print(f"📦 Parsed product IDs: {product_ids}")
         
         # Calculate preference-based matching scores
-        matching_scores = calculate_preference_scores(product_ids, preferences, query)
+        with metrics.stage_timer('preference_scoring'):
+            matching_scores = calculate_preference_scores(product_ids, preferences, query)
         print(f"📊 Matching scores: {matching_scores}")
         
         # Log search for learning
         log_user_search(user_id, query, product_ids, preferences)
         
+        next_cursor = search_cursors.start(
+            SearchSession(enhanced_query, product_ids, preferences, profile, endpoint='search_with_preferences'),
+            len(product_ids)
+        )
+        
         response_data = {
             'success': True,
             'product_ids': product_ids,
@@ -450,17 +1086,25 @@ def search_with_preferences():
             'enhanced_query': enhanced_query,
             'preferences_applied': preferences,
             'results_count': len(product_ids),
+            'next_cursor': next_cursor,
             'processing_time': round(processing_time, 3),
             'provider_used': current_provider.upper(),
             'service_version': '2.1.0-enhanced',
-            'history_considered': len(history) > 0
+            'history_considered': history != "No previous searches",
+            'profile_applied': profile is not None,
+            'retrieval_only': retrieval_only
         }
         
+        # Optional hydrated product records from the in-memory catalog snapshot
+        if fields:
+            response_data['products'] = catalog.hydrate(product_ids, fields, live_attributes)
+        
         print(f"✅ Returning response: {response_data}")
         
         return jsonify(response_data)
         
     except Exception as e:
+        metrics.record_error('search_with_preferences', e)
         print(f"❌ Enhanced search error: {e}")
         return jsonify({
             'success': False,
@@ -468,6 +1112,59 @@ def search_with_preferences():
             'error_type': type(e).__name__
         }), 500
 
+@app.route('/search/page', methods=['POST'])
+@metrics.track_request('search_page')
+@tracing.traced_request('search_page')
+@admission.admit('search_page')
+def search_page():
+    """Next page of an earlier search, served from its cached candidate list"""
+    start_time = time.time()
+    data = request.get_json(silent=True) or {}
+    cursor = data.get('cursor')
+    if not cursor or not isinstance(cursor, str):
+        return jsonify({'error': 'Missing cursor'}), 400
+    
+    # A page size outside 1..max_depth would return the same cursor forever
+    page_size = data.get('page_size')
+    if page_size in (None, ''):
+        page_size = None
+    else:
+        try:
+            page_size = int(str(page_size))
+        except ValueError:
+            return jsonify({'error': 'page_size must be an integer'}), 400
+        if not 1 <= page_size <= search_cursors.max_depth:
+            return jsonify({'error': f'page_size must be between 1 and {search_cursors.max_depth}'}), 400
+    
+    try:
+        fields = parse_fields(data.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        session, product_ids, next_cursor = search_cursors.page(cursor, page_size)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except KeyError:
+        return jsonify({'error': 'Cursor expired - run the search again'}), 410
+    except Exception as e:
+        metrics.record_error('search_page', e)
+        print(f"Error serving search page: {e}")
+        return jsonify({'error': 'Internal server error during search processing'}), 500
+    
+    response_data = {
+        'success': True,
+        'product_ids': product_ids,
+        'results_count': len(product_ids),
+        'next_cursor': next_cursor,
+        'processing_time': round(time.time() - start_time, 3)
+    }
+    if session.preferences:
+        response_data['matching_scores'] = calculate_preference_scores(product_ids, session.preferences, session.question)
+    if fields:
+        response_data['products'] = catalog.hydrate(product_ids, fields, live_attributes)
+    return jsonify(response_data)
+
 def create_enhanced_query(query, preferences, context):
     """Create enhanced query incorporating user preferences"""
     enhanced_parts = [query]
@@ -502,70 +1199,96 @@ def create_enhanced_query(query, preferences, context):
 
 def calculate_preference_scores(product_ids, preferences, query):
     """Calculate preference-based matching scores for products"""
-    scores = []
+    # Rank position blended with attribute matches (style/category, color,
+    # budget distance, occasion, gender), computed in one vectorized pass
+    prices = live_attributes.effective_prices(product_ids) if live_attributes is not None else None
+    scores = score_products(product_attributes, product_ids, preferences, prices)
+    return [round(float(score), 3) for score in scores]
+
+@app.route('/suggest', methods=['GET'])
+@metrics.track_request('suggest')
+def suggest():
+    """Type-ahead completions for a prefix from product terms and popular searches"""
+    if suggestions is None:
+        return jsonify({'error': 'Suggestions not ready'}), 503
     
-    for product_id in product_ids:
-        # Base score from retrieval ranking
-        base_score = max(0.3, 1.0 - (len(scores) * 0.1))  # Decreasing score by position
-        
-        # This is a simplified version - in production, you'd fetch product details
-        # and calculate more sophisticated matching based on actual product attributes
-        preference_boost = 0.0
-        
-        # Style preference boost
-        if preferences.get('style_preferences'):
-            preference_boost += 0.1
-        
-        # Color preference boost
-        if preferences.get('color_preferences'):
-            preference_boost += 0.1
-        
-        # Budget consideration boost
-        if preferences.get('budget_max', 0) > 0:
-            preference_boost += 0.05
-        
-        # Occasion boost
-        if preferences.get('occasion'):
-            preference_boost += 0.05
-        
-        final_score = min(1.0, base_score + preference_boost)
-        scores.append(round(final_score, 3))
+    try:
+        k = int(request.args.get('k', 0)) or None
+    except ValueError:
+        return jsonify({'error': 'k must be an integer'}), 400
     
-    return scores
+    started = time.perf_counter()
+    results = suggestions.suggest(request.args.get('q', ''), k)
+    return jsonify({
+        'query': request.args.get('q', ''),
+        'suggestions': results,
+        'took_ms': round((time.perf_counter() - started) * 1000, 3)
+    })
+
+@app.route('/products/<int:product_id>/similar', methods=['GET'])
+@metrics.track_request('similar_products')
+def get_similar_products(product_id):
+    """Products most similar to one product, from the neighbour lists built with the index"""
+    if similar_products is None:
+        return jsonify({'error': 'Similar products not built - set SIMILAR_PRODUCTS_K and rebuild the vector store'}), 503
+    
+    # A k below 1 would slice from the end of the neighbour list; above the stored k returns them all
+    k = request.args.get('k')
+    if k in (None, ''):
+        k = similar_products.k
+    else:
+        try:
+            k = int(k)
+        except ValueError:
+            return jsonify({'error': 'k must be an integer'}), 400
+        if k < 1:
+            return jsonify({'error': 'k must be at least 1'}), 400
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    neighbors = similar_products.similar(product_id)
+    if neighbors is None:
+        return jsonify({'error': f'Product {product_id} is not in the index'}), 404
+    # Neighbours are precomputed over all products; sold-out ones are dropped at read time
+    available = live_attributes.in_stock(neighbors)
+    product_ids = [pid for pid, in_stock in zip(neighbors, available) if in_stock][:k]
+    
+    response_data = {
+        'success': True,
+        'product_id': product_id,
+        'product_ids': product_ids
+    }
+    if fields:
+        response_data['products'] = catalog.hydrate(product_ids, fields, live_attributes)
+    return jsonify(response_data)
 
 @app.route('/vector-store/refresh', methods=['POST'])
 def refresh_vector_store():
     """Refresh the vector store with latest product data"""
-    global vector_store, retriever, rag_chain
+    refresh_start = time.perf_counter()
+    refresh_result = 'failure'
     
     try:
         print("🔄 Starting vector store refresh...")
         
-        # Recreate the vector store with updated product data
-        success = create_vector_store_from_db()
+        # Build and publish a new index version with updated product data
+        version = create_vector_store_from_db()
         
-        if success:
-            # Reinitialize the RAG system components
-            initialize_success = initialize_rag_system()
+        if version:
+            # Swap it in here; other workers pick it up from the version pointer
+            swap_index(version)
+            print("✅ Vector store refreshed successfully!")
+            refresh_result = 'success'
             
-            if initialize_success:
-                print("✅ Vector store and RAG system refreshed successfully!")
-                
-                # Get updated stats
-                index = vector_store.index if vector_store else None
-                total_vectors = index.ntotal if index else 0
-                
-                return jsonify({
-                    'success': True,
-                    'message': 'Vector store refreshed successfully',
-                    'total_vectors': total_vectors,
-                    'timestamp': time.time()
-                })
-            else:
-                return jsonify({
-                    'success': False, 
-                    'message': 'Vector store created but RAG system initialization failed'
-                }), 500
+            return jsonify({
+                'success': True,
+                'message': 'Vector store refreshed successfully',
+                'version': version,
+                'total_vectors': len(vector_store.index_to_docstore_id),
+                'timestamp': time.time()
+            })
         else:
             return jsonify({
                 'success': False, 
@@ -573,11 +1296,15 @@ def refresh_vector_store():
             }), 500
             
     except Exception as e:
+        metrics.record_error('vector_store_refresh', e)
         print(f"❌ Vector store refresh failed: {e}")
         return jsonify({
             'success': False, 
             'message': f'Vector store refresh failed: {str(e)}'
         }), 500
+    
+    finally:
+        metrics.REFRESH_DURATION.observe(time.perf_counter() - refresh_start, result=refresh_result)
 
 @app.route('/vector-store/stats', methods=['GET'])
 def vector_store_stats():
@@ -595,8 +1322,43 @@ def vector_store_stats():
         # Try to get vector count from FAISS index
         total_vectors = vector_store.index.ntotal if hasattr(vector_store, 'index') else 0
         
+        # Build details recorded in the version manifest (absent for legacy indexes)
+        manifest = {}
+        if index_version is not None:
+            manifest = index_versions.load_manifest(os.getenv('VECTOR_STORE_PATH', 'faiss_index'), index_version)
+        build = {key: manifest.get(key) for key in (
+            'built_at', 'build_seconds', 'source_rows', 'model', 'index_spec', 'partition_by', 'binary_codes',
+            'shards', 'similar_products')}
+        
+        memory = memory_report.resource_report(
+            vector_store,
+            embeddings=embeddings,
+            catalog=catalog,
+            attributes=product_attributes,
+            partitions=index_partitions,
+            binary_codes=binary_codes,
+            similar_products=similar_products,
+            caches={
+                'embedding': embedding_cache.memory_bytes(),
+                'result': result_cache.memory_bytes(),
+                'cursors': search_cursors.sessions.memory_bytes(),
+                'history': history_cache.stats()['bytes'],
+                'profiles': user_profiles.stats()['bytes']
+            }
+        )
+        
         return jsonify({
             "total_vectors": total_vectors,
+            "version": index_version,
+            "index": memory_report.index_info(vector_store.index),
+            "build": build,
+            "memory": memory,
+            "partitions": index_partitions.stats() if index_partitions is not None else None,
+            "binary_codes": binary_codes.stats() if binary_codes is not None else None,
+            "similar_products": similar_products.stats() if similar_products is not None else None,
+            "live_attributes": live_attributes.stats() if live_attributes is not None else None,
+            "shards": shard_search.stats() if shard_search is not None else None,
+            "suggestions": suggestions.stats() if suggestions is not None else None,
             "status": "active" if total_vectors > 0 else "empty",
             "message": f"Vector store contains {total_vectors} vectors"
         })
@@ -608,24 +1370,51 @@ def vector_store_stats():
             "message": f"Error getting vector store stats: {str(e)}"
         })
 
+@app.route('/vector-store/versions', methods=['GET'])
+def list_index_versions():
+    """List saved index versions, newest first, marking the published one"""
+    vector_store_path = os.getenv('VECTOR_STORE_PATH', 'faiss_index')
+    published = index_versions.current_version(vector_store_path)
+    versions = [
+        dict(manifest, files=len(manifest['files']), published=manifest['version'] == published)
+        for manifest in index_versions.list_versions(vector_store_path)
+    ]
+    return jsonify({'serving': index_version, 'published': published, 'versions': versions})
+
+@app.route('/vector-store/rollback', methods=['POST'])
+def rollback_index_version():
+    """Publish an earlier index version (default: the previous one) and swap to it"""
+    if not admin_authorized():
+        return jsonify({'error': 'Admin token required'}), 403
+    
+    vector_store_path = os.getenv('VECTOR_STORE_PATH', 'faiss_index')
+    data = request.get_json(silent=True) or {}
+    target = data.get('version') or index_versions.previous_version(vector_store_path)
+    if target is None:
+        return jsonify({'success': False, 'message': 'No earlier index version to roll back to'}), 400
+    
+    try:
+        # Load first so a broken version is never published
+        swap_index(target)
+        index_versions.publish(vector_store_path, target)
+    except (ValueError, FileNotFoundError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    print(f"⏪ Rolled back to index version {target}")
+    return jsonify({'success': True, 'version': target, 'total_vectors': vector_store.index.ntotal})
+
 def create_vector_store_from_db():
-    """Create vector store from current database content"""
+    """Create and publish a new index version from current database content; returns the version"""
     try:
         # Get database connection
         conn = mysql.connector.connect(**DB_CONFIG)
         cursor = conn.cursor(dictionary=True)
         
-        # Fetch all products with category information
-        cursor.execute('''
-            SELECT p.id, p.name, p.description, p.brand, p.color, p.size, 
-                   p.occasion, p.gender, p.price, p.discount_price,
-                   c.name as category_name 
-            FROM products p 
-            LEFT JOIN categories c ON p.category_id = c.id 
-            WHERE p.stock > 0
-            ORDER BY p.id
-        ''')
-        products = cursor.fetchall()
+        # Fetch all products with category information (watermark first, so the CDC sync
+        # re-applies anything that changes while the index is being built)
+        build_started = time.time()
+        watermark = fetch_current_watermark(cursor)
+        products = fetch_products(cursor)
         print(f"📦 Fetched {len(products)} products from database")
         
         if not products:
@@ -633,46 +1422,7 @@ def create_vector_store_from_db():
             return False
         
         # Convert products to LangChain Document format
-        documents = []
-        for product in products:
-            # Create rich product description for better semantic search
-            page_content_parts = [
-                f"Product: {product['name']}",
-                f"Category: {product.get('category_name', 'Unknown')}",
-                f"Description: {product.get('description', 'No description available')}"
-            ]
-            
-            # Add optional details if they exist
-            if product.get('brand'):
-                page_content_parts.append(f"Brand: {product['brand']}")
-            if product.get('color'):
-                page_content_parts.append(f"Color: {product['color']}")
-            if product.get('size'):
-                page_content_parts.append(f"Size: {product['size']}")
-            if product.get('occasion'):
-                page_content_parts.append(f"Occasion: {product['occasion']}")
-            if product.get('gender'):
-                page_content_parts.append(f"Gender: {product['gender']}")
-            
-            # Price information
-            price = product.get('discount_price') or product.get('price')
-            if price:
-                page_content_parts.append(f"Price: Rs. {price}")
-            
-            page_content = ". ".join(page_content_parts)
-            
-            # Metadata for retrieval
-            metadata = {
-                'product_id': product['id'],
-                'category': product.get('category_name', 'Unknown'),
-                'brand': product.get('brand', ''),
-                'price': float(price) if price else 0.0,
-                'gender': product.get('gender', ''),
-                'color': product.get('color', ''),
-                'occasion': product.get('occasion', '')
-            }
-            
-            documents.append(Document(page_content=page_content, metadata=metadata))
+        documents = [build_product_document(product) for product in products]
         
         # Initialize embeddings (reuse if already initialized)
         embedding_model = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
@@ -682,29 +1432,62 @@ def create_vector_store_from_db():
             encode_kwargs={'normalize_embeddings': True}
         )
         
-        # Create new FAISS vector store
-        global vector_store
+        # Create new FAISS vector store (the served one is untouched until the swap)
         print("🔄 Creating new FAISS vector store...")
-        vector_store = FAISS.from_documents(documents, embeddings)
+        new_store = FAISS.from_documents(documents, embeddings)
         
-        # Save to disk
+        # Save to disk as a new version and publish it
         vector_store_path = os.getenv('VECTOR_STORE_PATH', 'faiss_index')
-        vector_store.save_local(vector_store_path)
-        print(f"💾 Vector store saved to '{vector_store_path}'")
+        version = save_index_artifacts(new_store, products, vector_store_path,
+                                       source_watermark=watermark, build_started=build_started)
+        print(f"💾 Vector store and catalog snapshot saved to '{vector_store_path}' as version {version}")
         
         # Cleanup database connection
         cursor.close()
         conn.close()
         
-        return True
+        return version
         
     except Exception as e:
         print(f"❌ Error creating vector store from DB: {e}")
-        return False
+        return None
         
     except Exception as e:
         return jsonify({'error': f'Error getting vector store stats: {str(e)}'}), 500
 
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Query cache counters and the last warm-up coverage report"""
+    return jsonify({
+        'history': history_cache.stats(),
+        'embedding': embedding_cache.stats(),
+        'result': result_cache.stats(),
+        'cursors': search_cursors.stats(),
+        'warmup': dict(cache_warmer.last_report or {}, running=cache_warmer.running, hits=dict(cache_warmer.hits))
+    })
+
+@app.route('/cache/warm', methods=['POST'])
+def warm_cache():
+    """Start a cache warm-up from popular searches now"""
+    if not admin_authorized():
+        return jsonify({'error': 'Admin token required'}), 403
+    if rag_chain is None:
+        return jsonify({'error': 'RAG system not initialized'}), 500
+    if not cache_warmer.start():
+        return jsonify({'success': False, 'message': 'A warm-up is already running'}), 409
+    return jsonify({'success': True, 'message': 'Cache warm-up started'}), 202
+
+@app.route('/admin/log-maintenance', methods=['GET', 'POST'])
+def log_maintenance_status():
+    """Last search log maintenance report (GET), or start a pass now (POST)"""
+    if not admin_authorized():
+        return jsonify({'error': 'Admin token required'}), 403
+    if request.method == 'GET':
+        return jsonify(log_maintainer.stats())
+    if not log_maintainer.trigger():
+        return jsonify({'success': False, 'message': 'Log maintenance is already running'}), 409
+    return jsonify({'success': True, 'message': 'Log maintenance started'}), 202
+
 @app.route('/providers', methods=['GET'])
 def list_providers():
     """List available providers and their status"""
@@ -732,6 +1515,45 @@ def list_providers():
         'provider_priority': ['groq', 'openai'] if current_provider == 'groq' else ['openai', 'groq']
     })
 
+def admin_authorized():
+    """Check the X-Admin-Token header when ADMIN_TOKEN is configured"""
+    admin_token = os.getenv('ADMIN_TOKEN')
+    return not admin_token or request.headers.get('X-Admin-Token') == admin_token
+
+@app.route('/admin/profile', methods=['GET'])
+def profile_live_traffic():
+    """Sample live traffic for N seconds and return a flame-graph compatible profile"""
+    if not admin_authorized():
+        return jsonify({'error': 'Admin token required'}), 403
+    
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval_ms', 5)) / 1000
+    except ValueError:
+        return jsonify({'error': 'seconds and interval_ms must be numbers'}), 400
+    
+    try:
+        print(f"🔬 Profiling live traffic for {seconds}s...")
+        stacks = profiler.sample_stacks(seconds, interval)
+    except profiler.ProfilerBusyError as e:
+        return jsonify({'error': str(e)}), 409
+    
+    include_idle = request.args.get('include_idle', 'false').lower() == 'true'
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'seconds': seconds,
+            'samples': sum(stacks.values()),
+            'stacks': [{'stack': stack, 'count': count} for stack, count in stacks.most_common()
+                       if include_idle or not profiler.idle_stack(stack)]
+        })
+    
+    return profiler.to_collapsed(stacks, include_idle), 200, {'Content-Type': 'text/plain; charset=utf-8'}
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Expose service metrics in Prometheus text format"""
+    return metrics.render(), 200, {'Content-Type': metrics.CONTENT_TYPE}
+
 def get_current_model_name():
     """Get the current model name based on provider"""
     if current_provider == 'openai':
@@ -761,6 +1583,7 @@ if __name__ == '__main__':
     print(f"🔗 Health check: http://localhost:{os.getenv('FLASK_PORT', 5000)}/")
     print(f"🔍 Search endpoint: http://localhost:{os.getenv('FLASK_PORT', 5000)}/search")
     print(f"🤖 Providers endpoint: http://localhost:{os.getenv('FLASK_PORT', 5000)}/providers")
+    print(f"📈 Metrics endpoint: http://localhost:{os.getenv('FLASK_PORT', 5000)}/metrics")
     print(f"⚡ Using {current_provider.upper()} as LLM provider")
     
     # Start Flask application
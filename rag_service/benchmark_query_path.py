@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Offline micro-benchmarks for the StyleMe RAG query path.
+
+Runs without the live service, MySQL or a Groq key: it generates synthetic
+catalogs in the same Document shape as create_vector_store_from_db, uses the
+stub LLM and an in-memory stand-in for the MySQL connector, and times the
+individual query-path functions in app.py.
+
+Usage:
+    python benchmark_query_path.py                         # 1k + 100k catalogs
+    python benchmark_query_path.py --sizes 1k,100k,1m      # include 1M products
+    python benchmark_query_path.py --save-baseline         # record a new baseline
+    python benchmark_query_path.py --embeddings hf         # time the real embedding model
+
+Results are written as JSON (benchmarks/results.json by default) and compared
+against benchmarks/baseline.json; regressions beyond --threshold exit non-zero.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+import faiss
+import mysql.connector
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+
+import app
+from create_vector_store import build_product_document
+from live_attributes import LiveAttributes
+from preference_scoring import ProductAttributeMatrix
+from stub_llm import StubChatModel
+
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+
+CATEGORIES = ["Men's Clothing", "Women's Clothing", "Sportswear", "Traditional Wear", "Accessories", "Footwear"]
+PRODUCT_TYPES = ['Shirt', 'Trouser', 'Dress', 'Jeans', 'Saree', 'Sarong', 'T-Shirt', 'Jacket', 'Skirt', 'Sandals', 'Belt', 'Bag']
+COLORS = ['Blue', 'Black', 'White', 'Red', 'Green', 'Grey', 'Multicolor', 'Pink', 'Yellow', 'Brown']
+OCCASIONS = ['Casual', 'Formal', 'Party', 'Traditional', 'Sports', 'Office']
+GENDERS = ['Male', 'Female', 'Unisex']
+BRANDS = ['Cotton King', 'FormalX', 'FashionLady', 'Denim Queen', 'LankaStyle', 'SportsPro', 'UrbanFit', 'Heritage']
+SIZES = ['S,M,L', 'M,L,XL', '28,30,32', '30,32,34', 'Free Size']
+
+QUERIES = [
+    "men's shirt", "women's dress red color", "casual wear under 3000 rupees", "formal trouser black",
+    "saree traditional", "oversized tee white", "sportswear for men", "blue jeans women",
+    "party dress", "affordable shirts"
+]
+
+PREFERENCES = {
+    'style_preferences': ['casual', 'formal'],
+    'color_preferences': ['blue', 'white'],
+    'budget_min': 1000,
+    'budget_max': 8000,
+    'occasion': 'office'
+}
+
+SIZE_ALIASES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+
+class InMemoryDatabase:
+    """Stand-in for mysql.connector covering the tables the query path touches"""
+
+    def __init__(self):
+        self.search_history = []
+        self.inserts = 0
+
+    def connect(self, **kwargs):
+        return _InMemoryConnection(self)
+
+
+class _InMemoryConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, dictionary=False, **kwargs):
+        return _InMemoryCursor(self.db)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _InMemoryCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def execute(self, sql, params=()):
+        statement = ' '.join(sql.split()).lower()
+        if statement.startswith('insert into user_search_history'):
+            self.db.search_history.append(tuple(params))
+        elif statement.startswith('insert'):
+            self.db.inserts += 1
+        elif 'from user_search_history' in statement:
+            user_id, limit = params
+            self.rows = [(query,) for uid, query in reversed(self.db.search_history) if uid == user_id][:limit]
+        else:
+            self.rows = []
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+def parse_sizes(value):
+    sizes = []
+    for part in value.split(','):
+        part = part.strip().lower()
+        sizes.append(SIZE_ALIASES[part] if part in SIZE_ALIASES else int(part))
+    return sizes
+
+
+def size_label(size):
+    for label, value in SIZE_ALIASES.items():
+        if value == size:
+            return label
+    return str(size)
+
+
+def generate_products(count, seed=42):
+    """Generate product rows shaped like the create_vector_store_from_db query result"""
+    rng = random.Random(seed)
+    products = []
+    for product_id in range(1, count + 1):
+        gender = rng.choice(GENDERS)
+        product_type = rng.choice(PRODUCT_TYPES)
+        color = rng.choice(COLORS)
+        price = round(rng.uniform(500, 20000), -1)
+        products.append({
+            'id': product_id,
+            'name': f"{'Men' if gender == 'Male' else 'Women' if gender == 'Female' else 'Unisex'}'s {color} {product_type}",
+            'description': f"Comfortable {color.lower()} {product_type.lower()} for {rng.choice(OCCASIONS).lower()} wear",
+            'brand': rng.choice(BRANDS),
+            'color': color,
+            'size': rng.choice(SIZES),
+            'occasion': rng.choice(OCCASIONS),
+            'gender': gender,
+            'price': price,
+            'discount_price': round(price * 0.8, -1) if rng.random() < 0.3 else None,
+            'category_name': rng.choice(CATEGORIES)
+        })
+    return products
+
+
+def build_vector_store(documents, embedder, seed=42):
+    """Build a FAISS store over random unit vectors (embedding 1M documents is not the point here)"""
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((len(documents), EMBEDDING_DIM), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    index = faiss.IndexFlatL2(EMBEDDING_DIM)
+    index.add(vectors)
+    docstore = InMemoryDocstore({str(i): doc for i, doc in enumerate(documents)})
+    return FAISS(
+        embedding_function=embedder,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id={i: str(i) for i in range(len(documents))}
+    )
+
+
+def create_embedder(kind):
+    if kind == 'hf':
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(
+            model_name=os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2'),
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'normalize_embeddings': True}
+        )
+    return DeterministicFakeEmbedding(size=EMBEDDING_DIM)
+
+
+def time_function(fn, min_time=0.5, min_runs=20, max_runs=100000):
+    """Call fn repeatedly and return latency statistics in milliseconds"""
+    fn()  # warm-up
+    samples = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < max_runs and (len(samples) < min_runs or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'runs': len(samples),
+        'mean_ms': round(statistics.fmean(samples), 4),
+        'median_ms': round(statistics.median(samples), 4),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        'min_ms': round(samples[0], 4),
+        'ops_per_sec': round(1000 / statistics.fmean(samples), 1) if statistics.fmean(samples) > 0 else None
+    }
+
+
+def benchmark_catalog(size, embedder, min_time):
+    """Run every query-path benchmark against one synthetic catalog"""
+    print(f"\n📦 Generating synthetic catalog with {size:,} products...")
+    start = time.perf_counter()
+    products = generate_products(size)
+    documents = [build_product_document(product) for product in products]
+    store = build_vector_store(documents, embedder)
+    print(f"✅ Catalog ready in {time.perf_counter() - start:.1f}s")
+
+    # Point the service at the synthetic catalog, stub LLM and in-memory DB
+    app.vector_store = store
+    app.embeddings = embedder
+    app.llm_model = StubChatModel()
+    app.product_attributes = ProductAttributeMatrix.from_documents(documents)
+    app.live_attributes = LiveAttributes.from_products(products)
+    app.rag_chain = app.create_rag_chain()
+
+    rng = np.random.default_rng(7)
+    query_vector = rng.standard_normal(EMBEDDING_DIM).astype(np.float32)
+    query_vector /= np.linalg.norm(query_vector)
+    query_vector = query_vector.tolist()
+
+    retrieved = store.similarity_search_by_vector(query_vector, k=app.max_retrieved_docs)
+    # What the LLM typically answers: up to 10 IDs from the context
+    llm_output = ', '.join(str(doc.metadata['product_id']) for doc in retrieved[:10])
+    product_ids = app.parse_product_ids(llm_output)
+    query_cycle = itertools.cycle(QUERIES)
+
+    benchmarks = {
+        'format_context': lambda: app.format_context(retrieved),
+        'parse_product_ids': lambda: app.parse_product_ids(llm_output),
+        'create_enhanced_query': lambda: app.create_enhanced_query(QUERIES[0], PREFERENCES, {'season': 'summer'}),
+        'calculate_preference_scores': lambda: app.calculate_preference_scores(product_ids, PREFERENCES, QUERIES[0]),
+        'preference_match_full_catalog': lambda: app.product_attributes.match_scores(
+            PREFERENCES, prices=app.live_attributes.effective_prices(app.product_attributes.product_ids)),
+        'embed_query': lambda: embedder.embed_query(next(query_cycle)),
+        'faiss_search': lambda: store.similarity_search_by_vector(query_vector, k=app.max_retrieved_docs),
+        'get_user_search_history': lambda: app.get_user_search_history(1, 5),
+        'rag_chain_stub_llm': lambda: app.rag_chain.invoke({'question': next(query_cycle), 'history': 'No previous searches'})
+    }
+
+    results = {}
+    for name, fn in benchmarks.items():
+        results[name] = time_function(fn, min_time=min_time)
+        print(f"   ⏱️  {name:<30} median {results[name]['median_ms']:>10.4f} ms   p95 {results[name]['p95_ms']:>10.4f} ms")
+    return results
+
+
+def compare_with_baseline(results, baseline, threshold):
+    """Return a list of (catalog, benchmark, baseline_ms, current_ms, change) regressions"""
+    regressions = []
+    for catalog, benchmarks in results['catalogs'].items():
+        for name, stats in benchmarks.items():
+            reference = baseline.get('catalogs', {}).get(catalog, {}).get(name)
+            if not reference or not reference.get('median_ms'):
+                continue
+            change = stats['median_ms'] / reference['median_ms'] - 1
+            if change > threshold:
+                regressions.append((catalog, name, reference['median_ms'], stats['median_ms'], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline micro-benchmarks for the RAG query path')
+    parser.add_argument('--sizes', default='1k,100k', help='Catalog sizes, e.g. 1k,100k,1m')
+    parser.add_argument('--embeddings', choices=['fake', 'hf'], default='fake',
+                        help="'fake' for a deterministic stub, 'hf' to time the real HuggingFace model")
+    parser.add_argument('--min-time', type=float, default=0.5, help='Minimum seconds spent per benchmark')
+    parser.add_argument('--output', default=os.path.join('benchmarks', 'results.json'))
+    parser.add_argument('--baseline', default=os.path.join('benchmarks', 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Allowed median slowdown vs baseline before flagging (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    print("🏁 StyleMe RAG query-path benchmarks")
+    print(f"🤗 Embeddings: {args.embeddings}")
+
+    database = InMemoryDatabase()
+    mysql.connector.connect = database.connect
+    app.history_cache.invalidate()
+    for query in QUERIES[:5]:
+        app.store_search_history(1, query)
+
+    embedder = create_embedder(args.embeddings)
+    results = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+            'faiss': faiss.__version__,
+            'numpy': np.__version__,
+            'embeddings': args.embeddings
+        },
+        'catalogs': {}
+    }
+    for size in parse_sizes(args.sizes):
+        results['catalogs'][size_label(size)] = benchmark_catalog(size, embedder, args.min_time)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results written to {args.output}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or '.', exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"📌 Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("ℹ️  No baseline found - run with --save-baseline to record one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    regressions = compare_with_baseline(results, baseline, args.threshold)
+    if not regressions:
+        print(f"✅ No regressions beyond {args.threshold:.0%} against {args.baseline}")
+        return 0
+
+    print(f"❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+    for catalog, name, before, after, change in regressions:
+        print(f"   {catalog:>5} {name:<30} {before:.4f} ms -> {after:.4f} ms (+{change:.0%})")
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Two-stage binary search for the StyleMe RAG service.
+
+With INDEX_BINARY_CODES=true the builder also stores a 1-bit code per product:
+each embedding dimension is thresholded at its median across the catalog and
+the bits are packed into bytes (48 bytes for a 384-dim vector, vs 1536 as
+float32). At query time a Hamming-distance scan over the packed codes pulls
+k * BINARY_OVERSAMPLE candidates. The best BINARY_RESCORE_DEPTH of those by
+Hamming distance (all of them when 0) are then rescored exactly with the
+index's own vectors, and the top k are returned. Search quality is close to the
+exact scan, and the expensive float comparisons only touch a few hundred rows.
+
+The report command compares recall@k and per-query latency with exact search
+over a range of oversampling factors:
+
+    python binary_index.py                            # against the published index
+    python binary_index.py --oversample 2,5,10,20 --k 10
+    python binary_index.py --synthetic 100000         # clustered synthetic vectors
+
+The report is written to benchmarks/binary_search_report.json.
+"""
+
+import argparse
+import json
+import os
+import time
+
+import faiss
+import numpy as np
+
+CODES_FILENAME = 'binary_codes.faiss'
+THRESHOLDS_FILENAME = 'binary_thresholds.npy'
+
+
+def binarize(vectors, thresholds):
+    """Pack one bit per dimension (value above the dimension's threshold) into uint8 codes"""
+    return np.packbits(np.asarray(vectors) > thresholds, axis=1)
+
+
+def _codes_index(vectors, thresholds):
+    codes = binarize(vectors, thresholds)
+    index = faiss.IndexBinaryFlat(codes.shape[1] * 8)
+    index.add(codes)
+    return index
+
+
+def build_binary_codes(vector_store, directory):
+    """Write the packed codes and per-dimension thresholds next to the main index"""
+    codes = BinaryCodes.from_vector_store(vector_store)
+    faiss.write_index_binary(codes.codes, os.path.join(directory, CODES_FILENAME))
+    np.save(os.path.join(directory, THRESHOLDS_FILENAME), codes.thresholds)
+    return codes
+
+
+class BinaryCodes:
+    """Hamming candidate scan over packed codes plus exact rescoring against the main index"""
+
+    def __init__(self, vector_store, codes, thresholds, oversample=20, rescore_depth=0):
+        self.vector_store = vector_store
+        self.codes = codes
+        self.thresholds = thresholds
+        self.oversample = oversample
+        self.rescore_depth = rescore_depth
+        self.ntotal = codes.ntotal
+
+    @classmethod
+    def from_vector_store(cls, vector_store, thresholds=None, **kwargs):
+        """Binarize every vector in the store (median thresholds unless given)"""
+        index = vector_store.index
+        vectors = index.reconstruct_n(0, index.ntotal)
+        if thresholds is None:
+            thresholds = np.median(vectors, axis=0).astype(np.float32)
+        return cls(vector_store, _codes_index(vectors, thresholds), thresholds, **kwargs)
+
+    @classmethod
+    def load(cls, vector_store, directory, **kwargs):
+        """Load codes written by build_binary_codes; None if absent or stale"""
+        codes_path = os.path.join(directory, CODES_FILENAME)
+        if not os.path.exists(codes_path):
+            return None
+        codes = faiss.read_index_binary(codes_path)
+        if codes.ntotal != vector_store.index.ntotal:
+            print("⚠️ Binary codes don't match the loaded index - rebuild the vector store")
+            return None
+        thresholds = np.load(os.path.join(directory, THRESHOLDS_FILENAME))
+        return cls(vector_store, codes, thresholds, **kwargs)
+
+    def upsert(self, removed_rows, vectors):
+        """Apply an in-place main-index upsert: removed_rows deleted, vectors appended (same thresholds)"""
+        if len(removed_rows):
+            self.codes.remove_ids(np.asarray(removed_rows, dtype=np.int64))
+        self.codes.add(binarize(vectors, self.thresholds))
+        self.ntotal = self.codes.ntotal
+
+    def candidates(self, query_vector, k):
+        """Index rows of the nearest codes by Hamming distance, best first"""
+        count = min(max(k * self.oversample, k), self.ntotal)
+        if self.rescore_depth:
+            count = min(count, max(self.rescore_depth, k))
+        query = binarize(np.asarray([query_vector], dtype=np.float32), self.thresholds)
+        _, rows = self.codes.search(query, count)
+        return rows[0][rows[0] >= 0]
+
+    def rescore(self, query_vector, rows, k):
+        """Exact L2 distances for the candidate rows; returns the top-k (distances, rows)"""
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.float32), rows
+        vectors = self.vector_store.index.reconstruct_batch(rows)
+        distances = ((vectors - np.asarray(query_vector, dtype=np.float32)) ** 2).sum(axis=1)
+        best = np.argsort(distances, kind='stable')[:k]
+        return distances[best], rows[best]
+
+    def documents(self, rows):
+        docstore_ids = self.vector_store.index_to_docstore_id
+        return [self.vector_store.docstore.search(docstore_ids[int(row)]) for row in rows]
+
+    def stats(self):
+        return {
+            'vectors': self.ntotal,
+            'bits': self.codes.d,
+            'bytes': self.ntotal * self.codes.code_size,
+            'oversample': self.oversample,
+            'rescore_depth': self.rescore_depth
+        }
+
+
+class _VectorsOnly:
+    """Just enough of a LangChain vector store to run BinaryCodes outside the service"""
+
+    def __init__(self, index):
+        self.index = index
+
+
+def binary_search_report(vectors, oversample_factors, k=10, num_queries=500, rescore_depth=0):
+    """Recall@k and per-query latency of two-stage search at each oversampling factor"""
+    from index_compression import recall_at_k, sample_queries
+
+    queries = sample_queries(vectors, num_queries)
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+
+    start = time.perf_counter()
+    exact_ids = np.vstack([exact.search(query[None, :], k)[1] for query in queries])
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    binary = BinaryCodes.from_vector_store(_VectorsOnly(exact), rescore_depth=rescore_depth)
+    rows = [{'mode': 'exact', 'oversample': None, 'candidates': exact.ntotal,
+             f'recall@{k}': 1.0, 'search_ms_per_query': round(exact_ms, 3), 'speedup': 1.0}]
+    for factor in oversample_factors:
+        binary.oversample = factor
+        found, candidates = [], 0
+        start = time.perf_counter()
+        for query in queries:
+            candidate_rows = binary.candidates(query, k)
+            found.append(binary.rescore(query, candidate_rows, k)[1])
+            candidates += len(candidate_rows)
+        search_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        rows.append({
+            'mode': 'binary',
+            'oversample': factor,
+            'candidates': round(candidates / len(queries)),
+            f'recall@{k}': round(recall_at_k(exact_ids, found, k), 4),
+            'search_ms_per_query': round(search_ms, 3),
+            'speedup': round(exact_ms / search_ms, 2) if search_ms else None
+        })
+    return rows, binary.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--oversample', default='2,5,10,20,50', help='Comma-separated oversampling factors')
+    parser.add_argument('--rescore-depth', type=int, default=0, help='Cap on candidates rescored (0 = all)')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--synthetic', type=int, default=0, help='Use N clustered synthetic vectors instead of the index')
+    parser.add_argument('--output', default=os.path.join('benchmarks', 'binary_search_report.json'))
+    args = parser.parse_args()
+
+    from index_compression import load_published_vectors, synthetic_vectors
+
+    vectors = synthetic_vectors(args.synthetic) if args.synthetic else load_published_vectors()
+    factors = [int(f) for f in args.oversample.split(',') if f.strip()]
+    rows, codes = binary_search_report(vectors, factors, k=args.k, num_queries=args.queries,
+                                       rescore_depth=args.rescore_depth)
+
+    print(f"\n📦 {codes['vectors']} vectors, {codes['bits']}-bit codes ({codes['bytes'] / 1e6:.2f} MB)")
+    print(f"{'mode':<8}{'oversample':>12}{'candidates':>12}{f'recall@{args.k}':>12}{'ms/query':>11}{'speedup':>9}")
+    for row in rows:
+        print(f"{row['mode']:<8}{str(row['oversample'] or '-'):>12}{row['candidates']:>12}"
+              f"{row[f'recall@{args.k}']:>12.3f}{row['search_ms_per_query']:>11.3f}{row['speedup']:>8.1f}x")
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({'k': args.k, 'codes': codes, 'results': rows}, f, indent=2)
+    print(f"\n💾 Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Cache warm-up from popular searches for the StyleMe RAG service.
+
+After startup and every index swap the query caches are empty, so the first
+users pay full embedding and LLM latency on exactly the queries everyone
+runs. The warmer mines the top-N normalized queries from search_logs over a
+configurable window and runs them through the RAG chain in the background.
+At most `concurrency` run at a time, so live traffic isn't starved.
+
+Only the query embedding cache is shared by everyone. Result cache entries are
+keyed by the user's history and profile, and the warm-up runs as a guest, so
+registered users almost never hit them. Each run therefore reports the share
+of the window's searches whose embedding it cached (embedding_coverage).
+Real hits on warmed entries are counted per cache with record_hit().
+"""
+
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from query_cache import normalize_query
+
+POPULAR_QUERIES_SQL = '''
+    SELECT query, COUNT(*) AS searches
+    FROM search_logs
+    WHERE created_at >= NOW() - INTERVAL %s HOUR
+    GROUP BY query
+    ORDER BY searches DESC
+    LIMIT %s
+'''
+
+TOTAL_SEARCHES_SQL = '''
+    SELECT COUNT(*) AS searches
+    FROM search_logs
+    WHERE created_at >= NOW() - INTERVAL %s HOUR
+'''
+
+# Raw query variants fetched per warmed query, so variants that normalize
+# to the same query ("Red dress", "red dress ") are counted together
+VARIANTS_PER_QUERY = 5
+
+
+def fetch_popular_queries(cursor, window_hours, limit):
+    """Return ([(query, searches), ...] most popular first, total searches in the window)"""
+    cursor.execute(POPULAR_QUERIES_SQL, (window_hours, limit * VARIANTS_PER_QUERY))
+    counts = Counter()
+    for row in cursor.fetchall():
+        query = normalize_query(row['query'])
+        if query:
+            counts[query] += int(row['searches'])
+
+    cursor.execute(TOTAL_SEARCHES_SQL, (window_hours,))
+    row = cursor.fetchone()
+    total = int(row['searches']) if row else 0
+    return counts.most_common(limit), total
+
+
+class CacheWarmer:
+    """Runs warm_query(query) for popular queries in a bounded thread pool"""
+
+    def __init__(self, connect, warm_query, top_n=100, window_hours=168, concurrency=2):
+        self.connect = connect
+        self.warm_query = warm_query
+        self.top_n = top_n
+        self.window_hours = window_hours
+        self.concurrency = concurrency
+        self.last_report = None
+        # Normalized queries warmed by the last run, and real requests served from their entries
+        self.warmed = frozenset()
+        self.hits = Counter()
+        self._running = threading.Lock()
+
+    def start(self):
+        """Warm in a background thread; returns False if a run is already in progress"""
+        if not self._running.acquire(blocking=False):
+            return False
+        threading.Thread(target=self._run_locked, name='cache-warmer', daemon=True).start()
+        return True
+
+    def _run_locked(self):
+        try:
+            self.run()
+        except Exception as e:
+            print(f"❌ Cache warm-up failed: {e}")
+        finally:
+            self._running.release()
+
+    @property
+    def running(self):
+        return self._running.locked()
+
+    def embedding_coverage(self):
+        return self.last_report['embedding_coverage'] if self.last_report else 0.0
+
+    def record_hit(self, cache, query):
+        """Count a request answered from a cache entry that the last warm-up created"""
+        if query in self.warmed:
+            self.hits[cache] += 1
+
+    def run(self):
+        """Warm the caches synchronously and return the coverage report"""
+        started = time.time()
+        self.warmed = frozenset()
+        conn = self.connect()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            popular, total = fetch_popular_queries(cursor, self.window_hours, self.top_n)
+            cursor.close()
+        finally:
+            conn.close()
+
+        warmed, failed, queries = [], [], []
+
+        def warm(item):
+            query, searches = item
+            try:
+                self.warm_query(query)
+                warmed.append(searches)
+                queries.append(query)
+            except Exception as e:
+                failed.append(query)
+                print(f"⚠️ Could not warm '{query}': {e}")
+
+        with ThreadPoolExecutor(max_workers=max(self.concurrency, 1), thread_name_prefix='cache-warm') as pool:
+            list(pool.map(warm, popular))
+
+        covered = sum(warmed)
+        self.warmed = frozenset(queries)
+        self.last_report = {
+            'started_at': started,
+            'duration': round(time.time() - started, 3),
+            'window_hours': self.window_hours,
+            'queries': len(popular),
+            'warmed': len(warmed),
+            'failed': len(failed),
+            'window_searches': total,
+            'covered_searches': covered,
+            'embedding_coverage': round(covered / total, 3) if total else 0.0
+        }
+        print(f"🔥 Warmed {len(warmed)}/{len(popular)} popular queries in {self.last_report['duration']}s, "
+              f"embeddings for {self.last_report['embedding_coverage']:.0%} of searches in the last {self.window_hours}h")
+        return self.last_report
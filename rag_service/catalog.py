@@ -0,0 +1,146 @@
+"""
+In-memory catalog snapshot for the StyleMe RAG service.
+
+The vector store build already reads every product's display columns. This
+snapshot keeps them (one compact tuple per product) and saves them next to the
+FAISS index as catalog.json, so search endpoints can return hydrated product
+records and the PHP layer no longer needs a second query per results page.
+Price, discount price and stock are overlaid from LiveAttributes when given,
+since the snapshot's values are only as fresh as the last index change.
+"""
+
+import json
+import os
+import time
+from decimal import Decimal
+
+CATALOG_FILENAME = 'catalog.json'
+
+# Fields that can be requested through the `fields` search parameter
+CATALOG_FIELDS = ('name', 'slug', 'price', 'discount_price', 'image', 'brand', 'category',
+                  'color', 'size', 'occasion', 'gender', 'stock')
+
+# Fields kept current in LiveAttributes rather than the snapshot
+LIVE_FIELDS = ('price', 'discount_price', 'stock')
+
+# Fields returned for `"fields": true` / `"fields": "all"`
+DEFAULT_FIELDS = ('name', 'slug', 'price', 'discount_price', 'image', 'brand', 'category')
+
+
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def parse_fields(value):
+    """Normalise the `fields` request parameter; None means no hydration"""
+    if value in (None, False, '', []):
+        return None
+    if value is True or value == 'all':
+        return list(DEFAULT_FIELDS)
+    if isinstance(value, str):
+        value = value.split(',')
+    fields = [str(field).strip() for field in value]
+    unknown = [field for field in fields if field not in CATALOG_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(CATALOG_FIELDS)}")
+    return fields
+
+
+class CatalogSnapshot:
+    """Compact product_id -> display fields map, built alongside the vector index"""
+
+    def __init__(self, rows, built_at=None):
+        # rows: product_id -> tuple of values in CATALOG_FIELDS order
+        self._rows = rows
+        self.built_at = built_at or time.time()
+        self._field_index = {field: i for i, field in enumerate(CATALOG_FIELDS)}
+
+    @staticmethod
+    def _product_row(product):
+        record = dict(product, image=product.get('image1'), category=product.get('category_name'))
+        return tuple(_json_value(record.get(field)) for field in CATALOG_FIELDS)
+
+    @classmethod
+    def from_products(cls, products):
+        """Build from product rows as returned by the vector store builder query"""
+        return cls({int(product['id']): cls._product_row(product) for product in products})
+
+    def with_changes(self, products):
+        """Copy with changed product rows applied"""
+        rows = dict(self._rows)
+        for product in products:
+            rows[int(product['id'])] = self._product_row(product)
+        return CatalogSnapshot(rows, self.built_at)
+
+    @classmethod
+    def from_documents(cls, documents):
+        """Fallback for indexes built before catalog.json existed (metadata fields only)"""
+        rows = {}
+        for doc in documents:
+            metadata = doc.metadata
+            name = doc.page_content.split('. ', 1)[0].replace('Product: ', '', 1)
+            record = dict(metadata, name=name)
+            rows[int(metadata['product_id'])] = tuple(_json_value(record.get(field)) for field in CATALOG_FIELDS)
+        return cls(rows)
+
+    @classmethod
+    def load(cls, directory):
+        """Load catalog.json from an index directory; None when it doesn't exist"""
+        path = os.path.join(directory, CATALOG_FILENAME)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        positions = [data['fields'].index(field) if field in data['fields'] else None for field in CATALOG_FIELDS]
+        rows = {
+            int(product_id): tuple(values[pos] if pos is not None else None for pos in positions)
+            for product_id, values in data['products'].items()
+        }
+        return cls(rows, data.get('built_at'))
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, CATALOG_FILENAME)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'built_at': self.built_at,
+                'fields': list(CATALOG_FIELDS),
+                'products': {str(product_id): list(values) for product_id, values in self._rows.items()}
+            }, f, ensure_ascii=False, separators=(',', ':'))
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, product_id):
+        return product_id in self._rows
+
+    def product_ids(self):
+        return list(self._rows)
+
+    def column(self, field):
+        """All products' values of one field"""
+        position = self._field_index[field]
+        return [values[position] for values in self._rows.values()]
+
+    def get(self, product_id, fields=DEFAULT_FIELDS, live=None):
+        values = self._rows.get(product_id)
+        if values is None:
+            return None
+        record = {'id': product_id}
+        for field in fields:
+            record[field] = values[self._field_index[field]]
+        current = live.get(product_id) if live is not None and any(f in LIVE_FIELDS for f in fields) else None
+        if current is not None:
+            record.update((field, current[field]) for field in fields if field in LIVE_FIELDS)
+        return record
+
+    def hydrate(self, product_ids, fields=DEFAULT_FIELDS, live=None):
+        """Return records for the given IDs in order, skipping IDs not in the catalog"""
+        records = []
+        for product_id in product_ids:
+            record = self.get(product_id, fields, live)
+            if record is not None:
+                records.append(record)
+        return records
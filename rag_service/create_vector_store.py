@@ -1,13 +1,151 @@
 import os
+import shutil
+import time
 import mysql.connector
 from dotenv import load_dotenv
-from langchain.docstore.document import Document
+from langchain_core.documents import Document
 from langchain_community.vectorstores import FAISS
 from langchain_huggingface import HuggingFaceEmbeddings
 
+import index_versions
+from binary_index import build_binary_codes
+from catalog import CatalogSnapshot
+from index_compression import compress_index, compression_spec
+from index_partitions import build_partitions, parse_partition_by
+from live_attributes import LiveAttributes
+from shards import build_shards
+from similar_products import build_similar_products
+
 # Load environment variables
 load_dotenv()
 
+# Products to index, with the display columns kept in the catalog snapshot. Out-of-stock
+# products are indexed too; stock is applied at query time from LiveAttributes.
+PRODUCTS_QUERY = '''
+    SELECT p.id, p.name, p.slug, p.description, p.brand, p.color, p.size, 
+           p.occasion, p.gender, p.price, p.discount_price, p.stock, p.image1,
+           c.name as category_name 
+    FROM products p 
+    LEFT JOIN categories c ON p.category_id = c.id 
+    ORDER BY p.id
+'''
+
+# Latest product change; builds record it so the CDC sync resumes from there
+WATERMARK_QUERY = 'SELECT MAX(updated_at) AS updated_at FROM products'
+
+def fetch_current_watermark(cursor):
+    """(updated_at, id) watermark covering every product change so far (dictionary cursor)"""
+    cursor.execute(WATERMARK_QUERY)
+    row = cursor.fetchone()
+    return (str(row['updated_at']) if row and row['updated_at'] else '1970-01-01 00:00:01', 0)
+
+def fetch_products(cursor):
+    """Fetch all indexable products (dictionary cursor) with category information"""
+    cursor.execute(PRODUCTS_QUERY)
+    return cursor.fetchall()
+
+def save_index_artifacts(vector_store, products, vector_store_path, source_watermark=None, build_started=None):
+    """Save the FAISS index and catalog snapshot as a new index version and publish it"""
+    version, staging = index_versions.stage_version(vector_store_path)
+    try:
+        # Optional float16/int8 storage, optionally after PCA (the transform is saved inside the index)
+        index_spec = compression_spec(os.getenv('INDEX_QUANTIZATION', 'none'), int(os.getenv('INDEX_PCA_DIM', 0)))
+        if index_spec != 'Flat':
+            vector_store.index = compress_index(vector_store.index, index_spec)
+            print(f"🗜️ Compressed index to {index_spec}")
+        
+        vector_store.save_local(staging)
+        CatalogSnapshot.from_products(products).save(staging)
+        # Price and stock, updated in place by the CDC sync instead of re-embedding
+        LiveAttributes.from_products(products).save(staging)
+        
+        # Optional per-gender/category sub-indexes for routed search
+        partition_by = parse_partition_by(os.getenv('INDEX_PARTITION_BY', ''))
+        if partition_by:
+            manifest = build_partitions(vector_store, partition_by, staging)
+            print(f"🧩 Built {len(manifest['partitions'])} index partitions by {', '.join(partition_by)}")
+        
+        # Optional 1-bit codes for two-stage (Hamming scan + exact rescore) search
+        binary_codes = os.getenv('INDEX_BINARY_CODES', 'false').lower() == 'true'
+        if binary_codes:
+            codes = build_binary_codes(vector_store, staging)
+            print(f"🔢 Built {codes.codes.d}-bit binary codes for {codes.ntotal} vectors")
+        
+        # Optional shards by product ID hash, each served by a shard_server.py process
+        num_shards = int(os.getenv('INDEX_SHARDS', 0))
+        if num_shards > 0:
+            sizes = build_shards(vector_store, staging, num_shards)
+            print(f"🧱 Split the index into {num_shards} shards ({min(sizes)}-{max(sizes)} vectors each)")
+        
+        # Precomputed nearest-neighbour lists for the "similar products" endpoint
+        similar_k = int(os.getenv('SIMILAR_PRODUCTS_K', 20))
+        similar_filter_by = parse_partition_by(os.getenv('SIMILAR_PRODUCTS_FILTER_BY', ''))
+        if similar_k > 0:
+            similar = build_similar_products(vector_store, staging, similar_k, similar_filter_by)
+            print(f"🧭 Precomputed {similar_k} similar products for {len(similar.product_ids)} products"
+                  + (f" within the same {', '.join(similar_filter_by)}" if similar_filter_by else ""))
+        
+        index_versions.commit_version(
+            vector_store_path,
+            version,
+            staging,
+            model=os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2'),
+            count=int(vector_store.index.ntotal),
+            dimension=int(vector_store.index.d),
+            index_spec=index_spec,
+            source_rows=len(products),
+            build_seconds=round(time.time() - build_started, 2) if build_started else None,
+            partition_by=partition_by,
+            binary_codes=binary_codes,
+            shards=num_shards or None,
+            similar_products={'k': similar_k, 'filter_by': similar_filter_by} if similar_k > 0 else None,
+            source_watermark=source_watermark
+        )
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    
+    index_versions.publish(vector_store_path, version)
+    removed = index_versions.prune(vector_store_path)
+    print(f"📌 Published index version {version}" + (f" (pruned {len(removed)} old versions)" if removed else ""))
+    return version
+
+def build_product_document(product):
+    """Convert a product row (with category_name) into a LangChain Document"""
+    # Create rich product description for better semantic search
+    page_content_parts = [
+        f"Product: {product['name']}",
+        f"Category: {product.get('category_name', 'Unknown')}",
+        f"Description: {product.get('description', 'No description available')}"
+    ]
+    
+    # Add optional details if they exist
+    if product.get('brand'):
+        page_content_parts.append(f"Brand: {product['brand']}")
+    if product.get('color'):
+        page_content_parts.append(f"Color: {product['color']}")
+    if product.get('size'):
+        page_content_parts.append(f"Size: {product['size']}")
+    if product.get('occasion'):
+        page_content_parts.append(f"Occasion: {product['occasion']}")
+    if product.get('gender'):
+        page_content_parts.append(f"Gender: {product['gender']}")
+    
+    # Price and stock change too often to embed; they live in LiveAttributes
+    page_content = ". ".join(page_content_parts)
+    
+    # Metadata for retrieval
+    metadata = {
+        'product_id': product['id'],
+        'category': product.get('category_name', 'Unknown'),
+        'brand': product.get('brand', ''),
+        'gender': product.get('gender', ''),
+        'color': product.get('color', ''),
+        'occasion': product.get('occasion', '')
+    }
+    
+    return Document(page_content=page_content, metadata=metadata)
+
 def create_vector_store():
     """
     Create FAISS vector store from product data in MySQL database.
@@ -32,63 +170,17 @@ def create_vector_store():
         return False
 
     # Fetch products with category information
+    build_started = time.time()
     try:
-        cursor.execute('''
-            SELECT p.id, p.name, p.description, p.brand, p.color, p.size, 
-                   p.occasion, p.gender, p.price, p.discount_price,
-                   c.name as category_name 
-            FROM products p 
-            LEFT JOIN categories c ON p.category_id = c.id 
-            WHERE p.stock > 0
-            ORDER BY p.id
-        ''')
-        products = cursor.fetchall()
+        watermark = fetch_current_watermark(cursor)
+        products = fetch_products(cursor)
         print(f"📦 Fetched {len(products)} products from database")
     except Exception as e:
         print(f"❌ Failed to fetch products: {e}")
         return False
 
     # Convert products to LangChain Document format
-    documents = []
-    for product in products:
-        # Create rich product description for better semantic search
-        page_content_parts = [
-            f"Product: {product['name']}",
-            f"Category: {product.get('category_name', 'Unknown')}",
-            f"Description: {product.get('description', 'No description available')}"
-        ]
-        
-        # Add optional details if they exist
-        if product.get('brand'):
-            page_content_parts.append(f"Brand: {product['brand']}")
-        if product.get('color'):
-            page_content_parts.append(f"Color: {product['color']}")
-        if product.get('size'):
-            page_content_parts.append(f"Size: {product['size']}")
-        if product.get('occasion'):
-            page_content_parts.append(f"Occasion: {product['occasion']}")
-        if product.get('gender'):
-            page_content_parts.append(f"Gender: {product['gender']}")
-        
-        # Price information
-        price = product.get('discount_price') or product.get('price')
-        if price:
-            page_content_parts.append(f"Price: Rs. {price}")
-        
-        page_content = ". ".join(page_content_parts)
-        
-        # Metadata for retrieval
-        metadata = {
-            'product_id': product['id'],
-            'category': product.get('category_name', 'Unknown'),
-            'brand': product.get('brand', ''),
-            'price': float(price) if price else 0.0,
-            'gender': product.get('gender', ''),
-            'color': product.get('color', ''),
-            'occasion': product.get('occasion', '')
-        }
-        
-        documents.append(Document(page_content=page_content, metadata=metadata))
+    documents = [build_product_document(product) for product in products]
 
     if not documents:
         print("❌ No products found to create vector store")
@@ -124,8 +216,9 @@ def create_vector_store():
     # Save vector store locally
     try:
         vector_store_path = os.getenv('VECTOR_STORE_PATH', 'faiss_index')
-        vector_store.save_local(vector_store_path)
-        print(f"💾 Vector store saved to '{vector_store_path}' directory")
+        save_index_artifacts(vector_store, products, vector_store_path,
+                             source_watermark=watermark, build_started=build_started)
+        print(f"💾 Vector store and catalog snapshot saved to '{vector_store_path}' directory")
     except Exception as e:
         print(f"❌ Failed to save vector store: {e}")
         return False
@@ -0,0 +1,128 @@
+"""
+Dynamic micro-batching of query embeddings for the StyleMe RAG service.
+
+Under concurrency every request used to call embed_query on its own. That
+meant many batch-of-one forward passes competing for the same CPU threads.
+EmbeddingBatcher puts callers on a queue instead. A single worker thread
+collects requests until `max_batch_size` are waiting or the oldest has waited
+`max_wait_ms`, runs one embed_documents call for the whole batch, and hands
+each caller its vector. Identical texts in a batch are embedded once.
+With the forward passes serialized in one thread, the model can use all
+inference threads (EMBEDDING_THREADS) instead of oversubscribing the CPU.
+
+A failing batch or metrics hook never stops the worker thread. A caller
+whose vector isn't ready within `timeout` seconds restarts the worker if it
+died and embeds its text directly, so a request never hangs on the queue.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+
+def configure_inference_threads(num_threads):
+    """Size torch's intra-op pool for batched inference; 0 leaves the default"""
+    if num_threads <= 0:
+        return None
+    try:
+        import torch
+    except ImportError:
+        return None
+    torch.set_num_threads(num_threads)
+    return torch.get_num_threads()
+
+
+class EmbeddingBatcher:
+    """Collects concurrent embed() calls into batched embed_documents() calls"""
+
+    def __init__(self, embed_documents, max_batch_size=32, max_wait_ms=3.0, on_batch=None, timeout=2.0,
+                 fallback=None):
+        self.embed_documents = embed_documents
+        self.max_batch_size = max(max_batch_size, 1)
+        self.max_wait = max_wait_ms / 1000
+        self.timeout = timeout
+        # fallback(text) -> vector used when the batch doesn't answer in time (embed_documents([text]) if None)
+        self.fallback = fallback
+        # on_batch(batch_size, queue_delays) - metrics hook
+        self.on_batch = on_batch
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.texts = 0
+        self.fallbacks = 0
+
+    def start(self):
+        """Start the worker thread (again, in a forked child whose copy of it isn't running)"""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+                self._worker.start()
+        return self
+
+    def embed(self, text, timeout=None):
+        """Embed one text as part of the next batch; embeds it directly if the batch takes over `timeout`"""
+        future = Future()
+        self._queue.put((text, time.perf_counter(), future))
+        try:
+            return future.result(self.timeout if timeout is None else timeout)
+        except FutureTimeoutError:
+            # The worker is stuck or gone: don't wait for it, and bring it back if it died
+            future.cancel()
+            self.fallbacks += 1
+            self.start()
+            return self.fallback(text) if self.fallback else self.embed_documents([text])[0]
+
+    def _collect(self):
+        """Block for the first request, then gather more until the batch is full or the wait expires"""
+        batch = [self._queue.get()]
+        deadline = batch[0][1] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._embed_batch(batch)
+            except Exception as e:
+                # This is the only worker thread; fail what's still waiting and keep serving
+                print(f"❌ Embedding batch failed: {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _embed_batch(self, batch):
+        # Callers that timed out have cancelled their futures and embedded the text themselves
+        batch = [request for request in batch if not request[2].done()]
+        if not batch:
+            return
+        started = time.perf_counter()
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        vectors = dict(zip(texts, self.embed_documents(texts)))
+
+        for text, _, future in batch:
+            if not future.done():
+                future.set_result(vectors[text])
+        self.batches += 1
+        self.texts += len(batch)
+        if self.on_batch:
+            self.on_batch(len(batch), [started - queued for _, queued, _ in batch])
+
+    def stats(self):
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'batches': self.batches,
+            'texts': self.texts,
+            'mean_batch_size': round(self.texts / self.batches, 2) if self.batches else 0.0,
+            'fallbacks': self.fallbacks,
+            'queued': self._queue.qsize()
+        }
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Offline retrieval quality-vs-latency evaluation for the StyleMe RAG service.
+
+Compares index configurations on a labelled query set, so index and embedding
+changes can be chosen on measured trade-offs instead of guesses.
+
+Labelled queries (qrels) are JSON lines: {"query": "...", "relevant": [ids]}.
+They can be written by hand or mined from search_logs. Mining takes the
+product IDs the LLM picked for each logged query, which is a pseudo-label
+biased towards what the index retrieved at the time, so hand-check the file
+for decisions that matter:
+
+    python evaluate_retrieval.py labels --output benchmarks/qrels.jsonl
+
+Each configuration is an embedding backend plus a FAISS index_factory spec,
+with optional search parameters after '@'. `binary` is the two-stage binary
+search from binary_index.py:
+
+    python evaluate_retrieval.py run --qrels benchmarks/qrels.jsonl \\
+        --configs "Flat;HNSW32@efSearch=64;IVF64,Flat@nprobe=8;SQ8;PCA192,SQ8;binary@oversample=20" \\
+        --embeddings all-MiniLM-L6-v2,all-mpnet-base-v2
+
+For every configuration it reports recall@k, MRR@k, agreement with exact
+search on the same embeddings, p50/p99 search latency, build time and index
+memory, marks the Pareto-optimal ones (no other configuration is at least as
+good on recall, p99 latency and memory), and writes
+benchmarks/retrieval_eval.json.
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import time
+import types
+from collections import Counter, defaultdict
+
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+
+from query_cache import normalize_query
+
+load_dotenv()
+
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'user': os.getenv('DB_USER', 'root'),
+    'password': os.getenv('DB_PASSWORD', ''),
+    'database': os.getenv('DB_NAME', 'ecommerce_sl')
+}
+
+LOGGED_ANSWERS_SQL = '''
+    SELECT query, enhanced_query FROM search_logs
+    WHERE enhanced_query IS NOT NULL AND enhanced_query <> ''
+    ORDER BY created_at DESC
+    LIMIT %s
+'''
+
+# Comma-separated runs of integers in an LLM answer ("... IDs are:\n\n3, 10")
+_ID_RUN = re.compile(r'\d+(?:\s*,\s*\d+)*')
+
+
+# === Labelled queries ===
+
+def parse_logged_ids(answer, known_ids):
+    """Product IDs from a logged LLM answer: the longest run of known IDs (prose numbers like prices drop out)"""
+    best = []
+    for run in _ID_RUN.findall(str(answer or '')):
+        ids = [int(part) for part in run.split(',') if int(part) in known_ids]
+        if len(ids) > len(best):
+            best = ids
+    return list(dict.fromkeys(best))
+
+
+def mine_qrels(rows, known_ids, min_votes=1):
+    """Group (query, answer) rows by normalized query; relevant = IDs picked in at least min_votes answers"""
+    votes = defaultdict(Counter)
+    for query, answer in rows:
+        query = normalize_query(query)
+        ids = parse_logged_ids(answer, known_ids)
+        if query and ids:
+            votes[query].update(ids)
+    qrels = []
+    for query, counts in votes.items():
+        relevant = [product_id for product_id, n in counts.most_common() if n >= min_votes]
+        if relevant:
+            qrels.append({'query': query, 'relevant': relevant})
+    return qrels
+
+
+def load_qrels(path):
+    with open(path, encoding='utf-8') as f:
+        qrels = [json.loads(line) for line in f if line.strip()]
+    return [q for q in qrels if q.get('query') and q.get('relevant')]
+
+
+def save_qrels(qrels, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for entry in qrels:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def load_catalog():
+    """Product Documents exactly as the index builder creates them"""
+    import mysql.connector
+
+    from create_vector_store import build_product_document, fetch_products
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cursor = conn.cursor(dictionary=True)
+    products = fetch_products(cursor)
+    cursor.close()
+    conn.close()
+    return [build_product_document(product) for product in products]
+
+
+def load_logged_answers(limit):
+    import mysql.connector
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+    cursor.execute(LOGGED_ANSWERS_SQL, (limit,))
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return rows
+
+
+# === Configurations ===
+
+def parse_configs(value):
+    """'Flat;HNSW32@efSearch=64' -> [('Flat', {}), ('HNSW32', {'efSearch': 64.0})]"""
+    configs = []
+    for item in value.split(';'):
+        item = item.strip()
+        if not item:
+            continue
+        spec, _, params = item.partition('@')
+        parsed = {}
+        for param in filter(None, params.split(',')):
+            name, _, number = param.partition('=')
+            parsed[name.strip()] = float(number)
+        configs.append((spec.strip(), parsed))
+    return configs
+
+
+def config_label(spec, params):
+    return spec + (''.join(f'@{name}={value:g}' for name, value in params.items()) if params else '')
+
+
+def create_embedder(name):
+    if name == 'fake':
+        from langchain_community.embeddings import DeterministicFakeEmbedding
+        return DeterministicFakeEmbedding(size=384)
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(
+        model_name=name,
+        model_kwargs={'device': 'cpu'},
+        encode_kwargs={'normalize_embeddings': True}
+    )
+
+
+class Searcher:
+    """Uniform search(query_vector, k) -> rows over a FAISS index or two-stage binary search"""
+
+    def __init__(self, spec, params, vectors):
+        # Serialized size covers graph links (HNSW), inverted lists (IVF) and trained state
+        from index_compression import build_index, index_memory_bytes
+
+        if spec == 'binary':
+            from binary_index import BinaryCodes
+
+            exact = faiss.IndexFlatL2(vectors.shape[1])
+            exact.add(vectors)
+            self.binary = BinaryCodes.from_vector_store(
+                types.SimpleNamespace(index=exact),
+                oversample=int(params.get('oversample', 20)),
+                rescore_depth=int(params.get('rescore_depth', 0))
+            )
+            self.memory = index_memory_bytes(exact) + self.binary.stats()['bytes']
+            return
+
+        self.binary = None
+        self.index = build_index(vectors, spec)
+        space = faiss.ParameterSpace()
+        for name, value in params.items():
+            space.set_index_parameter(self.index, name, value)
+        self.memory = index_memory_bytes(self.index)
+
+    def search(self, query_vector, k):
+        if self.binary is not None:
+            return self.binary.rescore(query_vector, self.binary.candidates(query_vector, k), k)[1]
+        return self.index.search(query_vector[None, :], k)[1][0]
+
+
+# === Metrics ===
+
+def recall_at_k(found, relevant, k):
+    return len(set(found[:k]) & relevant) / len(relevant)
+
+
+def reciprocal_rank(found, relevant, k):
+    for rank, product_id in enumerate(found[:k], start=1):
+        if product_id in relevant:
+            return 1 / rank
+    return 0.0
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def pareto_front(rows, recall_key):
+    """Mark rows no other row matches or beats on recall, p99 latency and memory (strictly on one)"""
+    def dominates(a, b):
+        better_or_equal = (a[recall_key] >= b[recall_key] and a['p99_ms'] <= b['p99_ms']
+                           and a['memory_bytes'] <= b['memory_bytes'])
+        strictly = (a[recall_key] > b[recall_key] or a['p99_ms'] < b['p99_ms']
+                    or a['memory_bytes'] < b['memory_bytes'])
+        return better_or_equal and strictly
+
+    for row in rows:
+        row['pareto'] = not any(dominates(other, row) for other in rows if other is not row)
+    return rows
+
+
+def evaluate(documents, qrels, backends, configs, k=10):
+    """Embed the catalog and queries per backend, then search every configuration"""
+    product_ids = np.array([doc.metadata['product_id'] for doc in documents])
+    rows = []
+    for backend in backends:
+        embedder = create_embedder(backend)
+        print(f"\n🤗 Embedding {len(documents)} products with {backend}...")
+        start = time.perf_counter()
+        vectors = np.asarray(embedder.embed_documents([doc.page_content for doc in documents]), dtype=np.float32)
+        embed_seconds = time.perf_counter() - start
+
+        embed_ms = []
+        queries = []
+        for entry in qrels:
+            start = time.perf_counter()
+            queries.append(np.asarray(embedder.embed_query(entry['query']), dtype=np.float32))
+            embed_ms.append((time.perf_counter() - start) * 1000)
+
+        exact = faiss.IndexFlatL2(vectors.shape[1])
+        exact.add(vectors)
+        exact_rows = [exact.search(query[None, :], k)[1][0] for query in queries]
+
+        for spec, params in configs:
+            label = config_label(spec, params)
+            start = time.perf_counter()
+            try:
+                searcher = Searcher(spec, params, vectors)
+            except RuntimeError as e:
+                print(f"⚠️ Skipping {label}: {e}")
+                continue
+            build_seconds = time.perf_counter() - start
+
+            latencies, recalls, ranks, agreement = [], [], [], []
+            for query, entry, exact_found in zip(queries, qrels, exact_rows):
+                start = time.perf_counter()
+                found_rows = searcher.search(query, k)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+                found_rows = found_rows[found_rows >= 0]
+                found = list(product_ids[found_rows])
+                relevant = set(entry['relevant'])
+                recalls.append(recall_at_k(found, relevant, k))
+                ranks.append(reciprocal_rank(found, relevant, k))
+                agreement.append(len(set(found_rows) & set(exact_found)) / k)
+
+            rows.append({
+                'embeddings': backend,
+                'config': label,
+                f'recall@{k}': round(statistics.fmean(recalls), 4),
+                f'mrr@{k}': round(statistics.fmean(ranks), 4),
+                f'exact_agreement@{k}': round(statistics.fmean(agreement), 4),
+                'p50_ms': round(percentile(latencies, 0.5), 4),
+                'p99_ms': round(percentile(latencies, 0.99), 4),
+                'query_embed_p50_ms': round(percentile(embed_ms, 0.5), 3),
+                'catalog_embed_seconds': round(embed_seconds, 2),
+                'build_seconds': round(build_seconds, 3),
+                'memory_bytes': searcher.memory
+            })
+            print(f"   ✅ {label}: recall@{k} {rows[-1][f'recall@{k}']:.3f}, p99 {rows[-1]['p99_ms']:.3f} ms")
+    return pareto_front(rows, f'recall@{k}')
+
+
+def print_table(rows, k):
+    print(f"\n{'':2}{'embeddings':<24}{'config':<26}{f'recall@{k}':>10}{f'mrr@{k}':>8}{'exact':>7}"
+          f"{'p50 ms':>9}{'p99 ms':>9}{'build s':>9}{'MB':>9}")
+    for row in sorted(rows, key=lambda r: (-r[f'recall@{k}'], r['p99_ms'])):
+        print(f"{'★' if row['pareto'] else '':2}{row['embeddings'][:23]:<24}{row['config'][:25]:<26}"
+              f"{row[f'recall@{k}']:>10.3f}{row[f'mrr@{k}']:>8.3f}{row[f'exact_agreement@{k}']:>7.2f}"
+              f"{row['p50_ms']:>9.3f}{row['p99_ms']:>9.3f}{row['build_seconds']:>9.2f}{row['memory_bytes'] / 1e6:>9.2f}")
+    print("\n★ = Pareto-optimal on recall, p99 latency and memory")
+
+
+def cmd_labels(args):
+    documents = load_catalog()
+    known_ids = {doc.metadata['product_id'] for doc in documents}
+    qrels = mine_qrels(load_logged_answers(args.limit), known_ids, min_votes=args.min_votes)
+    save_qrels(qrels, args.output)
+    print(f"🏷️ Wrote {len(qrels)} labelled queries to {args.output}")
+
+
+def cmd_run(args):
+    documents = load_catalog()
+    if args.qrels:
+        qrels = load_qrels(args.qrels)
+    else:
+        known_ids = {doc.metadata['product_id'] for doc in documents}
+        qrels = mine_qrels(load_logged_answers(args.limit), known_ids, min_votes=args.min_votes)
+    if not qrels:
+        print("❌ No labelled queries - check search_logs or the qrels file")
+        return 1
+    print(f"🏷️ {len(qrels)} labelled queries, {len(documents)} products")
+
+    backends = [b.strip() for b in args.embeddings.split(',') if b.strip()]
+    rows = evaluate(documents, qrels, backends, parse_configs(args.configs), k=args.k)
+    print_table(rows, args.k)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({'k': args.k, 'queries': len(qrels), 'products': len(documents), 'results': rows}, f, indent=2)
+    print(f"💾 Results written to {args.output}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    labels = commands.add_parser('labels', help='Mine labelled queries from search_logs into a qrels file')
+    labels.add_argument('--output', default=os.path.join('benchmarks', 'qrels.jsonl'))
+    labels.add_argument('--limit', type=int, default=5000, help='Most recent logged searches to read')
+    labels.add_argument('--min-votes', type=int, default=1, help='Answers an ID must appear in to count as relevant')
+    labels.set_defaults(func=cmd_labels)
+
+    run = commands.add_parser('run', help='Evaluate index configurations')
+    run.add_argument('--qrels', help='Labelled queries (JSON lines); mined from search_logs when omitted')
+    run.add_argument('--configs', default='Flat;HNSW32@efSearch=64;IVF64,Flat@nprobe=8;SQ8;PCA192,SQ8;binary@oversample=20')
+    run.add_argument('--embeddings', default=os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2'),
+                     help="Comma-separated embedding models ('fake' for a quick dry run)")
+    run.add_argument('--k', type=int, default=10)
+    run.add_argument('--limit', type=int, default=5000)
+    run.add_argument('--min-votes', type=int, default=1)
+    run.add_argument('--output', default=os.path.join('benchmarks', 'retrieval_eval.json'))
+    run.set_defaults(func=cmd_run)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main() or 0)
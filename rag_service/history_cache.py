@@ -0,0 +1,111 @@
+"""
+In-process cache of recent user searches for the StyleMe RAG service.
+
+Every search used to insert into user_search_history and then immediately read
+the last N rows back. This module keeps a bounded ring buffer of recent
+queries per user in memory instead: buffers are loaded lazily from MySQL on
+first access, updated write-through after each stored search, and evicted
+least-recently-used by user once the user count or memory cap is exceeded.
+"""
+
+import sys
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
+
+
+class SearchHistoryCache:
+    """LRU (by user) cache of per-user ring buffers of recent search queries"""
+
+    def __init__(self, loader, per_user=10, max_users=10000, max_bytes=16 * 1024 * 1024):
+        # loader(user_id, limit) -> list of queries, newest first
+        self._loader = loader
+        self.per_user = per_user
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+
+        self._users = OrderedDict()  # user_id -> deque of queries, newest first
+        self._sizes = {}             # user_id -> approximate bytes held
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id, limit):
+        """Return up to `limit` recent queries for a user, newest first"""
+        if limit > self.per_user:
+            # Deeper than the ring buffer holds - go straight to the database
+            return self._loader(user_id, limit)
+
+        with self._lock:
+            buffer = self._users.get(user_id)
+            if buffer is not None:
+                self._users.move_to_end(user_id)
+                self.hits += 1
+                return list(islice(buffer, limit))
+            self.misses += 1
+
+        # Load outside the lock so a slow query doesn't block other users
+        queries = self._loader(user_id, self.per_user)
+
+        with self._lock:
+            buffer = self._users.get(user_id)
+            if buffer is None:
+                buffer = deque(queries, maxlen=self.per_user)
+                self._users[user_id] = buffer
+                self._resize(user_id)
+                self._evict()
+            return list(islice(buffer, limit))
+
+    def record(self, user_id, query):
+        """Write-through update after a query has been stored in the database"""
+        with self._lock:
+            buffer = self._users.get(user_id)
+            if buffer is None:
+                # Not cached yet - the next get() loads it, including this query
+                return
+            buffer.appendleft(query)
+            self._users.move_to_end(user_id)
+            self._resize(user_id)
+            self._evict()
+
+    def invalidate(self, user_id=None):
+        """Drop one user's buffer, or everything when user_id is None"""
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+                self._sizes.clear()
+                self._bytes = 0
+            elif user_id in self._users:
+                del self._users[user_id]
+                self._bytes -= self._sizes.pop(user_id, 0)
+
+    def stats(self):
+        """Return cache counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'users': len(self._users),
+                'bytes': self._bytes,
+                'max_users': self.max_users,
+                'max_bytes': self.max_bytes,
+                'per_user': self.per_user,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+    def _resize(self, user_id):
+        size = sum(sys.getsizeof(query) for query in self._users[user_id])
+        self._bytes += size - self._sizes.get(user_id, 0)
+        self._sizes[user_id] = size
+
+    def _evict(self):
+        # Never evict the most recently used user, even if it alone exceeds the cap
+        while len(self._users) > 1 and (len(self._users) > self.max_users or self._bytes > self.max_bytes):
+            user_id, _ = self._users.popitem(last=False)
+            self._bytes -= self._sizes.pop(user_id, 0)
+            self.evictions += 1
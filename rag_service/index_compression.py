@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Reduced-precision vector storage for the StyleMe RAG service.
+
+Builds can store vectors as float16 or int8 (FAISS scalar quantizers)
+instead of float32, optionally after a PCA reduction. Compression is set by
+INDEX_QUANTIZATION=none|fp16|int8 and INDEX_PCA_DIM=<dims>. The result is a
+FAISS index_factory spec such as "PCA192,SQ8". The PCA transform lives inside
+the saved index (an IndexPreTransform), so queries are projected
+automatically and the rest of the service doesn't change.
+
+The report command measures memory saved against recall@k lost, relative to
+exact float32 search, for several configurations:
+
+    python index_compression.py                       # against the published index
+    python index_compression.py --configs fp16,int8,pca192:fp16,pca96:int8 --k 10
+    python index_compression.py --synthetic 100000    # clustered synthetic vectors
+
+The report is written to benchmarks/compression_report.json.
+"""
+
+import argparse
+import json
+import os
+import time
+
+import faiss
+import numpy as np
+
+QUANTIZERS = {'none': 'Flat', 'fp16': 'SQfp16', 'int8': 'SQ8'}
+
+
+def compression_spec(quantization='none', pca_dim=0):
+    """FAISS index_factory spec for a quantization level and optional PCA output size"""
+    quantization = (quantization or 'none').lower()
+    if quantization not in QUANTIZERS:
+        raise ValueError(f"Unknown INDEX_QUANTIZATION '{quantization}'. Use one of: {', '.join(QUANTIZERS)}")
+    prefix = f'PCA{pca_dim},' if pca_dim else ''
+    return prefix + QUANTIZERS[quantization]
+
+
+def build_index(vectors, spec):
+    """Train and fill an L2 index of the given factory spec"""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    index = faiss.index_factory(vectors.shape[1], spec, faiss.METRIC_L2)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def compress_index(index, spec):
+    """Rebuild a (flat) index's vectors as a compressed index with the same row order"""
+    return build_index(index.reconstruct_n(0, index.ntotal), spec)
+
+
+def index_memory_bytes(index):
+    """Bytes held by an index (codes plus any trained transform/quantizer state)"""
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def recall_at_k(exact_ids, approx_ids, k):
+    hits = sum(len(set(e[:k]) & set(a[:k])) for e, a in zip(exact_ids, approx_ids))
+    return hits / (len(exact_ids) * k)
+
+
+def parse_configs(value):
+    """'fp16,int8,pca192:fp16' -> [('fp16', 0), ('int8', 0), ('fp16', 192)]"""
+    configs = []
+    for item in value.split(','):
+        item = item.strip().lower()
+        if not item:
+            continue
+        pca_dim = 0
+        if item.startswith('pca'):
+            dims, _, item = item[3:].partition(':')
+            pca_dim = int(dims)
+            item = item or 'none'
+        configs.append((item, pca_dim))
+    return configs
+
+
+def synthetic_vectors(count, dim=384, clusters=64, latent_dim=64, seed=7):
+    """Clustered unit vectors in a low-rank subspace - closer to real embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, latent_dim)).astype(np.float32)
+    latent = centers[rng.integers(0, clusters, count)] + 0.6 * rng.standard_normal((count, latent_dim)).astype(np.float32)
+    # Decaying spectrum, as in sentence embeddings, plus a little full-rank noise
+    mixing = rng.standard_normal((latent_dim, dim)).astype(np.float32) * np.linspace(1.0, 0.1, latent_dim)[:, None]
+    vectors = latent @ mixing + 0.05 * rng.standard_normal((count, dim)).astype(np.float32)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def load_published_vectors():
+    """Vectors of the published index (must be an uncompressed build to serve as ground truth)"""
+    import index_versions
+
+    root = os.getenv('VECTOR_STORE_PATH', 'faiss_index')
+    version, directory = index_versions.resolve(root)
+    index = faiss.read_index(os.path.join(directory, 'index.faiss'))
+    if not isinstance(index, faiss.IndexFlat):
+        print("⚠️ The published index is compressed; recall is measured against its reconstructed vectors")
+    print(f"📦 Loaded {index.ntotal} vectors from index version {version or '(unversioned)'}")
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def sample_queries(vectors, num_queries=500, seed=11):
+    """Benchmark queries: stored vectors with a little noise, like a query near a known product"""
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), min(num_queries, len(vectors)), replace=False)]
+    queries = np.ascontiguousarray(queries + 0.05 * rng.standard_normal(queries.shape), dtype=np.float32)
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def compression_report(vectors, configs, k=10, num_queries=500):
+    """Memory and recall@k of each configuration against exact float32 search"""
+    queries = sample_queries(vectors, num_queries)
+
+    exact = build_index(vectors, 'Flat')
+    _, exact_ids = exact.search(queries, k)
+    baseline_bytes = index_memory_bytes(exact)
+
+    rows = []
+    for quantization, pca_dim in [('none', 0)] + [c for c in configs if c != ('none', 0)]:
+        spec = compression_spec(quantization, pca_dim)
+        start = time.perf_counter()
+        index = exact if spec == 'Flat' else build_index(vectors, spec)
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, ids = index.search(queries, k)
+        search_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        memory = index_memory_bytes(index)
+        rows.append({
+            'spec': spec,
+            'memory_bytes': memory,
+            'bytes_per_vector': round(memory / len(vectors), 1),
+            'memory_saved': round(1 - memory / baseline_bytes, 3),
+            f'recall@{k}': round(recall_at_k(exact_ids, ids, k), 4),
+            'search_ms_per_query': round(search_ms, 3),
+            'build_seconds': round(build_seconds, 2)
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--configs', default='fp16,int8,pca192:fp16,pca192:int8,pca96:int8',
+                        help='Comma-separated quantization[:...] configs, e.g. fp16,int8,pca192:int8')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--synthetic', type=int, default=0, help='Use N clustered synthetic vectors instead of the index')
+    parser.add_argument('--output', default=os.path.join('benchmarks', 'compression_report.json'))
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.synthetic) if args.synthetic else load_published_vectors()
+    rows = compression_report(vectors, parse_configs(args.configs), k=args.k, num_queries=args.queries)
+
+    print(f"\n{'config':<18}{'MB':>10}{'B/vec':>10}{'saved':>9}{f'recall@{args.k}':>12}{'ms/query':>11}")
+    for row in rows:
+        print(f"{row['spec']:<18}{row['memory_bytes'] / 1e6:>10.2f}{row['bytes_per_vector']:>10.0f}"
+              f"{row['memory_saved']:>9.0%}{row[f'recall@{args.k}']:>12.3f}{row['search_ms_per_query']:>11.3f}")
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({'vectors': len(vectors), 'dimension': int(vectors.shape[1]), 'k': args.k, 'results': rows}, f, indent=2)
+    print(f"\n💾 Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+"""
+Partitioned FAISS search with query routing for the StyleMe RAG service.
+
+With INDEX_PARTITION_BY=gender, category or gender,category the builder also
+writes one sub-index per partition (partitions/ inside the index directory).
+At query time a router picks the target partitions from the user's
+preferences, gender words in the query, category names in the query or -
+failing those - a cheap nearest-centroid classifier over category embeddings.
+Only those partitions are scanned and their hits are merged by distance, so a
+"sportswear for men" query no longer spends candidate slots on women's sarees.
+
+CDC upserts update partitions in place. Removed rows leave only the
+partitions that held them, the new vectors go into their key's partition, and
+only the centroids of the categories involved are recomputed.
+"""
+
+import json
+import os
+import re
+
+import faiss
+import numpy as np
+
+from preference_scoring import GENDER_ALIASES
+
+PARTITIONS_DIRNAME = 'partitions'
+PARTITION_DIMENSIONS = ('gender', 'category')
+
+# Gender words in queries; "women" is matched first so it never counts as "men"
+GENDER_PATTERNS = (
+    ('female', re.compile(r"\b(women|women's|womens|woman|ladies|lady|female|girls?)\b", re.IGNORECASE)),
+    ('male', re.compile(r"\b(men|men's|mens|man|gents|male|boys?)\b", re.IGNORECASE))
+)
+
+
+
+def _normalize(value):
+    return str(value or '').strip().lower()
+
+
+def _partition_value(dimension, value):
+    value = _normalize(value)
+    if dimension == 'gender':
+        return GENDER_ALIASES.get(value, value)
+    return value
+
+
+def parse_partition_by(value):
+    """Parse INDEX_PARTITION_BY ("gender", "category", "gender,category")"""
+    dimensions = [_normalize(part) for part in (value or '').split(',') if _normalize(part)]
+    unknown = [d for d in dimensions if d not in PARTITION_DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown partition dimension(s): {', '.join(unknown)}")
+    return [d for d in PARTITION_DIMENSIONS if d in dimensions]
+
+
+def _document_rows(vector_store):
+    return _documents_at(vector_store, range(len(vector_store.index_to_docstore_id)))
+
+
+def _documents_at(vector_store, rows):
+    docstore_ids = vector_store.index_to_docstore_id
+    return [vector_store.docstore.search(docstore_ids[int(row)]) for row in rows]
+
+
+def _partition_key(doc, partition_by):
+    return tuple(_partition_value(dimension, doc.metadata.get(dimension)) for dimension in partition_by)
+
+
+def _split_partitions(vector_store, partition_by):
+    """Group index rows by partition key and build a sub-index of the main index's type for each group"""
+    vectors = vector_store.index.reconstruct_n(0, vector_store.index.ntotal)
+    documents = _document_rows(vector_store)
+
+    groups = {}
+    for row, doc in enumerate(documents):
+        key = _partition_key(doc, partition_by)
+        groups.setdefault(key, []).append(row)
+
+    partitions = []
+    for key, rows in sorted(groups.items()):
+        rows = np.asarray(rows, dtype=np.int64)
+        # Same type and trained state (quantizer, PCA) as the main index
+        index = faiss.clone_index(vector_store.index)
+        index.reset()
+        index.add(vectors[rows])
+        partitions.append(Partition(dict(zip(partition_by, key)), index, rows))
+    return partitions
+
+
+def build_partitions(vector_store, partition_by, directory):
+    """Write one flat sub-index per partition key next to the main index"""
+    partitions_dir = os.path.join(directory, PARTITIONS_DIRNAME)
+    os.makedirs(partitions_dir, exist_ok=True)
+
+    manifest = {'partition_by': partition_by, 'ntotal': int(vector_store.index.ntotal), 'partitions': []}
+    for i, partition in enumerate(_split_partitions(vector_store, partition_by)):
+        faiss.write_index(partition.index, os.path.join(partitions_dir, f'{i}.faiss'))
+        np.save(os.path.join(partitions_dir, f'{i}.rows.npy'), partition.rows)
+        manifest['partitions'].append({'id': i, 'key': partition.key, 'size': len(partition)})
+
+    with open(os.path.join(partitions_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class Partition:
+    """One sub-index plus the main-index rows its vectors came from"""
+
+    def __init__(self, key, index, rows):
+        self.key = key
+        self.index = index
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class PartitionedIndex:
+    """Routes queries to partition sub-indexes and merges their hits"""
+
+    def __init__(self, vector_store, partition_by, partitions, centroid_margin=0.05, max_categories=2):
+        self.vector_store = vector_store
+        self.partition_by = partition_by
+        self.partitions = partitions
+        self.centroid_margin = centroid_margin
+        self.max_categories = max_categories
+        self.ntotal = vector_store.index.ntotal
+        self._build_category_centroids()
+
+    @classmethod
+    def load(cls, vector_store, directory, **kwargs):
+        """Load partitions written by build_partitions; None if absent or stale"""
+        partitions_dir = os.path.join(directory, PARTITIONS_DIRNAME)
+        manifest_path = os.path.join(partitions_dir, 'manifest.json')
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest['ntotal'] != vector_store.index.ntotal:
+            print("⚠️ Index partitions don't match the loaded index - rebuild the vector store")
+            return None
+
+        partitions = []
+        for entry in manifest['partitions']:
+            index = faiss.read_index(os.path.join(partitions_dir, f"{entry['id']}.faiss"))
+            rows = np.load(os.path.join(partitions_dir, f"{entry['id']}.rows.npy"))
+            partitions.append(Partition(entry['key'], index, rows))
+        return cls(vector_store, manifest['partition_by'], partitions, **kwargs)
+
+    def upsert(self, removed_rows, vectors):
+        """Apply an in-place main-index upsert: removed_rows (sorted) deleted, vectors appended as the last rows"""
+        touched = set()
+        keys = {}
+        for partition in self.partitions:
+            gone = np.isin(partition.rows, removed_rows)
+            if gone.any():
+                partition.index.remove_ids(np.flatnonzero(gone).astype(np.int64))
+                partition.rows = partition.rows[~gone]
+                touched.add(partition)
+            partition.rows = partition.rows - np.searchsorted(removed_rows, partition.rows)
+            keys[tuple(partition.key.get(dimension) for dimension in self.partition_by)] = partition
+
+        ntotal = self.vector_store.index.ntotal
+        first = ntotal - len(vectors)
+        new_rows = np.arange(first, ntotal, dtype=np.int64)
+        groups = {}
+        for row, doc in zip(new_rows, _documents_at(self.vector_store, new_rows)):
+            groups.setdefault(_partition_key(doc, self.partition_by), []).append(row)
+
+        for key, rows in groups.items():
+            partition = keys.get(key)
+            if partition is None:
+                # Same type and trained state as the other partitions
+                index = faiss.clone_index(self.partitions[0].index if self.partitions else self.vector_store.index)
+                index.reset()
+                partition = Partition(dict(zip(self.partition_by, key)), index, np.empty(0, dtype=np.int64))
+                self.partitions.append(partition)
+            rows = np.asarray(rows, dtype=np.int64)
+            partition.index.add(vectors[rows - first])
+            partition.rows = np.concatenate([partition.rows, rows])
+            touched.add(partition)
+
+        self.partitions = sorted((p for p in self.partitions if len(p)),
+                                 key=lambda p: tuple(p.key.get(dimension) for dimension in self.partition_by))
+        self.ntotal = ntotal
+        self._update_category_centroids({partition.key.get('category') for partition in touched})
+
+    def _build_category_centroids(self):
+        """Mean (normalised) embedding per category for the nearest-centroid router"""
+        self.categories = []
+        self.category_centroids = None
+        self._category_sums = {}
+        self._update_category_centroids({partition.key.get('category') for partition in self.partitions})
+
+    def _update_category_centroids(self, categories):
+        """Recompute the vector sums of the given categories and the centroid table"""
+        if 'category' not in self.partition_by or not categories:
+            return
+
+        for category in categories:
+            self._category_sums.pop(category, None)
+        for partition in self.partitions:
+            category = partition.key['category']
+            if category not in categories or not len(partition):
+                continue
+            vectors = partition.index.reconstruct_n(0, partition.index.ntotal)
+            total, count = self._category_sums.get(category, (0, 0))
+            self._category_sums[category] = (total + vectors.sum(axis=0), count + len(vectors))
+
+        sums = self._category_sums
+        self.categories = sorted(sums)
+        centroids = np.array([sums[c][0] / max(sums[c][1], 1) for c in self.categories], dtype=np.float32)
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        self.category_centroids = centroids / np.where(norms > 0, norms, 1)
+
+    def detect_gender(self, question, preferences):
+        preferred = GENDER_ALIASES.get(_normalize(preferences.get('gender')))
+        if preferred and preferred != 'unisex':
+            return preferred
+        for gender, pattern in GENDER_PATTERNS:
+            if pattern.search(question):
+                return gender
+        return None
+
+    def detect_categories(self, question, query_vector, preferences):
+        if not self.categories:
+            return None
+
+        # Explicit category names in style preferences or the query ("sportswear for men")
+        styles = preferences.get('style_preferences') or []
+        if isinstance(styles, str):
+            styles = [styles]
+        text = ' '.join([question] + [str(style) for style in styles]).lower()
+        words = [word for word in re.findall(r"[a-z]+", text) if len(word) >= 4]
+        mentioned = [category for category in self.categories
+                     if category and (category in text or any(category.startswith(word) for word in words))]
+        if mentioned:
+            return mentioned
+
+        # Nearest-centroid classifier: keep categories close to the best match
+        similarities = self.category_centroids @ np.asarray(query_vector, dtype=np.float32)
+        order = np.argsort(-similarities)
+        best = similarities[order[0]]
+        selected = [self.categories[i] for i in order[:self.max_categories]
+                    if similarities[i] >= best - self.centroid_margin]
+        return selected if len(selected) < len(self.categories) else None
+
+    def route(self, question, query_vector, preferences=None):
+        """Return (partitions to search, route description); None partitions means full search"""
+        preferences = preferences or {}
+        gender = self.detect_gender(question, preferences) if 'gender' in self.partition_by else None
+        categories = self.detect_categories(question, query_vector, preferences)
+
+        if gender is None and categories is None:
+            return None, 'all'
+
+        selected = []
+        for partition in self.partitions:
+            if gender is not None and partition.key.get('gender') not in (gender, 'unisex', ''):
+                continue
+            if categories is not None and partition.key.get('category') not in categories:
+                continue
+            selected.append(partition)
+
+        route = ','.join(filter(None, [f"gender={gender}" if gender else None,
+                                       f"category={'|'.join(categories)}" if categories else None]))
+        return (selected or None), route
+
+    def search(self, partitions, query_vector, k):
+        """Search the given partitions and merge hits by L2 distance; returns (docs, scanned)"""
+        query = np.asarray([query_vector], dtype=np.float32)
+        distances, rows = [], []
+        scanned = 0
+        for partition in partitions:
+            scanned += len(partition)
+            found, local_ids = partition.index.search(query, min(k, len(partition)))
+            valid = local_ids[0] >= 0
+            distances.append(found[0][valid])
+            rows.append(partition.rows[local_ids[0][valid]])
+
+        if not distances:
+            return [], scanned
+        distances = np.concatenate(distances)
+        rows = np.concatenate(rows)
+        best = np.argsort(distances, kind='stable')[:k]
+
+        docstore_ids = self.vector_store.index_to_docstore_id
+        docs = [self.vector_store.docstore.search(docstore_ids[int(rows[i])]) for i in best]
+        return docs, scanned
+
+    def stats(self):
+        return {
+            'partition_by': self.partition_by,
+            'partitions': [{'key': p.key, 'size': len(p)} for p in self.partitions]
+        }
@@ -0,0 +1,213 @@
+"""
+Change-data-capture sync from products.updated_at for the StyleMe RAG service.
+
+A background loop polls `products` for rows changed since an
+(updated_at, id) watermark, in batches. Price and stock aren't embedded: they
+are written in place into LiveAttributes, and stock-outs are filtered at query
+time. Only products whose document text or metadata changed (or that are new)
+are re-embedded and upserted. Documents are embedded first, outside any lock
+searches wait on. The upsert then runs in place: the products' old rows are
+removed (remove_ids) and the new vectors are appended. Only the index rows
+after the first removed one are renumbered. Products are found through the
+row-aligned ProductAttributeMatrix, so there is no docstore scan or index copy.
+Searches hold the read side of a ReadWriteLock and the upsert holds the write
+side, so a search never sees a half-applied batch.
+
+Only rows whose updated_at second has fully passed (updated_at < NOW()) are
+read. Changes made later in the same second are therefore never skipped by
+the watermark.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from create_vector_store import build_product_document, fetch_current_watermark
+
+# Same columns as the index build query, plus the watermark columns
+CHANGED_PRODUCTS_QUERY = '''
+    SELECT p.id, p.name, p.slug, p.description, p.brand, p.color, p.size,
+           p.occasion, p.gender, p.price, p.discount_price, p.stock, p.image1,
+           c.name as category_name, p.updated_at,
+           UNIX_TIMESTAMP(p.updated_at) AS updated_ts, UNIX_TIMESTAMP() AS db_now
+    FROM products p
+    LEFT JOIN categories c ON p.category_id = c.id
+    WHERE (p.updated_at > %s OR (p.updated_at = %s AND p.id > %s))
+      AND p.updated_at < NOW()
+    ORDER BY p.updated_at, p.id
+    LIMIT %s
+'''
+
+
+def fetch_changes(cursor, watermark, batch_size):
+    """Fetch up to batch_size product rows changed after the (updated_at, id) watermark"""
+    updated_at, last_id = watermark
+    cursor.execute(CHANGED_PRODUCTS_QUERY, (updated_at, updated_at, last_id, batch_size))
+    return cursor.fetchall()
+
+
+def indexed_documents(vector_store, attributes, product_ids):
+    """Indexed Document per product ID (None when not indexed); attributes are aligned with the index rows"""
+    docstore_ids = vector_store.index_to_docstore_id
+    return [vector_store.docstore.search(docstore_ids[int(row)]) if row >= 0 else None
+            for row in attributes.rows_for(product_ids)]
+
+
+def document_changes(vector_store, attributes, products):
+    """Products whose document differs from the indexed one (or that aren't indexed yet)"""
+    indexed = indexed_documents(vector_store, attributes, [product['id'] for product in products])
+    changed = []
+    for product, current in zip(products, indexed):
+        document = build_product_document(product)
+        if current is None or current.page_content != document.page_content or current.metadata != document.metadata:
+            changed.append(product)
+    return changed
+
+
+def embed_changes(embeddings, products):
+    """Documents and embeddings for changed products (slow; done before taking the write lock)"""
+    documents = [build_product_document(product) for product in products]
+    return documents, embeddings.embed_documents([doc.page_content for doc in documents])
+
+
+def apply_changes(vector_store, attributes, products, documents, vectors):
+    """Upsert embedded documents into the store in place.
+
+    Returns (removed rows, sorted; vectors as stored for the appended rows). Rows after a
+    removed one move down, and the new documents take the last len(products) rows.
+    """
+    removed = np.unique(attributes.rows_for([product['id'] for product in products]))
+    removed = removed[removed >= 0]
+
+    docstore_ids = vector_store.index_to_docstore_id
+    if len(removed):
+        vector_store.index.remove_ids(removed)
+        vector_store.docstore.delete([docstore_ids[int(row)] for row in removed])
+        # Renumber only the rows after the first removed one
+        first, removed_set = int(removed[0]), set(removed.tolist())
+        moved = [docstore_ids.pop(row) for row in range(first, len(docstore_ids))]
+        kept = [docstore_id for row, docstore_id in enumerate(moved, first) if row not in removed_set]
+        docstore_ids.update(zip(range(first, first + len(kept)), kept))
+
+    start = vector_store.index.ntotal
+    vector_store.add_embeddings(
+        zip([doc.page_content for doc in documents], vectors),
+        metadatas=[doc.metadata for doc in documents],
+        ids=[f"product-{product['id']}" for product in products]
+    )
+    return removed, vector_store.index.reconstruct_n(start, vector_store.index.ntotal - start)
+
+
+def shifted_rows(rows, removed):
+    """New positions of kept rows after `removed` (sorted) were deleted from the index"""
+    return rows - np.searchsorted(removed, rows)
+
+
+class ReadWriteLock:
+    """Shared lock for searches, exclusive for in-place index updates; waiting writers go first"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class ProductSyncer:
+    """Background loop feeding batches of changed products to on_batch(products)"""
+
+    def __init__(self, connect, on_batch, watermark=None, interval=5.0, batch_size=500, on_lag=None):
+        self.connect = connect
+        self.on_batch = on_batch
+        self.on_lag = on_lag
+        self.watermark = watermark
+        self.interval = interval
+        self.batch_size = batch_size
+        self.last_sync_time = None
+        self._reset_to = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='product-cdc-sync', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def reset(self, watermark):
+        """Restart from a new watermark (after a full index version swap) on the next poll"""
+        self._reset_to = watermark
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sync_once()
+            except Exception as e:
+                print(f"❌ Product sync failed: {e}")
+
+    def sync_once(self):
+        """Drain all pending changes in batches; returns the number of rows applied"""
+        with self._lock:
+            conn = self.connect()
+            try:
+                cursor = conn.cursor(dictionary=True)
+                if self._reset_to is not None:
+                    self.watermark, self._reset_to = self._reset_to, None
+                if self.watermark is None:
+                    self.watermark = fetch_current_watermark(cursor)
+
+                applied = 0
+                while self._reset_to is None:
+                    rows = fetch_changes(cursor, self.watermark, self.batch_size)
+                    if not rows:
+                        break
+                    apply_start = time.perf_counter()
+                    self.on_batch(rows)
+                    if self.on_lag:
+                        # Change-to-applied delay of the oldest change in the batch (database clock)
+                        age = float(rows[0]['db_now']) - float(rows[0]['updated_ts'])
+                        self.on_lag(max(age, 0.0) + time.perf_counter() - apply_start)
+                    self.watermark = (str(rows[-1]['updated_at']), rows[-1]['id'])
+                    applied += len(rows)
+                    if len(rows) < self.batch_size:
+                        break
+
+                cursor.close()
+            finally:
+                conn.close()
+            self.last_sync_time = time.time()
+            return applied
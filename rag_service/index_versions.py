@@ -0,0 +1,215 @@
+"""
+Versioned index snapshots for the StyleMe RAG service.
+
+Every build is written to its own directory under VECTOR_STORE_PATH/versions/
+together with a manifest.json (embedding model, vector count, per-file
+SHA-256 checksums, build time). The live version is published by atomically
+replacing the CURRENT pointer file, so a crash mid-build never touches the
+index being served. Each worker watches the pointer and hot-swaps to the new
+version; old versions are kept (INDEX_KEEP_VERSIONS) for instant rollback.
+
+Usage:
+    python index_versions.py list
+    python index_versions.py rollback [VERSION]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+
+VERSIONS_DIRNAME = 'versions'
+POINTER_FILENAME = 'CURRENT'
+MANIFEST_FILENAME = 'manifest.json'
+KEEP_VERSIONS = int(os.getenv('INDEX_KEEP_VERSIONS', 5))
+
+
+def _versions_dir(root):
+    return os.path.join(root, VERSIONS_DIRNAME)
+
+
+def version_path(root, version):
+    return os.path.join(_versions_dir(root), version)
+
+
+def _file_checksums(directory):
+    """SHA-256 of every artifact in a version directory, keyed by relative path"""
+    checksums = {}
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            relative = os.path.relpath(path, directory)
+            if relative == MANIFEST_FILENAME:
+                continue
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            checksums[relative] = digest.hexdigest()
+    return checksums
+
+
+def stage_version(root):
+    """Create an empty staging directory for a new build; returns (version, path)"""
+    version = time.strftime('%Y%m%d-%H%M%S') + '-' + uuid.uuid4().hex[:6]
+    staging = os.path.join(_versions_dir(root), f'.{version}.tmp')
+    os.makedirs(staging)
+    return version, staging
+
+
+def commit_version(root, version, staging, **info):
+    """Write the manifest and move a staged build into place (not yet published)"""
+    manifest = dict(info, version=version, built_at=time.time(), files=_file_checksums(staging))
+    with open(os.path.join(staging, MANIFEST_FILENAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.rename(staging, version_path(root, version))
+    return manifest
+
+
+def publish(root, version):
+    """Atomically point CURRENT at a version; watchers pick the change up"""
+    if not os.path.isdir(version_path(root, version)):
+        raise ValueError(f"Unknown index version: {version}")
+    pointer = os.path.join(root, POINTER_FILENAME)
+    tmp = f'{pointer}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        f.write(version + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, pointer)
+
+
+def current_version(root):
+    """Return the published version name, or None if nothing is published"""
+    try:
+        with open(os.path.join(root, POINTER_FILENAME)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resolve(root):
+    """Return (version, directory) to load; legacy unversioned indexes return (None, root)"""
+    version = current_version(root)
+    if version is not None:
+        return version, version_path(root, version)
+    if os.path.exists(os.path.join(root, 'index.faiss')):
+        return None, root
+    raise FileNotFoundError(f"Vector store not found at {root}. Please run create_vector_store.py first.")
+
+
+def load_manifest(root, version):
+    with open(os.path.join(version_path(root, version), MANIFEST_FILENAME)) as f:
+        return json.load(f)
+
+
+def verify(root, version):
+    """Check a version's files against its manifest checksums"""
+    manifest = load_manifest(root, version)
+    return _file_checksums(version_path(root, version)) == manifest['files']
+
+
+def list_versions(root):
+    """Manifests of all committed versions, newest first"""
+    versions_dir = _versions_dir(root)
+    if not os.path.isdir(versions_dir):
+        return []
+    manifests = []
+    for name in os.listdir(versions_dir):
+        if name.startswith('.') or not os.path.exists(os.path.join(versions_dir, name, MANIFEST_FILENAME)):
+            continue
+        manifests.append(load_manifest(root, name))
+    return sorted(manifests, key=lambda m: m['built_at'], reverse=True)
+
+
+def previous_version(root):
+    """The newest version built before the current one (the rollback target)"""
+    current = current_version(root)
+    versions = [m['version'] for m in list_versions(root)]
+    if current not in versions:
+        return versions[0] if versions else None
+    older = versions[versions.index(current) + 1:]
+    return older[0] if older else None
+
+
+def prune(root, keep=KEEP_VERSIONS):
+    """Delete old versions beyond the newest `keep`, never the current one"""
+    current = current_version(root)
+    removed = []
+    for manifest in list_versions(root)[keep:]:
+        if manifest['version'] != current:
+            shutil.rmtree(version_path(root, manifest['version']), ignore_errors=True)
+            removed.append(manifest['version'])
+    return removed
+
+
+class VersionWatcher:
+    """Polls the CURRENT pointer and calls on_change(version) when it moves.
+
+    A version that fails to load is not retried until CURRENT points somewhere else.
+    """
+
+    def __init__(self, root, on_change, interval=2.0, version=None):
+        self.root = root
+        self.on_change = on_change
+        self.interval = interval
+        self.version = version
+        self.failed_version = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='index-version-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            version = current_version(self.root)
+            if version is None or version in (self.version, self.failed_version):
+                continue
+            try:
+                self.on_change(version)
+                self.version = version
+                self.failed_version = None
+            except Exception as e:
+                # Keep serving the loaded version until a different one is published
+                self.failed_version = version
+                print(f"❌ Failed to load index version {version}, skipping it until CURRENT changes: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['list', 'rollback'])
+    parser.add_argument('version', nargs='?', help='Version to roll back to (default: the previous one)')
+    parser.add_argument('--root', default=os.getenv('VECTOR_STORE_PATH', 'faiss_index'))
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        current = current_version(args.root)
+        for manifest in list_versions(args.root):
+            marker = '*' if manifest['version'] == current else ' '
+            built = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(manifest['built_at']))
+            print(f"{marker} {manifest['version']}  {built}  {manifest.get('count', '?'):>8} vectors  {manifest.get('model', '')}")
+        return
+
+    target = args.version or previous_version(args.root)
+    if target is None:
+        print("❌ No earlier version to roll back to")
+        exit(1)
+    if not verify(args.root, target):
+        print(f"❌ Version {target} failed checksum verification")
+        exit(1)
+    publish(args.root, target)
+    print(f"⏪ Published index version {target}; running workers will reload it")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Volatile product attributes (price, discount price, stock) for the StyleMe RAG service.
+
+Price and stock used to be part of the index. The embedded text carried
+"Price: Rs. ..." and only in-stock products were indexed, so every price
+change or stock-out cost a re-embed. Now documents hold only the fields that
+describe the product. Price, discount price and stock live in LiveAttributes,
+a set of NumPy arrays keyed by product ID and saved next to the index as
+live_attributes.npz. They are applied at query time: out-of-stock products
+are filtered from retrieval, and prices are read for prompt context, budget
+scoring and hydrated responses.
+
+A CDC batch that only touches these columns becomes an in-place array write,
+with no embedding, index copy or cache rebuild. Products the table hasn't
+seen are appended, which copies the arrays once. Readers take the arrays as
+one tuple, so an append never gives them a mismatched set.
+"""
+
+import os
+
+import numpy as np
+
+LIVE_FILENAME = 'live_attributes.npz'
+
+
+def _price(value):
+    return float(value) if value else np.nan
+
+
+class LiveAttributes:
+    """Price, discount price and stock per product ID, writable in place"""
+
+    def __init__(self, product_ids, prices, discount_prices, stock):
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        size = int(product_ids.max()) + 1 if len(product_ids) else 0
+        slot_by_id = np.full(size, -1, dtype=np.int64)
+        slot_by_id[product_ids] = np.arange(len(product_ids))
+        # (slot_by_id, product_ids, prices, discount_prices, stock); NaN prices mean unset
+        self._arrays = (
+            slot_by_id,
+            product_ids,
+            np.asarray(prices, dtype=np.float64),
+            np.asarray(discount_prices, dtype=np.float64),
+            np.asarray(stock, dtype=np.int32)
+        )
+        self._out_of_stock = int((self._arrays[4] <= 0).sum())
+
+    @classmethod
+    def from_products(cls, products):
+        """Build from product rows as returned by the vector store builder query"""
+        return cls(
+            [int(product['id']) for product in products],
+            [_price(product.get('price')) for product in products],
+            [_price(product.get('discount_price')) for product in products],
+            [int(product.get('stock') or 0) for product in products]
+        )
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        """Fallback for indexes built before live_attributes.npz existed"""
+        return cls(
+            catalog.product_ids(),
+            [_price(value) for value in catalog.column('price')],
+            [_price(value) for value in catalog.column('discount_price')],
+            [int(value or 0) for value in catalog.column('stock')]
+        )
+
+    @classmethod
+    def load(cls, directory):
+        """Load live_attributes.npz from an index directory; None when it doesn't exist"""
+        path = os.path.join(directory, LIVE_FILENAME)
+        if not os.path.exists(path):
+            return None
+        data = np.load(path)
+        return cls(data['product_ids'], data['prices'], data['discount_prices'], data['stock'])
+
+    def save(self, directory):
+        _, product_ids, prices, discount_prices, stock = self._arrays
+        np.savez(os.path.join(directory, LIVE_FILENAME), product_ids=product_ids, prices=prices,
+                 discount_prices=discount_prices, stock=stock)
+
+    def __len__(self):
+        return len(self._arrays[1])
+
+    def _slots(self, product_ids, slot_by_id):
+        ids = np.asarray(product_ids, dtype=np.int64)
+        slots = np.full(len(ids), -1, dtype=np.int64)
+        known = (ids >= 0) & (ids < len(slot_by_id))
+        slots[known] = slot_by_id[ids[known]]
+        return slots
+
+    def update(self, products):
+        """Write changed rows' price, discount price and stock; returns products whose availability flipped"""
+        slot_by_id, product_ids, prices, discount_prices, stock = self._arrays
+        ids = [int(product['id']) for product in products]
+        slots = self._slots(ids, slot_by_id)
+
+        new = slots < 0
+        if new.any():
+            added = [product for product, is_new in zip(products, new) if is_new]
+            grown = LiveAttributes(
+                np.concatenate([product_ids, [int(product['id']) for product in added]]),
+                np.concatenate([prices, [_price(product.get('price')) for product in added]]),
+                np.concatenate([discount_prices, [_price(product.get('discount_price')) for product in added]]),
+                np.concatenate([stock, [int(product.get('stock') or 0) for product in added]])
+            )
+            self._arrays = grown._arrays
+            slot_by_id, product_ids, prices, discount_prices, stock = self._arrays
+            slots = self._slots(ids, slot_by_id)
+
+        was_available = stock[slots] > 0
+        for product, slot in zip(products, slots):
+            prices[slot] = _price(product.get('price'))
+            discount_prices[slot] = _price(product.get('discount_price'))
+            stock[slot] = int(product.get('stock') or 0)
+        self._out_of_stock = int((stock <= 0).sum())
+        return int((was_available[~new] != (stock[slots][~new] > 0)).sum())
+
+    def in_stock(self, product_ids):
+        """Boolean per product ID; products the table doesn't know are assumed available"""
+        slot_by_id, _, _, _, stock = self._arrays
+        slots = self._slots(product_ids, slot_by_id)
+        return np.where(slots >= 0, stock[slots] > 0, True)
+
+    def effective_prices(self, product_ids):
+        """Selling price per product ID (discount price when set), 0 when unknown"""
+        slot_by_id, _, prices, discount_prices, _ = self._arrays
+        slots = self._slots(product_ids, slot_by_id)
+        selling = np.where(np.isnan(discount_prices[slots]) | (discount_prices[slots] <= 0),
+                           prices[slots], discount_prices[slots])
+        return np.where((slots >= 0) & ~np.isnan(selling), selling, 0.0)
+
+    def get(self, product_id):
+        """{'price', 'discount_price', 'stock'} for one product; None when unknown"""
+        slot_by_id, _, prices, discount_prices, stock = self._arrays
+        slot = self._slots([product_id], slot_by_id)[0]
+        if slot < 0:
+            return None
+        values = {'price': prices[slot], 'discount_price': discount_prices[slot]}
+        record = {field: None if np.isnan(value) else round(float(value), 2) for field, value in values.items()}
+        record['stock'] = int(stock[slot])
+        return record
+
+    def fetch_depth(self, k, max_overfetch):
+        """Search depth that still leaves k results after dropping out-of-stock products (bounded)"""
+        return k + min(self.out_of_stock(), int(k * max_overfetch))
+
+    def out_of_stock(self):
+        return self._out_of_stock
+
+    def stats(self):
+        slot_by_id, product_ids, prices, discount_prices, stock = self._arrays
+        return {
+            'products': len(product_ids),
+            'out_of_stock': self.out_of_stock(),
+            'bytes': int(slot_by_id.nbytes + product_ids.nbytes + prices.nbytes + discount_prices.nbytes + stock.nbytes)
+        }
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Load-test harness for the StyleMe RAG service.
+
+Replays the query and user mix recorded in search_logs / user_search_history
+(or a synthetic Zipfian workload) against /search and /search_with_preferences
+at a fixed open-loop arrival rate, and reports throughput, p50/p95/p99 latency,
+error rate and the saturation point for each serving configuration.
+
+Run the service with the stub LLM so Groq is never called:
+
+    python load_test.py export-latencies --output benchmarks/groq_latencies.json
+    LLM_PROVIDER=stub STUB_LLM_LATENCY_FILE=benchmarks/groq_latencies.json python app.py
+
+    python load_test.py run --label single-worker --rates 1,2,5,10,20 --duration 30
+    python load_test.py run --label gunicorn-4 --source synthetic --rates 5,10,20,40
+    python load_test.py report
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'user': os.getenv('DB_USER', 'root'),
+    'password': os.getenv('DB_PASSWORD', ''),
+    'database': os.getenv('DB_NAME', 'ecommerce_sl')
+}
+
+SYNTHETIC_QUERIES = [
+    "men's shirt", "women's dress red color", "casual wear under 3000 rupees", "formal trouser black",
+    "saree traditional", "oversized tee white", "sportswear for men", "blue jeans women",
+    "party dress", "affordable shirts", "white linen shirt", "office wear for women",
+    "traditional sarong", "running shoes", "black leather belt", "kids party wear",
+    "summer dress floral", "denim jacket", "formal shirt blue", "wedding saree silk"
+]
+
+SYNTHETIC_PREFERENCES = [
+    {'style_preferences': ['casual'], 'color_preferences': ['blue', 'white'], 'budget_min': 1000, 'budget_max': 5000, 'occasion': 'casual'},
+    {'style_preferences': ['party', 'western'], 'color_preferences': ['red', 'black'], 'budget_min': 2000, 'budget_max': 15000, 'occasion': 'party'},
+    {'style_preferences': ['formal'], 'color_preferences': ['grey'], 'budget_min': 3000, 'budget_max': 10000, 'occasion': 'office'}
+]
+
+# A step is saturated once the service falls this far behind the offered rate
+SATURATION_THROUGHPUT_RATIO = 0.9
+SATURATION_ERROR_RATE = 0.01
+
+
+def zipf_weights(count, exponent):
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+def load_workload_from_db(limit, window_days):
+    """Read (user_id, query) pairs from search_logs and user_search_history"""
+    import mysql.connector
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT user_id, query FROM search_logs
+        WHERE created_at >= NOW() - INTERVAL %s DAY
+        ORDER BY created_at DESC LIMIT %s
+    ''', (window_days, limit))
+    rows = cursor.fetchall()
+    cursor.execute('''
+        SELECT user_id, search_query FROM user_search_history
+        WHERE created_at >= NOW() - INTERVAL %s DAY
+        ORDER BY created_at DESC LIMIT %s
+    ''', (window_days, limit))
+    rows += cursor.fetchall()
+    cursor.close()
+    conn.close()
+
+    # Replaying the raw rows keeps the recorded popularity and user mix
+    return [(int(user_id or 0), query) for user_id, query in rows if query and query.strip()]
+
+
+def synthetic_workload(size, users, exponent, seed):
+    """Zipf-distributed queries and users, like real search traffic"""
+    rng = random.Random(seed)
+    queries = rng.choices(SYNTHETIC_QUERIES, weights=zipf_weights(len(SYNTHETIC_QUERIES), exponent), k=size)
+    user_ids = rng.choices(range(1, users + 1), weights=zipf_weights(users, exponent), k=size)
+    return list(zip(user_ids, queries))
+
+
+def build_request(url, user_id, query, preferences_ratio, rng):
+    if rng.random() < preferences_ratio:
+        return 'search_with_preferences', f"{url}/search_with_preferences", {
+            'user_id': user_id,
+            'query': query,
+            'preferences': rng.choice(SYNTHETIC_PREFERENCES),
+            'context': {}
+        }
+    # /search rejects guests (user_id 0), so replay them as a registered user
+    return 'search', f"{url}/search", {'user_id': user_id or 1, 'query': query}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_step(url, workload, rate, duration, preferences_ratio, timeout, max_workers, seed):
+    """Offer Poisson arrivals at `rate` req/s for `duration` seconds and collect results"""
+    rng = random.Random(seed)
+    sessions = threading.local()
+    results = []
+    results_lock = threading.Lock()
+
+    def send(endpoint, request_url, payload, scheduled_at):
+        session = getattr(sessions, 'session', None)
+        if session is None:
+            session = sessions.session = requests.Session()
+        status = 'error'
+        try:
+            response = session.post(request_url, json=payload, timeout=timeout)
+            status = response.status_code
+        except requests.exceptions.Timeout:
+            status = 'timeout'
+        except requests.exceptions.RequestException:
+            status = 'connection_error'
+        # Latency is measured from the scheduled arrival, so queueing in the
+        # client counts against the service (no coordinated omission)
+        latency = time.perf_counter() - scheduled_at
+        with results_lock:
+            results.append((endpoint, status, latency))
+
+    start = time.perf_counter()
+    next_arrival = start
+    sent = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while next_arrival - start < duration:
+            now = time.perf_counter()
+            if next_arrival > now:
+                time.sleep(next_arrival - now)
+            user_id, query = workload[sent % len(workload)]
+            endpoint, request_url, payload = build_request(url, user_id, query, preferences_ratio, rng)
+            executor.submit(send, endpoint, request_url, payload, next_arrival)
+            sent += 1
+            next_arrival += rng.expovariate(rate)
+    elapsed = time.perf_counter() - start
+
+    ok_latencies = sorted(latency * 1000 for _, status, latency in results if status == 200)
+    errors = {}
+    for _, status, _ in results:
+        if status != 200:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+    by_endpoint = {}
+    for endpoint, _, _ in results:
+        by_endpoint[endpoint] = by_endpoint.get(endpoint, 0) + 1
+
+    return {
+        'offered_rps': rate,
+        'sent': sent,
+        'completed': len(results),
+        'elapsed_s': round(elapsed, 2),
+        'throughput_rps': round(len(ok_latencies) / elapsed, 2) if elapsed else 0.0,
+        'error_rate': round(1 - len(ok_latencies) / len(results), 4) if results else 0.0,
+        'errors': errors,
+        'endpoints': by_endpoint,
+        'p50_ms': round(percentile(ok_latencies, 50), 1) if ok_latencies else None,
+        'p95_ms': round(percentile(ok_latencies, 95), 1) if ok_latencies else None,
+        'p99_ms': round(percentile(ok_latencies, 99), 1) if ok_latencies else None,
+        'mean_ms': round(statistics.fmean(ok_latencies), 1) if ok_latencies else None
+    }
+
+
+def is_saturated(step, slo_ms):
+    if step['throughput_rps'] < step['offered_rps'] * SATURATION_THROUGHPUT_RATIO:
+        return True
+    if step['error_rate'] > SATURATION_ERROR_RATE:
+        return True
+    return bool(slo_ms and step['p99_ms'] and step['p99_ms'] > slo_ms)
+
+
+def print_steps(label, steps, saturation):
+    print(f"\n📊 {label}")
+    print(f"   {'offered':>8} {'thrpt':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7}")
+    for step in steps:
+        marker = '  ⚠️ saturated' if step['saturated'] else ''
+        print(f"   {step['offered_rps']:>8.1f} {step['throughput_rps']:>8.1f} "
+              f"{step['p50_ms'] or 0:>7.1f}ms {step['p95_ms'] or 0:>7.1f}ms {step['p99_ms'] or 0:>7.1f}ms "
+              f"{step['error_rate']:>6.1%}{marker}")
+    if saturation['saturated_at_rps'] is None:
+        print(f"   ✅ Not saturated up to {steps[-1]['offered_rps']} req/s")
+    else:
+        print(f"   🔥 Saturated at {saturation['saturated_at_rps']} req/s "
+              f"(max sustainable: {saturation['max_sustainable_rps']} req/s)")
+
+
+def command_run(args):
+    if args.source == 'db':
+        workload = load_workload_from_db(args.workload_size, args.window_days)
+        if not workload:
+            print("❌ No recorded searches found in the window - use --source synthetic")
+            return 1
+        random.Random(args.seed).shuffle(workload)
+    else:
+        workload = synthetic_workload(args.workload_size, args.users, args.zipf, args.seed)
+    print(f"📝 Workload: {len(workload)} requests from {args.source} source")
+
+    try:
+        service = requests.get(f"{args.url}/", timeout=5).json()
+    except requests.exceptions.RequestException as e:
+        print(f"❌ Cannot reach RAG service at {args.url}: {e}")
+        return 1
+    provider = service.get('provider_info', {}).get('current_provider')
+    print(f"🤖 Service provider: {provider}")
+    if provider != 'stub' and not args.allow_real_llm:
+        print("❌ Service is not using the stub LLM - start it with LLM_PROVIDER=stub or pass --allow-real-llm")
+        return 1
+
+    steps = []
+    for rate in [float(rate) for rate in args.rates.split(',')]:
+        print(f"🚀 Offering {rate} req/s for {args.duration}s...")
+        step = run_step(args.url, workload, rate, args.duration, args.preferences_ratio,
+                        args.timeout, args.max_workers, args.seed)
+        step['saturated'] = is_saturated(step, args.slo_ms)
+        steps.append(step)
+        if step['saturated'] and args.stop_on_saturation:
+            break
+
+    saturated = [step['offered_rps'] for step in steps if step['saturated']]
+    sustainable = [step['offered_rps'] for step in steps if not step['saturated']]
+    saturation = {
+        'saturated_at_rps': saturated[0] if saturated else None,
+        'max_sustainable_rps': max(sustainable) if sustainable else None
+    }
+    print_steps(args.label, steps, saturation)
+
+    results = {}
+    if os.path.exists(args.output):
+        with open(args.output) as f:
+            results = json.load(f)
+    results[args.label] = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'url': args.url,
+        'source': args.source,
+        'provider': provider,
+        'preferences_ratio': args.preferences_ratio,
+        'slo_ms': args.slo_ms,
+        'steps': steps,
+        **saturation
+    }
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results for '{args.label}' written to {args.output}")
+    return 0
+
+
+def command_report(args):
+    if not os.path.exists(args.output):
+        print(f"❌ No results found at {args.output}")
+        return 1
+    with open(args.output) as f:
+        results = json.load(f)
+
+    print(f"{'configuration':<24} {'max rps':>8} {'saturates':>10} {'best p99':>10}")
+    for label, run in results.items():
+        p99s = [step['p99_ms'] for step in run['steps'] if step['p99_ms'] is not None and not step['saturated']]
+        print(f"{label:<24} {run['max_sustainable_rps'] or 0:>8.1f} "
+              f"{run['saturated_at_rps'] or '-':>10} {min(p99s) if p99s else 0:>8.1f}ms")
+    if args.verbose:
+        for label, run in results.items():
+            print_steps(label, run['steps'], run)
+    return 0
+
+
+def command_export_latencies(args):
+    """Export recorded search processing times as stub LLM latency samples"""
+    import mysql.connector
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+    # processing_time covers the whole request, which the Groq call dominates
+    cursor.execute('''
+        SELECT processing_time FROM search_logs
+        WHERE processing_time IS NOT NULL AND created_at >= NOW() - INTERVAL %s DAY
+        ORDER BY created_at DESC LIMIT %s
+    ''', (args.window_days, args.limit))
+    latencies = [float(row[0]) for row in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+
+    if not latencies:
+        print("❌ No processing times recorded in search_logs for that window")
+        return 1
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump({'source': 'search_logs.processing_time', 'latencies': latencies}, f)
+    latencies.sort()
+    print(f"💾 Exported {len(latencies)} latency samples to {args.output}")
+    print(f"   p50 {percentile(latencies, 50) * 1000:.0f}ms, p95 {percentile(latencies, 95) * 1000:.0f}ms, "
+          f"p99 {percentile(latencies, 99) * 1000:.0f}ms")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test harness for the RAG service')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run = subparsers.add_parser('run', help='Replay a workload at increasing arrival rates')
+    run.add_argument('--url', default=f"http://localhost:{os.getenv('FLASK_PORT', 5000)}")
+    run.add_argument('--label', default='default', help='Name of the serving configuration under test')
+    run.add_argument('--source', choices=['db', 'synthetic'], default='db')
+    run.add_argument('--rates', default='1,2,5,10,20', help='Comma-separated arrival rates (req/s)')
+    run.add_argument('--duration', type=float, default=30, help='Seconds per rate step')
+    run.add_argument('--preferences-ratio', type=float, default=0.5,
+                     help='Fraction of requests sent to /search_with_preferences')
+    run.add_argument('--workload-size', type=int, default=5000)
+    run.add_argument('--window-days', type=int, default=30)
+    run.add_argument('--users', type=int, default=500, help='Synthetic user population')
+    run.add_argument('--zipf', type=float, default=1.1, help='Synthetic Zipf exponent')
+    run.add_argument('--slo-ms', type=float, default=None, help='Treat p99 above this as saturated')
+    run.add_argument('--timeout', type=float, default=30)
+    run.add_argument('--max-workers', type=int, default=256, help='Maximum concurrent client requests')
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--stop-on-saturation', action='store_true')
+    run.add_argument('--allow-real-llm', action='store_true', help='Allow running against a service calling Groq')
+    run.add_argument('--output', default=os.path.join('benchmarks', 'load_results.json'))
+    run.set_defaults(handler=command_run)
+
+    report = subparsers.add_parser('report', help='Compare recorded serving configurations')
+    report.add_argument('--output', default=os.path.join('benchmarks', 'load_results.json'))
+    report.add_argument('--verbose', action='store_true')
+    report.set_defaults(handler=command_report)
+
+    export = subparsers.add_parser('export-latencies', help='Export recorded latencies for the stub LLM')
+    export.add_argument('--output', default=os.path.join('benchmarks', 'groq_latencies.json'))
+    export.add_argument('--window-days', type=int, default=30)
+    export.add_argument('--limit', type=int, default=10000)
+    export.set_defaults(handler=command_export_latencies)
+
+    args = parser.parse_args()
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
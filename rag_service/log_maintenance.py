@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Search log maintenance for the StyleMe RAG service.
+
+search_logs, user_search_history and search_preferences_log get rows on every
+search and were never trimmed. Meanwhile every search reads the user's history
+(WHERE user_id = ? ORDER BY created_at DESC LIMIT n). This job keeps the
+tables bounded and that read fast:
+
+1. Indexes. Composite (user_id, created_at) indexes turn the history read
+   into a short backward range scan at any table size. created_at indexes
+   serve the popular-query windows and pruning. Missing ones are added with
+   online DDL. An existing index with the same leading columns counts.
+2. Rollups. Complete days are aggregated per query (lower-cased, trimmed)
+   into search_logs_daily and search_preferences_daily before raw rows go.
+3. Pruning. Raw rows older than LOG_RETENTION_DAYS are deleted in batches of
+   LOG_PRUNE_BATCH_SIZE (user_search_history uses HISTORY_RETENTION_DAYS).
+   Each batch is its own short transaction, with a pause between batches, so
+   row locks never pile up behind a long DELETE. Days that haven't been rolled
+   up yet are never pruned.
+
+A MySQL named lock keeps prefork workers and this CLI from running it at the
+same time.
+
+Usage:
+    python log_maintenance.py             # one pass now (cron-friendly)
+    python log_maintenance.py --dry-run   # indexes and rows that would be pruned, no changes
+"""
+
+import argparse
+import datetime
+import json
+import os
+import threading
+import time
+
+INDEXES = (
+    # (table, index name, columns)
+    ('user_search_history', 'idx_user_created', ('user_id', 'created_at')),
+    ('search_logs', 'idx_user_created', ('user_id', 'created_at')),
+    ('search_logs', 'idx_created', ('created_at',)),
+    ('search_preferences_log', 'idx_user_search', ('user_id', 'created_at')),
+    ('search_preferences_log', 'idx_query_date', ('created_at',)),
+)
+
+ROLLUP_TABLES = (
+    '''
+    CREATE TABLE IF NOT EXISTS search_logs_daily (
+        day DATE NOT NULL,
+        query VARCHAR(255) NOT NULL,
+        searches INT UNSIGNED NOT NULL,
+        users INT UNSIGNED NOT NULL,
+        avg_results DECIMAL(8,2) DEFAULT NULL,
+        avg_processing_time DECIMAL(8,3) DEFAULT NULL,
+        PRIMARY KEY (day, query)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS search_preferences_daily (
+        day DATE NOT NULL,
+        query VARCHAR(255) NOT NULL,
+        searches INT UNSIGNED NOT NULL,
+        users INT UNSIGNED NOT NULL,
+        PRIMARY KEY (day, query)
+    )
+    ''',
+)
+
+# Raw table -> (daily table, INSERT ... SELECT for one [start, end) day); re-running a day overwrites it
+ROLLUPS = {
+    'search_logs': ('search_logs_daily', '''
+        INSERT INTO search_logs_daily (day, query, searches, users, avg_results, avg_processing_time)
+        SELECT DATE(created_at), LEFT(LOWER(TRIM(query)), 255), COUNT(*),
+               COUNT(DISTINCT NULLIF(user_id, 0)), AVG(results_count), AVG(processing_time)
+        FROM search_logs
+        WHERE created_at >= %s AND created_at < %s
+        GROUP BY DATE(created_at), LEFT(LOWER(TRIM(query)), 255)
+        ON DUPLICATE KEY UPDATE searches = VALUES(searches), users = VALUES(users),
+            avg_results = VALUES(avg_results), avg_processing_time = VALUES(avg_processing_time)
+    '''),
+    'search_preferences_log': ('search_preferences_daily', '''
+        INSERT INTO search_preferences_daily (day, query, searches, users)
+        SELECT DATE(created_at), LEFT(LOWER(TRIM(query)), 255), COUNT(*), COUNT(DISTINCT user_id)
+        FROM search_preferences_log
+        WHERE created_at >= %s AND created_at < %s
+        GROUP BY DATE(created_at), LEFT(LOWER(TRIM(query)), 255)
+        ON DUPLICATE KEY UPDATE searches = VALUES(searches), users = VALUES(users)
+    '''),
+}
+
+INDEX_COLUMNS_SQL = '''
+    SELECT index_name AS index_name, GROUP_CONCAT(column_name ORDER BY seq_in_index) AS key_columns
+    FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = %s
+    GROUP BY index_name
+'''
+
+LOCK_NAME = 'styleme_log_maintenance'
+
+
+def ensure_indexes(cursor, dry_run=False):
+    """Add the INDEXES that are missing; returns ['table.index', ...] created (or to create)"""
+    created = []
+    for table in dict.fromkeys(table for table, _, _ in INDEXES):
+        cursor.execute(INDEX_COLUMNS_SQL, (table,))
+        existing = [tuple(row['key_columns'].split(',')) for row in cursor.fetchall()]
+        for index_table, name, columns in INDEXES:
+            if index_table != table or any(key[:len(columns)] == columns for key in existing):
+                continue
+            if not dry_run:
+                print(f"🗂️ Adding index {name} ({', '.join(columns)}) on {table}")
+                cursor.execute(f"ALTER TABLE {table} ADD INDEX {name} ({', '.join(columns)}), "
+                               "ALGORITHM=INPLACE, LOCK=NONE")
+            existing.append(columns)
+            created.append(f'{table}.{name}')
+    return created
+
+
+def rollup_days(conn, cursor, table, today):
+    """Aggregate every complete day not rolled up yet; returns (days rolled, first day not rolled up)"""
+    daily_table, sql = ROLLUPS[table]
+    cursor.execute(f'SELECT MAX(day) AS day FROM {daily_table}')
+    row = cursor.fetchone()
+    if row and row['day']:
+        day = row['day'] + datetime.timedelta(days=1)
+    else:
+        cursor.execute(f'SELECT DATE(MIN(created_at)) AS day FROM {table}')
+        row = cursor.fetchone()
+        day = row['day'] if row and row['day'] else today
+
+    rolled = 0
+    while day < today:
+        next_day = day + datetime.timedelta(days=1)
+        cursor.execute(sql, (day, next_day))
+        conn.commit()
+        day = next_day
+        rolled += 1
+    return rolled, day
+
+
+def count_older(cursor, table, cutoff):
+    cursor.execute(f'SELECT COUNT(*) AS rows_older FROM {table} WHERE created_at < %s', (cutoff,))
+    return int(cursor.fetchone()['rows_older'])
+
+
+def prune(conn, cursor, table, cutoff, batch_size, pause):
+    """Delete rows older than cutoff in short batches; returns the number deleted"""
+    deleted = 0
+    while True:
+        cursor.execute(f'DELETE FROM {table} WHERE created_at < %s ORDER BY created_at LIMIT %s',
+                       (cutoff, batch_size))
+        conn.commit()
+        deleted += cursor.rowcount
+        if cursor.rowcount < batch_size:
+            return deleted
+        time.sleep(pause)
+
+
+class LogMaintenance:
+    """Index checks, daily rollups and batched retention pruning of the search log tables"""
+
+    def __init__(self, connect, retention_days=90, history_retention_days=365, batch_size=1000,
+                 pause=0.1, interval=86400, on_prune=None):
+        self.connect = connect
+        self.retention_days = retention_days
+        self.history_retention_days = history_retention_days
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        # on_prune(table, rows) - metrics hook
+        self.on_prune = on_prune
+        self.last_report = None
+        self._running = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Run now and then every `interval` seconds in a background thread (once per process)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='log-maintenance', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while True:
+            if self._running.acquire(blocking=False):
+                self._run_locked()
+            if self._stop.wait(self.interval):
+                return
+
+    def trigger(self):
+        """Run once now in a background thread; returns False if a run is already in progress"""
+        if not self._running.acquire(blocking=False):
+            return False
+        threading.Thread(target=self._run_locked, name='log-maintenance-now', daemon=True).start()
+        return True
+
+    def _run_locked(self):
+        try:
+            self.run()
+        except Exception as e:
+            print(f"❌ Log maintenance failed: {e}")
+        finally:
+            self._running.release()
+
+    @property
+    def running(self):
+        return self._running.locked()
+
+    def run(self, dry_run=False):
+        """One maintenance pass; returns its report (skipped when another process holds the lock)"""
+        started = time.time()
+        conn = self.connect()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute('SELECT GET_LOCK(%s, 0) AS acquired', (LOCK_NAME,))
+            if not cursor.fetchone()['acquired']:
+                print("⏭️ Log maintenance already running in another process")
+                return {'started_at': started, 'skipped': True}
+            try:
+                report = self._run(conn, cursor, dry_run)
+            finally:
+                cursor.execute('SELECT RELEASE_LOCK(%s) AS released', (LOCK_NAME,))
+                cursor.fetchone()
+            cursor.close()
+        finally:
+            conn.close()
+
+        report = dict(report, started_at=started, duration=round(time.time() - started, 3), dry_run=dry_run)
+        if not dry_run:
+            self.last_report = report
+        print(f"🧹 Log maintenance: {len(report['indexes_created'])} indexes added, "
+              f"{sum(report['rolled_up_days'].values())} days rolled up, "
+              f"{sum(report['pruned'].values())} rows {'to prune' if dry_run else 'pruned'} in {report['duration']}s")
+        return report
+
+    def _run(self, conn, cursor, dry_run):
+        indexes_created = ensure_indexes(cursor, dry_run)
+
+        cursor.execute('SELECT CURDATE() AS today')
+        today = cursor.fetchone()['today']
+        log_cutoff = today - datetime.timedelta(days=self.retention_days)
+        cutoffs = {'user_search_history': today - datetime.timedelta(days=self.history_retention_days)}
+
+        rolled_up = {}
+        for table in ROLLUPS:
+            if dry_run:
+                cutoffs[table] = log_cutoff
+                continue
+            for sql in ROLLUP_TABLES:
+                cursor.execute(sql)
+            rolled_up[table], unrolled = rollup_days(conn, cursor, table, today)
+            cutoffs[table] = min(log_cutoff, unrolled)
+
+        pruned = {}
+        for table, cutoff in cutoffs.items():
+            if dry_run:
+                pruned[table] = count_older(cursor, table, cutoff)
+                continue
+            pruned[table] = prune(conn, cursor, table, cutoff, self.batch_size, self.pause)
+            if self.on_prune and pruned[table]:
+                self.on_prune(table, pruned[table])
+
+        return {
+            'indexes_created': indexes_created,
+            'rolled_up_days': rolled_up,
+            'cutoffs': {table: str(cutoff) for table, cutoff in cutoffs.items()},
+            'pruned': pruned
+        }
+
+    def stats(self):
+        return dict(
+            self.last_report or {},
+            running=self.running,
+            retention_days=self.retention_days,
+            history_retention_days=self.history_retention_days,
+            interval_hours=self.interval / 3600
+        )
+
+
+def from_env(connect, on_prune=None):
+    """LogMaintenance configured from LOG_* / HISTORY_RETENTION_DAYS environment variables"""
+    return LogMaintenance(
+        connect=connect,
+        retention_days=int(os.getenv('LOG_RETENTION_DAYS', 90)),
+        history_retention_days=int(os.getenv('HISTORY_RETENTION_DAYS', 365)),
+        batch_size=int(os.getenv('LOG_PRUNE_BATCH_SIZE', 1000)),
+        pause=float(os.getenv('LOG_PRUNE_PAUSE_MS', 100)) / 1000,
+        interval=float(os.getenv('LOG_MAINTENANCE_INTERVAL', 24)) * 3600,
+        on_prune=on_prune
+    )
+
+
+def main():
+    import mysql.connector
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dry-run', action='store_true', help='Report what would change without changing anything')
+    args = parser.parse_args()
+
+    load_dotenv()
+    db_config = {
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'user': os.getenv('DB_USER', 'root'),
+        'password': os.getenv('DB_PASSWORD', ''),
+        'database': os.getenv('DB_NAME', 'ecommerce_sl')
+    }
+    report = from_env(lambda: mysql.connector.connect(**db_config)).run(dry_run=args.dry_run)
+    print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
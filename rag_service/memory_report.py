@@ -0,0 +1,162 @@
+"""
+Memory accounting and index introspection for the StyleMe RAG service.
+
+Backs the resource report in /vector-store/stats: bytes held by the FAISS
+index and its side structures, the docstore, the embedding model weights and
+the in-process caches, next to the process's own view (RSS, shared vs private
+pages from /proc/self/smaps_rollup). Python object sizes are estimated by
+sampling, since walking every document on each stats call would be slow.
+"""
+
+import itertools
+import sys
+
+import faiss
+import numpy as np
+
+import metrics
+
+# Objects measured per structure when estimating Python-heap sizes
+SAMPLE_SIZE = 200
+
+METRIC_NAMES = {faiss.METRIC_L2: 'L2', faiss.METRIC_INNER_PRODUCT: 'inner_product'}
+
+
+def deep_sizeof(obj, seen=None):
+    """Approximate bytes of a Python object graph (containers, strings, numbers, plain objects)"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, bool, type(None))):
+        return size
+    if isinstance(obj, dict):
+        return size + sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return size + sum(deep_sizeof(item, seen) for item in obj)
+    if hasattr(obj, '__dict__'):
+        return size + deep_sizeof(vars(obj), seen)
+    return size
+
+
+def estimate_bytes(items, count, sample=SAMPLE_SIZE):
+    """Extrapolate the deep size of `count` items from the first `sample` of them"""
+    measured = list(itertools.islice(items, sample))
+    if not measured:
+        return 0
+    return int(sum(deep_sizeof(item) for item in measured) / len(measured) * count)
+
+
+def _unwrap(index):
+    """(inner index, PCA/other transform or None) for an IndexPreTransform"""
+    if isinstance(index, faiss.IndexPreTransform):
+        return faiss.downcast_index(index.index), faiss.downcast_VectorTransform(index.chain.at(0))
+    return index, None
+
+
+def index_bytes(index):
+    """Bytes of an index's codes (plus any transform matrix), computed without serializing it"""
+    index, transform = _unwrap(index)
+    size = index.ntotal * getattr(index, 'code_size', index.d * 4)
+    if transform is not None:
+        # PCAMatrix keeps the full eigenvector matrix next to the projection it applies
+        size += transform.d_in * (transform.d_in + transform.d_out + 2) * 4
+    return int(size)
+
+
+def index_info(index):
+    """Index type and parameters, unwrapping PCA pre-transforms"""
+    info = {
+        'type': type(index).__name__,
+        'dimension': int(index.d),
+        'ntotal': int(index.ntotal),
+        'metric': METRIC_NAMES.get(index.metric_type, str(index.metric_type)),
+        'is_trained': bool(index.is_trained)
+    }
+    index, transform = _unwrap(index)
+    if transform is not None:
+        info['transform'] = {'type': type(transform).__name__, 'd_in': int(transform.d_in), 'd_out': int(transform.d_out)}
+        info['inner_type'] = type(index).__name__
+    info['code_size'] = int(getattr(index, 'code_size', index.d * 4))
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        info['quantizer'] = {faiss.ScalarQuantizer.QT_8bit: 'int8', faiss.ScalarQuantizer.QT_fp16: 'fp16'}.get(
+            index.sq.qtype, str(index.sq.qtype))
+    return info
+
+
+def docstore_bytes(vector_store):
+    """Estimated bytes of the LangChain docstore (page content + metadata) and the row -> id map"""
+    documents = vector_store.docstore._dict
+    id_map = vector_store.index_to_docstore_id
+    return (estimate_bytes(iter(documents.values()), len(documents))
+            + estimate_bytes(iter(id_map.items()), len(id_map)))
+
+
+def model_bytes(embeddings):
+    """Bytes of the embedding model's parameters and buffers (0 if it isn't a torch model)"""
+    model = getattr(embeddings, '_client', None)
+    if model is None or not hasattr(model, 'parameters'):
+        return 0
+    tensors = itertools.chain(model.parameters(), model.buffers())
+    return int(sum(t.numel() * t.element_size() for t in tensors))
+
+
+def attribute_bytes(attributes):
+    """Bytes of the NumPy columns in a ProductAttributeMatrix"""
+    return int(sum(value.nbytes for value in vars(attributes).values() if isinstance(value, np.ndarray)))
+
+
+def partition_bytes(partitions):
+    return int(sum(index_bytes(p.index) + p.rows.nbytes for p in partitions.partitions))
+
+
+def process_memory(pid='self'):
+    """RSS split into shared and private pages (Linux smaps_rollup; own RSS only elsewhere)"""
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                parts = value.split()
+                if len(parts) == 2 and parts[1] == 'kB':
+                    fields[key] = int(parts[0]) * 1024
+    except OSError:
+        return {'rss': metrics.resident_memory_bytes()}
+
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'shared': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+        'private': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+        'anonymous': fields.get('Anonymous', 0),
+        'swap': fields.get('Swap', 0)
+    }
+
+
+def resource_report(vector_store, embeddings=None, catalog=None, attributes=None,
+                    partitions=None, binary_codes=None, similar_products=None, caches=None):
+    """Bytes per component plus process memory; `caches` maps a name to a `bytes` count"""
+    components = {
+        'index': index_bytes(vector_store.index),
+        'docstore': docstore_bytes(vector_store),
+        'embedding_model': model_bytes(embeddings),
+        'catalog': estimate_bytes(iter(catalog._rows.items()), len(catalog)) if catalog is not None else 0,
+        'attributes': attribute_bytes(attributes) if attributes is not None else 0,
+        'partitions': partition_bytes(partitions) if partitions is not None else 0,
+        'binary_codes': binary_codes.stats()['bytes'] if binary_codes is not None else 0,
+        'similar_products': similar_products.stats()['bytes'] if similar_products is not None else 0
+    }
+    caches = dict(caches or {})
+    process = process_memory()
+    accounted = sum(components.values()) + sum(caches.values())
+    return {
+        'components': components,
+        'caches': caches,
+        'accounted': accounted,
+        'process': process,
+        # Interpreter, libraries, allocator slack and anything not itemised above
+        'unaccounted': max(process.get('rss', 0) - accounted, 0)
+    }
@@ -0,0 +1,425 @@
+"""
+Prometheus-compatible metrics for the StyleMe RAG service.
+
+A small dependency-free registry of counters, gauges and histograms rendered
+in the Prometheus text exposition format (version 0.0.4) by the /metrics
+endpoint. Metrics are per process; scrape every worker when running several.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import tracing
+
+# Latency buckets (seconds) covering sub-millisecond lookups up to slow LLM calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Buckets (seconds) for long-running jobs such as vector store refreshes
+JOB_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+# Buckets (texts) for embedding micro-batch sizes
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+class _Metric:
+    """Base class holding labelled values for one metric family"""
+
+    type_name = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._callbacks = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def set_function(self, fn, **labels):
+        """Evaluate `fn` at scrape time instead of storing a value"""
+        with self._lock:
+            self._callbacks[self._key(labels)] = fn
+
+    def value(self, **labels):
+        key = self._key(labels)
+        with self._lock:
+            if key in self._callbacks:
+                return self._callbacks[key]()
+            return self._values.get(key, 0)
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+            callbacks = dict(self._callbacks)
+        for key, fn in callbacks.items():
+            try:
+                values[key] = fn()
+            except Exception:
+                # A failing callback must never break the whole scrape
+                continue
+        return sorted(values.items())
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        for key, value in self._samples():
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError('Counters can only increase')
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    type_name = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed buckets, plus sum and count"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def snapshot(self, **labels):
+        """Return (buckets, cumulative counts, sum, count) for one label set"""
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                return self.buckets, [0] * len(self.buckets), 0.0, 0
+            counts, cumulative = [], 0
+            for count in state['counts']:
+                cumulative += count
+                counts.append(cumulative)
+            return self.buckets, counts, state['sum'], state['count']
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        with self._lock:
+            items = sorted((key, dict(state, counts=list(state['counts']))) for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state['counts']):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(state["sum"])}')
+            lines.append(f'{self.name}_count{labels} {state["count"]}')
+        return lines
+
+
+class Registry:
+    """Ordered collection of metric families"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# === Service metrics ===
+
+STAGE_LATENCY = histogram(
+    'rag_stage_duration_seconds',
+    'Latency of each search pipeline stage (embedding, FAISS search, LLM call, DB helpers, ...)',
+    ['stage'])
+
+REQUEST_LATENCY = histogram(
+    'rag_request_duration_seconds',
+    'End-to-end latency of HTTP requests by endpoint',
+    ['endpoint'])
+
+IN_FLIGHT = gauge(
+    'rag_in_flight_requests',
+    'Requests currently being processed by endpoint',
+    ['endpoint'])
+
+CACHE_REQUESTS = counter(
+    'rag_cache_requests_total',
+    'Cache lookups by cache and result (hit/miss)',
+    ['cache', 'result'])
+
+LLM_TOKENS = counter(
+    'rag_llm_tokens_total',
+    'LLM tokens consumed by direction (input/output)',
+    ['direction'])
+
+ERRORS = counter(
+    'rag_errors_total',
+    'Errors by source and exception type',
+    ['source', 'type'])
+
+REFRESH_DURATION = histogram(
+    'rag_vector_store_refresh_duration_seconds',
+    'Duration of vector store refreshes',
+    ['result'],
+    buckets=JOB_BUCKETS)
+
+PARTITION_ROUTES = counter(
+    'rag_partition_routes_total',
+    'Partitioned searches by routing outcome (routed/full)',
+    ['route'])
+
+VECTORS_SCANNED = counter(
+    'rag_vectors_scanned_total',
+    'Vectors compared by FAISS searches, by search mode (partitioned/full/binary/rescored)',
+    ['mode'])
+
+INDEX_RELOADS = counter(
+    'rag_index_reloads_total',
+    'Index version loads/hot swaps by result',
+    ['result'])
+
+LLM_QUEUE_DEPTH = gauge(
+    'rag_llm_queue_depth',
+    'Requests waiting for an LLM slot')
+
+LLM_ACTIVE = gauge(
+    'rag_llm_active_calls',
+    'LLM calls currently holding a slot')
+
+LLM_SHED = counter(
+    'rag_llm_shed_total',
+    'LLM calls shed to retrieval-only results, by reason (queue_full/timeout/rate_limited)',
+    ['reason'])
+
+ADMISSION_REJECTED = counter(
+    'rag_admission_rejected_total',
+    'Requests rejected with 503 because the process was at its in-flight limit',
+    ['endpoint'])
+
+CACHE_WARM_COVERAGE = gauge(
+    'rag_cache_warm_coverage_ratio',
+    'Share of recent searches whose query embedding the last cache warm-up cached')
+
+CACHE_WARM_HITS = counter(
+    'rag_cache_warm_hits_total',
+    'Requests served from cache entries created by the last warm-up, by cache (embedding/result)',
+    ['cache'])
+
+INDEX_SYNC_LAG = histogram(
+    'rag_index_sync_lag_seconds',
+    'Delay from a product change (updated_at) to its incremental index update',
+    buckets=JOB_BUCKETS)
+
+INDEX_SYNC_CHANGES = counter(
+    'rag_index_sync_changes_total',
+    'Products applied by the CDC sync, by action (upsert = re-embedded, attributes = price/stock only)',
+    ['action'])
+
+INDEX_SYNC_AGE = gauge(
+    'rag_index_sync_age_seconds',
+    'Seconds since the CDC sync last finished polling for changes')
+
+EMBEDDING_BATCH_SIZE = histogram(
+    'rag_embedding_batch_size',
+    'Query texts per batched embedding forward pass',
+    buckets=BATCH_SIZE_BUCKETS)
+
+EMBEDDING_QUEUE_DELAY = histogram(
+    'rag_embedding_queue_delay_seconds',
+    'Time a query waited in the embedding micro-batch queue before its batch started')
+
+SHARD_REQUESTS = counter(
+    'rag_shard_requests_total',
+    'Scatter-gather requests to shard servers by shard and result (ok/timeout/error)',
+    ['shard', 'result'])
+
+SHARD_LATENCY = histogram(
+    'rag_shard_request_duration_seconds',
+    'Latency of shard server searches by shard',
+    ['shard'])
+
+LOG_ROWS_PRUNED = counter(
+    'rag_log_rows_pruned_total',
+    'Search log rows deleted by retention pruning by table',
+    ['table'])
+
+INDEX_SIZE = gauge(
+    'rag_index_vectors',
+    'Number of vectors in the loaded FAISS index')
+
+WORKER_MEMORY = gauge(
+    'rag_worker_resident_memory_bytes',
+    'Resident set size of this worker process')
+
+
+def resident_memory_bytes():
+    """Current RSS from /proc, falling back to peak RSS where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        # ru_maxrss is reported in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+WORKER_MEMORY.set_function(resident_memory_bytes)
+
+
+# === Helpers ===
+
+@contextmanager
+def stage_timer(stage):
+    """Time a block of code into the per-stage latency histogram and the request trace"""
+    start = time.perf_counter()
+    try:
+        with tracing.span(stage):
+            yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage=stage)
+
+
+def timed(stage):
+    """Decorator form of stage_timer, used for the DB helpers"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def track_request(endpoint):
+    """Decorator tracking in-flight count and end-to-end latency of a Flask view"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            IN_FLIGHT.inc(endpoint=endpoint)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+                IN_FLIGHT.dec(endpoint=endpoint)
+        return wrapper
+    return decorator
+
+
+def record_error(source, error):
+    """Count an error by where it happened and its exception type"""
+    ERRORS.inc(source=source, type=type(error).__name__)
+
+
+def record_llm_usage(message):
+    """Count input/output tokens reported on an LLM response message"""
+    usage = getattr(message, 'usage_metadata', None) or {}
+    input_tokens = usage.get('input_tokens')
+    output_tokens = usage.get('output_tokens')
+    if input_tokens is None and output_tokens is None:
+        # Older integrations only report OpenAI-style token_usage
+        token_usage = (getattr(message, 'response_metadata', None) or {}).get('token_usage') or {}
+        input_tokens = token_usage.get('prompt_tokens')
+        output_tokens = token_usage.get('completion_tokens')
+    if input_tokens:
+        LLM_TOKENS.inc(input_tokens, direction='input')
+    if output_tokens:
+        LLM_TOKENS.inc(output_tokens, direction='output')
+
+
+def render():
+    """Render all registered metrics in Prometheus text format"""
+    return REGISTRY.render()
@@ -0,0 +1,110 @@
+"""
+Cursor-based pagination of search results for the StyleMe RAG service.
+
+The LLM ranks at most 10 products, and without pagination the only way to
+page 2 is another full retrieval + LLM call. Instead, each search response now
+carries an opaque cursor. The cursor names a server-side SearchSession, which
+holds the ranked candidate list (the LLM's picks first) and what is needed to
+retrieve more: the query, the preferences and the profile vector. It also
+carries an offset into that list.
+
+Later pages are served from the list. When a page runs past its end, the
+session re-runs only the vector search, at double the previous depth (the
+query embedding is cached). Products not yet listed are appended in retrieval
+order, up to PAGINATION_MAX_DEPTH. Sessions live in an LRU cache with a TTL.
+Once a session expires, its cursors answer 410 and the client searches again.
+"""
+
+import base64
+import binascii
+import secrets
+import threading
+
+from query_cache import QueryCache
+
+
+def encode_cursor(token, offset):
+    return base64.urlsafe_b64encode(f'{token}:{offset}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(session token, offset) from a cursor; ValueError if it's malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        token, offset = raw.rsplit(':', 1)
+        offset = int(offset)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise ValueError('Malformed cursor')
+    if offset < 0:
+        raise ValueError('Malformed cursor')
+    return token, offset
+
+
+class SearchSession:
+    """Ranked candidates of one search, extended by deeper retrieval as pages are read"""
+
+    def __init__(self, question, product_ids, preferences=None, profile=None, endpoint='search'):
+        self.question = question
+        self.preferences = preferences
+        self.profile = profile
+        self.endpoint = endpoint
+        self.product_ids = list(product_ids)
+        # Vector search depth merged into product_ids so far (0 = the LLM's ranking only)
+        self.depth = 0
+        self.exhausted = False
+        self._lock = threading.Lock()
+
+    def page(self, offset, size, retrieve, base_depth, max_depth):
+        """(product IDs at offset, whether more may follow); retrieve(question, k, preferences, profile) -> IDs"""
+        with self._lock:
+            # One past the page, so the caller knows whether to hand out a next cursor
+            while len(self.product_ids) <= offset + size and not self.exhausted:
+                self._extend(retrieve, offset + size + 1, base_depth, max_depth)
+            return self.product_ids[offset:offset + size], len(self.product_ids) > offset + size
+
+    def _extend(self, retrieve, needed, base_depth, max_depth):
+        depth = min(max(self.depth * 2, needed, base_depth), max_depth)
+        if depth <= self.depth:
+            self.exhausted = True
+            return
+        found = retrieve(self.question, depth, self.preferences, self.profile)
+        listed = set(self.product_ids)
+        self.product_ids.extend(product_id for product_id in found if product_id not in listed)
+        self.depth = depth
+        # A short result means the index has no more products to offer
+        if len(found) < depth or depth >= max_depth:
+            self.exhausted = True
+
+
+class SearchCursors:
+    """Opaque cursors over SearchSessions kept in an LRU cache with a TTL"""
+
+    def __init__(self, retrieve, max_entries=10000, ttl=600, page_size=10, base_depth=20, max_depth=200):
+        self.retrieve = retrieve
+        self.sessions = QueryCache(max_entries=max_entries, ttl=ttl)
+        self.page_size = page_size
+        self.base_depth = base_depth
+        self.max_depth = max_depth
+
+    def start(self, session, offset):
+        """Register a session whose first `offset` products were already returned; returns the next cursor"""
+        if self.sessions.ttl <= 0:
+            return None
+        token = secrets.token_urlsafe(12)
+        self.sessions.put(token, session)
+        return encode_cursor(token, offset)
+
+    def page(self, cursor, size=None):
+        """(session, product IDs, next cursor or None); KeyError when the session expired"""
+        token, offset = decode_cursor(cursor)
+        session = self.sessions.get(token)
+        if session is None:
+            raise KeyError(token)
+        if size is not None and size < 1:
+            raise ValueError('page_size must be positive')
+        size = min(size or self.page_size, self.max_depth)
+        product_ids, more = session.page(offset, size, self.retrieve, self.base_depth, self.max_depth)
+        return session, product_ids, encode_cursor(token, offset + len(product_ids)) if more else None
+
+    def stats(self):
+        return dict(self.sessions.stats(), page_size=self.page_size, max_depth=self.max_depth)
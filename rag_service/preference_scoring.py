@@ -0,0 +1,216 @@
+"""
+Vectorized preference scoring for the StyleMe RAG service.
+
+Product attributes (price, color, category, occasion, gender) are held as
+NumPy arrays indexed by FAISS row, with string attributes stored as small
+integer codes into per-attribute vocabularies. A preference is matched once
+against each vocabulary (a handful of distinct values) and then gathered for
+every product in one pass, so scoring the returned products - or the whole
+catalog - needs no per-product work or database queries. Prices change too
+often to live in the index, so callers pass current ones from LiveAttributes.
+"""
+
+import copy
+
+import numpy as np
+
+# Relative weight of each preference component in the match score
+COMPONENT_WEIGHTS = {
+    'style': 0.30,
+    'color': 0.30,
+    'budget': 0.25,
+    'occasion': 0.15,
+    'gender': 0.20
+}
+
+# Share of the final score taken by the preference match (rest is rank position)
+PREFERENCE_WEIGHT = 0.5
+
+# Price distance, as a fraction of the budget bound, at which the budget match decays to 1/e
+BUDGET_DECAY = 0.25
+
+GENDER_ALIASES = {
+    'male': 'male', 'men': 'male', 'man': 'male', 'mens': 'male', "men's": 'male',
+    'female': 'female', 'women': 'female', 'woman': 'female', 'womens': 'female', "women's": 'female',
+    'ladies': 'female', 'unisex': 'unisex'
+}
+
+
+def _normalize(value):
+    return str(value or '').strip().lower()
+
+
+def _term_matches(preference, term):
+    """Loose match of a preference against an attribute value ('sporty' ~ 'Sportswear')"""
+    if not preference or not term:
+        return False
+    if preference in term:
+        return True
+    stem = preference.rstrip('ys')
+    return len(stem) >= 4 and stem in term
+
+
+def _as_list(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return list(value)
+
+
+def position_scores(count):
+    """Base score from retrieval/LLM rank: 1.0 for the first result, decaying to 0.3"""
+    return np.maximum(0.3, 1.0 - np.arange(count) * 0.1)
+
+
+class ProductAttributeMatrix:
+    """Columnar product attributes indexed by FAISS row"""
+
+    def __init__(self, product_ids, prices, colors, categories, occasions, genders):
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)
+        self.prices = np.asarray(prices, dtype=np.float32)
+
+        self.color_vocab, self.color_codes = self._encode(colors)
+        self.category_vocab, self.category_codes = self._encode(categories)
+        self.occasion_vocab, self.occasion_codes = self._encode(occasions)
+        self.gender_vocab, self.gender_codes = self._encode(genders)
+        self._index_rows()
+
+    def _index_rows(self):
+        # Dense product_id -> row lookup (-1 for unknown IDs)
+        size = int(self.product_ids.max()) + 1 if len(self.product_ids) else 0
+        self.row_by_id = np.full(size, -1, dtype=np.int64)
+        known = self.product_ids >= 0
+        self.row_by_id[self.product_ids[known]] = np.arange(len(self.product_ids))[known]
+
+    @staticmethod
+    def _encode(values):
+        vocab, codes = np.unique(np.array([_normalize(v) for v in values], dtype=object), return_inverse=True)
+        return [str(v) for v in vocab], codes.astype(np.int32)
+
+    @staticmethod
+    def _merge(vocab, codes, added_vocab, added_codes):
+        """Concatenate two encoded columns over the union of their vocabularies"""
+        merged = sorted(set(vocab) | set(added_vocab))
+        position = {term: i for i, term in enumerate(merged)}
+        remap = np.array([position[term] for term in vocab], dtype=np.int32)
+        added_remap = np.array([position[term] for term in added_vocab], dtype=np.int32)
+        return merged, np.concatenate([remap[codes], added_remap[added_codes]]).astype(np.int32)
+
+    @classmethod
+    def from_documents(cls, documents):
+        """Build from LangChain Documents in FAISS row order"""
+        metadata = [doc.metadata for doc in documents]
+        return cls(
+            product_ids=[m.get('product_id', -1) for m in metadata],
+            prices=[m.get('price') or 0.0 for m in metadata],
+            colors=[m.get('color') for m in metadata],
+            categories=[m.get('category') for m in metadata],
+            occasions=[m.get('occasion') for m in metadata],
+            genders=[m.get('gender') for m in metadata]
+        )
+
+    @classmethod
+    def from_vector_store(cls, vector_store):
+        """Build from a LangChain FAISS store, aligned with its index rows"""
+        docstore_ids = vector_store.index_to_docstore_id
+        documents = [vector_store.docstore.search(docstore_ids[row]) for row in range(len(docstore_ids))]
+        return cls.from_documents(documents)
+
+    def updated(self, removed_rows, documents):
+        """Copy with removed_rows dropped and documents appended, matching an in-place index upsert"""
+        added = ProductAttributeMatrix.from_documents(documents)
+        keep = np.ones(len(self), dtype=bool)
+        keep[removed_rows] = False
+
+        matrix = copy.copy(self)
+        matrix.product_ids = np.concatenate([self.product_ids[keep], added.product_ids])
+        matrix.prices = np.concatenate([self.prices[keep], added.prices])
+        for column in ('color', 'category', 'occasion', 'gender'):
+            vocab, codes = self._merge(getattr(self, f'{column}_vocab'), getattr(self, f'{column}_codes')[keep],
+                                       getattr(added, f'{column}_vocab'), getattr(added, f'{column}_codes'))
+            setattr(matrix, f'{column}_vocab', vocab)
+            setattr(matrix, f'{column}_codes', codes)
+        matrix._index_rows()
+        return matrix
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def rows_for(self, product_ids):
+        """Map product IDs to rows; unknown IDs map to -1"""
+        ids = np.asarray(product_ids, dtype=np.int64)
+        rows = np.full(len(ids), -1, dtype=np.int64)
+        known = (ids >= 0) & (ids < len(self.row_by_id))
+        rows[known] = self.row_by_id[ids[known]]
+        return rows
+
+    def _vocab_hits(self, vocab, preferences):
+        """Boolean array over a vocabulary: does any preference match this value?"""
+        preferences = [_normalize(p) for p in preferences if _normalize(p)]
+        return np.array([any(_term_matches(p, term) for p in preferences) for term in vocab], dtype=bool)
+
+    def match_scores(self, preferences, rows=None, prices=None):
+        """Preference match in [0, 1] for the given rows (all rows when None); prices override the matrix's per row"""
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.int64)
+        valid = rows >= 0
+        safe_rows = np.where(valid, rows, 0)
+
+        components = []
+
+        style_prefs = _as_list(preferences.get('style_preferences'))
+        if style_prefs:
+            category_hits = self._vocab_hits(self.category_vocab, style_prefs)[self.category_codes[safe_rows]]
+            occasion_hits = self._vocab_hits(self.occasion_vocab, style_prefs)[self.occasion_codes[safe_rows]]
+            components.append(('style', (category_hits | occasion_hits).astype(np.float32)))
+
+        color_prefs = _as_list(preferences.get('color_preferences'))
+        if color_prefs:
+            color_hits = self._vocab_hits(self.color_vocab, color_prefs)[self.color_codes[safe_rows]]
+            components.append(('color', color_hits.astype(np.float32)))
+
+        budget_min = float(preferences.get('budget_min') or 0)
+        budget_max = float(preferences.get('budget_max') or 0)
+        if budget_max > 0:
+            prices = self.prices[safe_rows] if prices is None else np.asarray(prices, dtype=np.float32)
+            below = np.maximum(budget_min - prices, 0) / max(budget_min * BUDGET_DECAY, 1.0)
+            above = np.maximum(prices - budget_max, 0) / max(budget_max * BUDGET_DECAY, 1.0)
+            components.append(('budget', np.exp(-(below + above)).astype(np.float32)))
+
+        occasion = preferences.get('occasion')
+        if occasion:
+            occasion_hits = self._vocab_hits(self.occasion_vocab, [occasion])[self.occasion_codes[safe_rows]]
+            components.append(('occasion', occasion_hits.astype(np.float32)))
+
+        gender = GENDER_ALIASES.get(_normalize(preferences.get('gender')))
+        if gender and gender != 'unisex':
+            gender_vocab = [GENDER_ALIASES.get(term, term) for term in self.gender_vocab]
+            gender_hits = np.array([term in (gender, 'unisex') for term in gender_vocab], dtype=bool)
+            components.append(('gender', gender_hits[self.gender_codes[safe_rows]].astype(np.float32)))
+
+        if not components:
+            return np.zeros(len(rows), dtype=np.float32)
+
+        total_weight = sum(COMPONENT_WEIGHTS[name] for name, _ in components)
+        score = sum(COMPONENT_WEIGHTS[name] * values for name, values in components) / total_weight
+        # Products missing from the matrix (e.g. IDs the LLM invented) get no preference credit
+        return np.where(valid, score, 0.0).astype(np.float32)
+
+
+def has_preferences(preferences):
+    return bool(
+        _as_list(preferences.get('style_preferences'))
+        or _as_list(preferences.get('color_preferences'))
+        or float(preferences.get('budget_max') or 0) > 0
+        or preferences.get('occasion')
+        or GENDER_ALIASES.get(_normalize(preferences.get('gender')), 'unisex') != 'unisex'
+    )
+
+
+def score_products(matrix, product_ids, preferences, prices=None):
+    """Blend rank position with attribute preference matches for ranked product IDs (current prices if given)"""
+    base = position_scores(len(product_ids))
+    if matrix is None or not len(product_ids) or not has_preferences(preferences):
+        return base
+    match = matrix.match_scores(preferences, matrix.rows_for(product_ids), prices)
+    return np.clip((1 - PREFERENCE_WEIGHT) * base + PREFERENCE_WEIGHT * match, 0.0, 1.0)
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Pre-fork multi-worker launcher for the StyleMe RAG service.
+
+`python app.py` runs one process. Starting more of them means each one loads
+its own embedding model and FAISS index. This launcher loads both once in a
+master process, freezes the garbage collector and forks WEB_WORKERS workers
+that all accept connections on the same listening socket. The workers share
+the model weights and index pages copy-on-write:
+
+- Tensor and FAISS buffers are never written by searches, so they stay shared.
+- gc.freeze() moves everything loaded so far into a permanent generation. The
+  collector then no longer touches those objects' headers, which would
+  otherwise dirty (copy) their pages in every worker.
+
+Each worker starts its own background threads after the fork (embedding
+batcher, index watcher, CDC sync), since threads don't survive fork(). Only
+the first worker warms its caches, so startup and index swaps cost one round of
+warm-up LLM calls rather than one per worker. Index versions swapped in later
+are loaded per worker. Metrics, caches and admission limits are per worker as
+well.
+
+A worker that exits within --min-uptime seconds of starting is respawned
+after a doubling delay (1s, 2s, 4s, ... up to 30s). After --max-fast-failures
+such exits in a row, the master stops all workers and exits with status 1,
+so a broken deploy fails loudly instead of fork-looping.
+
+Usage:
+    python prefork.py                       # WEB_WORKERS workers (default: one per CPU)
+    python prefork.py --workers 4 --port 5000
+
+Some seconds after start (--report-after), and on SIGUSR1, the master prints
+each worker's RSS and shared/private pages. It compares the total (PSS, which
+splits shared pages fairly) with a single loaded process, and writes the
+report to logs/prefork_memory.json.
+"""
+
+import argparse
+import gc
+import json
+import os
+import signal
+import socket
+import sys
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def run_worker(listen_socket, host, threads, cache_warmup):
+    """Worker body: start per-process threads and serve on the inherited socket"""
+    from werkzeug.serving import make_server
+
+    import app as service
+    from embedding_batcher import configure_inference_threads
+
+    gc.enable()
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # The master reports on SIGUSR1; a signal sent to the whole process group must not kill workers
+    signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+
+    # Split the cores between workers instead of each one using them all
+    configure_inference_threads(threads)
+    try:
+        import faiss
+        faiss.omp_set_num_threads(threads)
+    except (ImportError, AttributeError):
+        pass
+
+    service.start_background_tasks(cache_warmup=cache_warmup)
+    server = make_server(host, listen_socket.getsockname()[1], service.app, threaded=True,
+                         fd=listen_socket.fileno())
+    server.serve_forever()
+
+
+# Respawn delay after a fast failure: doubles per consecutive one, capped
+RESPAWN_BACKOFF = 1.0
+MAX_RESPAWN_BACKOFF = 30.0
+
+
+class Master:
+    """Forks, supervises and respawns workers; reports their shared memory"""
+
+    def __init__(self, listen_socket, host, workers, threads, report_path, min_uptime=10.0, max_fast_failures=5):
+        self.listen_socket = listen_socket
+        self.host = host
+        self.workers = workers
+        self.threads = threads
+        self.report_path = report_path
+        self.min_uptime = min_uptime
+        self.max_fast_failures = max_fast_failures
+        # pid -> (slot, start time); slot 0 is the worker that warms its caches
+        self.pids = {}
+        self.fast_failures = [0] * workers
+        # (due time, slot) of workers waiting out their backoff
+        self.respawns = []
+        self.stopping = False
+        self.failed = False
+        self.report_requested = False
+        self.single_process = None
+
+    def spawn(self, slot):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(self.listen_socket, self.host, self.threads, cache_warmup=slot == 0)
+            finally:
+                os._exit(1)
+        self.pids[pid] = (slot, time.monotonic())
+        return pid
+
+    def worker_exited(self, pid, status):
+        """Schedule a respawn of the worker's slot, backing off while it keeps dying right after start"""
+        slot, started = self.pids.pop(pid)
+        if self.stopping:
+            return
+        if time.monotonic() - started >= self.min_uptime:
+            self.fast_failures[slot] = 0
+            print(f"⚠️ Worker {pid} exited (status {status}), respawning")
+            self.respawns.append((time.monotonic(), slot))
+            return
+
+        self.fast_failures[slot] += 1
+        if self.fast_failures[slot] >= self.max_fast_failures:
+            print(f"❌ Worker {pid} exited (status {status}) within {self.min_uptime:g}s of starting "
+                  f"{self.fast_failures[slot]} times in a row - giving up")
+            self.failed = True
+            self.stopping = True
+            return
+        delay = min(RESPAWN_BACKOFF * 2 ** (self.fast_failures[slot] - 1), MAX_RESPAWN_BACKOFF)
+        print(f"⚠️ Worker {pid} exited (status {status}) {time.monotonic() - started:.1f}s after starting, "
+              f"respawning in {delay:g}s")
+        self.respawns.append((time.monotonic() + delay, slot))
+
+    def stop(self, *_):
+        self.stopping = True
+
+    def request_report(self, *_):
+        self.report_requested = True
+
+    def memory_report(self):
+        from memory_report import process_memory
+
+        workers = {}
+        for pid in sorted(self.pids):
+            try:
+                workers[pid] = process_memory(pid)
+            except OSError:
+                continue
+        master = process_memory()
+        total_rss = sum(w['rss'] for w in workers.values()) + master['rss']
+        total_pss = sum(w.get('pss', w['rss']) for w in workers.values()) + master.get('pss', master['rss'])
+        report = {
+            'time': time.time(),
+            'workers': len(workers),
+            'single_process_rss': self.single_process,
+            'master': master,
+            'per_worker': workers,
+            # RSS counts shared pages once per process; PSS splits them, so its sum is the real footprint
+            'total_rss': total_rss,
+            'total_pss': total_pss,
+            'rss_ratio': round(total_rss / self.single_process, 2),
+            'pss_ratio': round(total_pss / self.single_process, 2),
+            'naive_ratio': len(workers)
+        }
+        print(f"🧮 {len(workers)} workers: total PSS {total_pss / 1e6:.0f} MB = "
+              f"{report['pss_ratio']}× one process ({self.single_process / 1e6:.0f} MB), "
+              f"vs {len(workers)}× without sharing; summed RSS {total_rss / 1e6:.0f} MB")
+
+        os.makedirs(os.path.dirname(self.report_path) or '.', exist_ok=True)
+        with open(self.report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        return report
+
+    def run(self, report_after):
+        from memory_report import process_memory
+
+        self.single_process = process_memory()['rss']
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGUSR1, self.request_report)
+
+        for slot in range(self.workers):
+            self.spawn(slot)
+        print(f"🍴 Forked {self.workers} workers: {', '.join(map(str, sorted(self.pids)))}")
+
+        report_at = time.monotonic() + report_after if report_after > 0 else None
+        while not self.stopping:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid = 0
+            if pid:
+                self.worker_exited(pid, status)
+                continue
+
+            now = time.monotonic()
+            for due, slot in [respawn for respawn in self.respawns if respawn[0] <= now]:
+                self.respawns.remove((due, slot))
+                self.spawn(slot)
+
+            if self.report_requested or (report_at is not None and time.monotonic() >= report_at):
+                self.report_requested, report_at = False, None
+                self.memory_report()
+            time.sleep(0.5)
+
+        print(f"🛑 Stopping {len(self.pids)} workers")
+        for pid in self.pids:
+            os.kill(pid, signal.SIGTERM)
+        for pid in list(self.pids):
+            os.waitpid(pid, 0)
+        return 1 if self.failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_WORKERS', 0)) or os.cpu_count())
+    parser.add_argument('--host', default=os.getenv('FLASK_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('FLASK_PORT', 5000)))
+    parser.add_argument('--report-after', type=float, default=float(os.getenv('PREFORK_REPORT_AFTER', 30)),
+                        help='Seconds after start to print the memory report (0 = only on SIGUSR1)')
+    parser.add_argument('--report', default=os.path.join('logs', 'prefork_memory.json'))
+    parser.add_argument('--min-uptime', type=float, default=float(os.getenv('PREFORK_MIN_UPTIME', 10)),
+                        help='A worker exiting sooner than this after start counts as a startup failure')
+    parser.add_argument('--max-fast-failures', type=int, default=int(os.getenv('PREFORK_MAX_FAST_FAILURES', 5)),
+                        help='Consecutive startup failures of one worker after which the master gives up')
+    args = parser.parse_args()
+
+    # No collections while loading; whatever is loaded is frozen before forking
+    gc.disable()
+
+    import app as service
+    print(f"🔧 Loading the model and index once for {args.workers} workers...")
+    if not service.initialize_rag_system(background=False):
+        print("❌ Failed to initialize RAG system. Exiting.")
+        sys.exit(1)
+
+    listen_socket = socket.create_server((args.host, args.port), backlog=1024)
+    listen_socket.set_inheritable(True)
+
+    gc.collect()
+    gc.freeze()
+    print(f"🧊 Froze {gc.get_freeze_count()} objects for copy-on-write sharing")
+
+    threads = int(os.getenv('EMBEDDING_THREADS', 0)) or max(os.cpu_count() // args.workers, 1)
+    print(f"🌟 Serving on http://{args.host}:{args.port} with {args.workers} workers ({threads} inference threads each)")
+    master = Master(listen_socket, args.host, args.workers, threads, args.report,
+                    min_uptime=args.min_uptime, max_fast_failures=args.max_fast_failures)
+    sys.exit(master.run(args.report_after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+On-demand sampling profiler for the StyleMe RAG service.
+
+Samples the Python stacks of every other thread in the process at a fixed
+interval and aggregates them in the "collapsed stack" format understood by
+flamegraph.pl, speedscope and most flame-graph viewers:
+
+    frame1;frame2;frame3 <sample count>
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+MAX_PROFILE_SECONDS = float(os.getenv('PROFILER_MAX_SECONDS', 60))
+
+# Only one profile runs at a time; sampling every thread is not free
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusyError(RuntimeError):
+    """Raised when a profile is requested while another is running"""
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    # Semicolons separate frames in the collapsed format
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})".replace(';', ':')
+
+
+def _collapse(frame):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+def sample_stacks(seconds, interval=0.005):
+    """Sample all other threads for `seconds` and return a Counter of collapsed stacks"""
+    seconds = max(0.1, min(float(seconds), MAX_PROFILE_SECONDS))
+    interval = max(0.001, float(interval))
+
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError('A profile is already running')
+
+    try:
+        own_thread = threading.get_ident()
+        thread_names = {}
+        stacks = Counter()
+        deadline = time.perf_counter() + seconds
+
+        while time.perf_counter() < deadline:
+            for thread in threading.enumerate():
+                thread_names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                thread_name = thread_names.get(thread_id, str(thread_id))
+                stacks[f"{thread_name};{_collapse(frame)}"] += 1
+            time.sleep(interval)
+
+        return stacks
+    finally:
+        _profile_lock.release()
+
+
+def idle_stack(stack):
+    """True for stacks that are just waiting (socket accept, queue get, sleep)"""
+    leaf = stack.rsplit(';', 1)[-1]
+    return leaf.startswith(('wait (', 'select (', 'accept (', 'sleep (', '_worker (', 'serve_forever ('))
+
+
+def to_collapsed(stacks, include_idle=False):
+    """Render sampled stacks as collapsed text, one `stack count` line each"""
+    lines = []
+    for stack, count in stacks.most_common():
+        if include_idle or not idle_stack(stack):
+            lines.append(f"{stack} {count}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,93 @@
+"""
+Query-keyed caches for the StyleMe RAG service.
+
+Two instances live in app.py. The embedding cache maps a normalized query to
+its embedding, so repeated queries skip the embedding model for every user.
+The result cache maps (normalized query, search history, preferences) to the
+raw LLM answer, so repeated guest and first-time searches skip the LLM call.
+Both are LRU-bounded with a TTL. The result cache is cleared whenever the
+index changes, because its answers refer to the products that were retrieved.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+_WHITESPACE = re.compile(r'\s+')
+_EDGE_PUNCTUATION = re.compile(r'^[^\w]+|[^\w]+$')
+
+
+def normalize_query(query):
+    """Case-fold, collapse whitespace and trim edge punctuation ("Red  Dress!" -> "red dress")"""
+    query = _WHITESPACE.sub(' ', str(query or '').strip().lower())
+    return _EDGE_PUNCTUATION.sub('', query)
+
+
+class QueryCache:
+    """Thread-safe LRU cache with a per-entry TTL"""
+
+    def __init__(self, max_entries=10000, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached value, or None on a miss or expired entry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def memory_bytes(self):
+        """Estimated bytes held by cached keys and values (sampled)"""
+        from memory_report import estimate_bytes
+
+        with self._lock:
+            return estimate_bytes(iter(self._entries.items()), len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return cache counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
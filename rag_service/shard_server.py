@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Shard search server for the StyleMe RAG service.
+
+Serves one shard of the published index version (built with INDEX_SHARDS=N)
+over plain HTTP. It loads neither the embedding model nor the LLM, only the
+shard's FAISS sub-index and documents. The front service sends the query
+vector and gets the shard's top k back:
+
+    POST /search   {"vector": "<base64 float32>", "k": 20}
+                   -> {"shard": 0, "version": "...", "hits": [{"distance", "page_content", "metadata"}]}
+    GET  /health   -> {"shard": 0, "version": "...", "ntotal": 12345}
+
+Like the web workers, it watches the CURRENT pointer and swaps in new index
+versions as they are published.
+
+Usage:
+    python shard_server.py --shard 0 --port 5101     # one shard (one per node or container)
+    python shard_server.py --shards 4                # all shards on this machine, ports 5101-5104
+
+Then point the front service at them:
+    SHARD_ENDPOINTS=http://127.0.0.1:5101,http://127.0.0.1:5102,... python app.py
+"""
+
+import argparse
+import json
+import os
+import pickle
+import signal
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+
+import index_versions
+from shards import decode_vector, shard_path
+
+load_dotenv()
+
+
+class Shard:
+    """One shard's sub-index and documents, swapped as a whole on version changes"""
+
+    def __init__(self, vector_store_path, shard):
+        self.vector_store_path = vector_store_path
+        self.shard = shard
+        self.version = None
+        self.index = None
+        self.documents = None
+        self._lock = threading.Lock()
+
+    def load(self, version=None, version_dir=None):
+        if version_dir is None:
+            version_dir = index_versions.version_path(self.vector_store_path, version)
+        directory = shard_path(version_dir, self.shard)
+        index = faiss.read_index(os.path.join(directory, 'index.faiss'))
+        with open(os.path.join(directory, 'index.pkl'), 'rb') as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        documents = [docstore.search(index_to_docstore_id[row]) for row in range(index.ntotal)]
+        with self._lock:
+            self.version, self.index, self.documents = version, index, documents
+        print(f"📌 Shard {self.shard} serving {index.ntotal} vectors from version {version or '(unversioned)'}")
+
+    def search(self, vector, k):
+        with self._lock:
+            index, documents, version = self.index, self.documents, self.version
+        distances, rows = index.search(np.asarray([vector], dtype=np.float32), min(k, index.ntotal) or 1)
+        hits = [
+            {'distance': float(distance), 'page_content': documents[row].page_content,
+             'metadata': documents[row].metadata}
+            for distance, row in zip(distances[0], rows[0]) if row >= 0
+        ]
+        return {'shard': self.shard, 'version': version, 'hits': hits}
+
+    def health(self):
+        return {'shard': self.shard, 'version': self.version, 'ntotal': int(self.index.ntotal)}
+
+
+def make_handler(shard):
+    class ShardHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _reply(self, status, body):
+            data = json.dumps(body, default=str).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._reply(200, shard.health())
+            else:
+                self._reply(404, {'error': 'Not found'})
+
+        def do_POST(self):
+            if self.path != '/search':
+                self._reply(404, {'error': 'Not found'})
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                self._reply(200, shard.search(decode_vector(payload['vector']), int(payload.get('k', 20))))
+            except (KeyError, ValueError, TypeError) as e:
+                self._reply(400, {'error': str(e)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return ShardHandler
+
+
+def serve(shard_number, host, port, vector_store_path):
+    shard = Shard(vector_store_path, shard_number)
+    version, version_dir = index_versions.resolve(vector_store_path)
+    shard.load(version, version_dir)
+
+    interval = float(os.getenv('INDEX_WATCH_INTERVAL', 2))
+    if interval > 0:
+        index_versions.VersionWatcher(vector_store_path, on_change=shard.load, interval=interval, version=version).start()
+
+    server = ThreadingHTTPServer((host, port), make_handler(shard))
+    server.daemon_threads = True
+    print(f"🌟 Shard {shard_number} listening on http://{host}:{port}")
+    server.serve_forever()
+
+
+def launch_local(num_shards, host, base_port, vector_store_path):
+    """Run every shard as a child process on consecutive ports (single-machine testing)"""
+    children = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), '--shard', str(shard), '--host', host,
+                          '--port', str(base_port + shard), '--root', vector_store_path])
+        for shard in range(num_shards)
+    ]
+    endpoints = ','.join(f'http://{host}:{base_port + shard}' for shard in range(num_shards))
+    print(f"🍴 Started {num_shards} shard servers\n   SHARD_ENDPOINTS={endpoints}")
+
+    # A shard that dies stays down, so the front's partial-result handling can be exercised
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    running = set(range(num_shards))
+    try:
+        while not stopping and running:
+            for shard in sorted(running):
+                if children[shard].poll() is not None:
+                    running.discard(shard)
+                    print(f"⚠️ Shard {shard} exited (status {children[shard].returncode})")
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    for child in children:
+        if child.poll() is None:
+            child.terminate()
+    for child in children:
+        child.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--shard', type=int, help='Shard number to serve')
+    group.add_argument('--shards', type=int, help='Serve all N shards as local child processes')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5101, help='Port (first port with --shards)')
+    parser.add_argument('--root', default=os.getenv('VECTOR_STORE_PATH', 'faiss_index'))
+    args = parser.parse_args()
+
+    if args.shards:
+        launch_local(args.shards, args.host, args.port, args.root)
+    else:
+        serve(args.shard, args.host, args.port, args.root)
+
+
+if __name__ == '__main__':
+    main()
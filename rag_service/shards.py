@@ -0,0 +1,171 @@
+"""
+Sharded index with scatter-gather search for the StyleMe RAG service.
+
+With INDEX_SHARDS=N the builder also splits the index into N shards by a hash
+of the product ID. Each shard gets its own sub-index and documents under
+shards/<i>/ in the version directory. Every shard is served by a
+shard_server.py process, which holds only its own slice of the vectors.
+
+With SHARD_ENDPOINTS set, the front service keeps documents, catalog and
+attributes but no vectors. Each query vector is sent to all shards at once,
+and each shard returns its own top k. The hits are merged by L2 distance. A
+shard that errors or misses SHARD_TIMEOUT_MS is left out and the query is
+answered from the others (partial results), instead of failing the search.
+"""
+
+import base64
+import json
+import os
+import pickle
+import time
+import urllib.request
+import zlib
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+SHARDS_DIRNAME = 'shards'
+
+# Concurrent shard requests per shard (bounds the fan-out thread pool)
+THREADS_PER_SHARD = 16
+
+
+def shard_of(product_id, num_shards):
+    """Stable shard number for a product ID (CRC32, so every process agrees)"""
+    return zlib.crc32(str(int(product_id)).encode()) % num_shards
+
+
+def shard_path(directory, shard):
+    return os.path.join(directory, SHARDS_DIRNAME, str(shard))
+
+
+def build_shards(vector_store, directory, num_shards):
+    """Write one sub-index plus its documents per shard next to the main index"""
+    index = vector_store.index
+    vectors = index.reconstruct_n(0, index.ntotal)
+    docstore_ids = vector_store.index_to_docstore_id
+
+    rows_by_shard = [[] for _ in range(num_shards)]
+    for row in range(index.ntotal):
+        doc = vector_store.docstore.search(docstore_ids[row])
+        rows_by_shard[shard_of(doc.metadata['product_id'], num_shards)].append(row)
+
+    sizes = []
+    for shard, rows in enumerate(rows_by_shard):
+        # Same type and trained state (quantizer, PCA) as the main index
+        shard_index = faiss.clone_index(index)
+        shard_index.reset()
+        if rows:
+            shard_index.add(vectors[rows])
+        ids = {i: docstore_ids[row] for i, row in enumerate(rows)}
+        docstore = InMemoryDocstore({docstore_id: vector_store.docstore.search(docstore_id) for docstore_id in ids.values()})
+        FAISS(vector_store.embedding_function, shard_index, docstore, ids).save_local(shard_path(directory, shard))
+        sizes.append(len(rows))
+
+    with open(os.path.join(directory, SHARDS_DIRNAME, 'manifest.json'), 'w') as f:
+        json.dump({'num_shards': num_shards, 'ntotal': int(index.ntotal), 'dimension': int(index.d), 'sizes': sizes}, f)
+    return sizes
+
+
+def load_documents_only(directory, embeddings):
+    """A FAISS store with the documents of an index directory but an empty index (vectors live in shards)"""
+    with open(os.path.join(directory, SHARDS_DIRNAME, 'manifest.json')) as f:
+        manifest = json.load(f)
+    with open(os.path.join(directory, 'index.pkl'), 'rb') as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(embeddings, faiss.IndexFlatL2(manifest['dimension']), docstore, index_to_docstore_id)
+
+
+def encode_vector(vector):
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode()
+
+
+def decode_vector(data):
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
+
+def _is_timeout(error):
+    # urllib wraps connect timeouts in URLError; read timeouts arrive as they are
+    return isinstance(error, TimeoutError) or isinstance(getattr(error, 'reason', None), TimeoutError)
+
+
+class ShardedSearch:
+    """Fans a query out to shard servers concurrently and merges their top-k hits"""
+
+    def __init__(self, endpoints, timeout=0.5, on_shard=None):
+        self.endpoints = [endpoint.rstrip('/') for endpoint in endpoints]
+        self.timeout = timeout
+        # on_shard(endpoint, result, seconds) - metrics hook; result is ok/timeout/error
+        self.on_shard = on_shard
+        self._pool = ThreadPoolExecutor(max_workers=len(self.endpoints) * THREADS_PER_SHARD,
+                                        thread_name_prefix='shard-search')
+        self.partial_searches = 0
+        self.failed_searches = 0
+
+    def _request(self, endpoint, path, payload=None):
+        request = urllib.request.Request(
+            endpoint + path,
+            data=json.dumps(payload).encode() if payload is not None else None,
+            headers={'Content-Type': 'application/json'}
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def _search_shard(self, endpoint, payload):
+        started = time.perf_counter()
+        try:
+            hits = self._request(endpoint, '/search', payload)['hits']
+        except Exception as e:
+            if self.on_shard:
+                self.on_shard(endpoint, 'timeout' if _is_timeout(e) else 'error', time.perf_counter() - started)
+            raise
+        if self.on_shard:
+            self.on_shard(endpoint, 'ok', time.perf_counter() - started)
+        return hits
+
+    def search(self, vector, k):
+        """(top-k Documents by distance, endpoints that failed or timed out)"""
+        payload = {'vector': encode_vector(vector), 'k': k}
+        futures = {self._pool.submit(self._search_shard, endpoint, payload): endpoint for endpoint in self.endpoints}
+        done, _ = wait(futures, timeout=self.timeout)
+
+        hits, failed = [], []
+        for future, endpoint in futures.items():
+            if future in done and future.exception() is None:
+                hits.extend(future.result())
+            else:
+                failed.append(endpoint)
+
+        if failed:
+            self.partial_searches += 1
+            if len(failed) == len(self.endpoints):
+                self.failed_searches += 1
+                raise RuntimeError(f"No shard answered ({', '.join(failed)})")
+
+        hits.sort(key=lambda hit: hit['distance'])
+        return [Document(page_content=hit['page_content'], metadata=hit['metadata']) for hit in hits[:k]], failed
+
+    def health(self):
+        """Per-shard status from each server's /health endpoint"""
+        status = {}
+        for endpoint in self.endpoints:
+            try:
+                status[endpoint] = self._request(endpoint, '/health')
+            except Exception as e:
+                status[endpoint] = {'error': str(e)}
+        return status
+
+    def stats(self):
+        shards = self.health()
+        return {
+            'endpoints': self.endpoints,
+            'timeout_ms': self.timeout * 1000,
+            'total_vectors': sum(s.get('ntotal', 0) for s in shards.values()),
+            'partial_searches': self.partial_searches,
+            'failed_searches': self.failed_searches,
+            'shards': shards
+        }
@@ -0,0 +1,183 @@
+"""
+Precomputed "similar products" for the StyleMe RAG service.
+
+A similar-items strip on the product page would otherwise cost an embedding
+call and a search per page view. The index build already holds every product
+vector, so it also finds each product's SIMILAR_PRODUCTS_K nearest neighbours
+with batched exact FAISS searches. With SIMILAR_PRODUCTS_FILTER_BY the
+neighbours are limited to products of the same gender and/or category. The
+graph is saved as one int32 array of neighbour product IDs per product (-1
+padded) in similar_products.npz. Serving a request is a binary search over the
+sorted product IDs plus a row slice.
+
+CDC batches update the graph incrementally. Changed products, and products
+whose lists contained a changed or removed product, are searched again. One
+batched search of all other products against the changed ones then finds the
+lists a changed product now belongs in (closer than their last entry). The
+result matches a full rebuild at a fraction of its cost.
+"""
+
+import os
+
+import faiss
+import numpy as np
+
+from preference_scoring import ProductAttributeMatrix
+
+SIMILAR_FILENAME = 'similar_products.npz'
+
+# Query vectors per FAISS search call
+SEARCH_BATCH_SIZE = 1024
+
+
+def _group_ids(attributes, filter_by):
+    """Row -> group number for the filter dimensions (one group when unfiltered)"""
+    if not filter_by:
+        return np.zeros(len(attributes), dtype=np.int64)
+    columns = {'gender': attributes.gender_codes, 'category': attributes.category_codes}
+    keys = np.stack([columns[dimension] for dimension in filter_by], axis=1)
+    return np.unique(keys, axis=0, return_inverse=True)[1].reshape(-1)
+
+
+def search_neighbors(vectors, product_ids, groups, rows, k, batch_size=SEARCH_BATCH_SIZE):
+    """Nearest k product IDs within the same group for each of `rows` (itself excluded), int32 [len(rows), k]"""
+    neighbors = np.full((len(rows), k), -1, dtype=np.int32)
+    for group in np.unique(groups[rows]):
+        members = np.flatnonzero(groups == group)
+        index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(vectors[members])
+        positions = np.flatnonzero(groups[rows] == group)
+        depth = min(k + 1, len(members))
+        for start in range(0, len(positions), batch_size):
+            batch = positions[start:start + batch_size]
+            _, found = index.search(vectors[rows[batch]], depth)
+            for position, hits in zip(batch, found):
+                hits = members[hits[hits >= 0]]
+                hits = hits[hits != rows[position]][:k]
+                neighbors[position, :len(hits)] = product_ids[hits]
+    return neighbors
+
+
+def build_similar_products(vector_store, directory, k, filter_by=()):
+    """Compute the neighbour graph for every product and write it next to the main index"""
+    similar = SimilarProducts.from_vector_store(
+        vector_store, ProductAttributeMatrix.from_vector_store(vector_store), k, filter_by)
+    similar.save(directory)
+    return similar
+
+
+class SimilarProducts:
+    """int32 neighbour lists (product IDs, best first) for product IDs held in sorted order"""
+
+    def __init__(self, product_ids, neighbors, filter_by=()):
+        order = np.argsort(product_ids, kind='stable')
+        self.product_ids = np.asarray(product_ids, dtype=np.int32)[order]
+        self.neighbors = np.asarray(neighbors, dtype=np.int32)[order]
+        self.k = self.neighbors.shape[1]
+        self.filter_by = list(filter_by)
+
+    @classmethod
+    def from_vector_store(cls, vector_store, attributes, k=20, filter_by=()):
+        """Exact top-k neighbours of every vector in the store"""
+        vectors = vector_store.index.reconstruct_n(0, vector_store.index.ntotal)
+        product_ids = attributes.product_ids.astype(np.int32)
+        rows = np.arange(len(product_ids))
+        neighbors = search_neighbors(vectors, product_ids, _group_ids(attributes, filter_by), rows, k)
+        return cls(product_ids, neighbors, filter_by)
+
+    @classmethod
+    def load(cls, vector_store, directory):
+        """Load a graph written by build_similar_products; None if absent or stale"""
+        path = os.path.join(directory, SIMILAR_FILENAME)
+        if not os.path.exists(path):
+            return None
+        data = np.load(path)
+        if len(data['product_ids']) != len(vector_store.index_to_docstore_id):
+            print("⚠️ Similar products don't match the loaded index - rebuild the vector store")
+            return None
+        return cls(data['product_ids'], data['neighbors'], [str(d) for d in data['filter_by']])
+
+    def save(self, directory):
+        np.savez(os.path.join(directory, SIMILAR_FILENAME), product_ids=self.product_ids,
+                 neighbors=self.neighbors, filter_by=np.array(self.filter_by, dtype=str))
+
+    def similar(self, product_id, k=None):
+        """Neighbour product IDs, most similar first; None for products not in the graph"""
+        row = int(np.searchsorted(self.product_ids, product_id))
+        if row >= len(self.product_ids) or self.product_ids[row] != product_id:
+            return None
+        neighbors = self.neighbors[row, :min(k or self.k, self.k)]
+        return neighbors[neighbors >= 0].tolist()
+
+    def updated(self, vector_store, attributes, products):
+        """Copy of the graph for a store with a batch of changed product rows applied"""
+        product_ids = attributes.product_ids.astype(np.int32)
+        changed = np.array(sorted({int(product['id']) for product in products}), dtype=np.int32)
+        vectors = vector_store.index.reconstruct_n(0, vector_store.index.ntotal)
+        groups = _group_ids(attributes, self.filter_by)
+
+        # Carry over the old lists of products still in the index
+        neighbors = np.full((len(product_ids), self.k), -1, dtype=np.int32)
+        known = np.zeros(len(product_ids), dtype=bool)
+        if len(self.product_ids):
+            old_rows = np.minimum(np.searchsorted(self.product_ids, product_ids), len(self.product_ids) - 1)
+            known = self.product_ids[old_rows] == product_ids
+            neighbors[known] = self.neighbors[old_rows[known]]
+
+        # Changed products may have moved and removed ones are gone: search those lists again
+        upserted = np.isin(product_ids, changed)
+        search = upserted | ~known | np.isin(neighbors, changed).any(axis=1)
+        rows = np.flatnonzero(search)
+        if len(rows):
+            neighbors[rows] = search_neighbors(vectors, product_ids, groups, rows, self.k)
+
+        row_by_id = {product_id: row for row, product_id in enumerate(product_ids.tolist())}
+        self._insert_changed(neighbors, vectors, groups, product_ids, row_by_id,
+                             np.flatnonzero(upserted), np.flatnonzero(~search))
+        return SimilarProducts(product_ids, neighbors, self.filter_by)
+
+    def _insert_changed(self, neighbors, vectors, groups, product_ids, row_by_id, changed_rows, rows):
+        """Add changed products to the kept lists (`rows`) they now rank in"""
+        if not len(changed_rows) or not len(rows):
+            return
+        # Distance from each kept product to its current last neighbour (inf while the list isn't full)
+        last = neighbors[rows, -1]
+        last_rows = np.array([row_by_id.get(int(product_id), -1) for product_id in last])
+        cutoff = np.full(len(rows), np.inf, dtype=np.float32)
+        full = last_rows >= 0
+        cutoff[full] = ((vectors[rows[full]] - vectors[last_rows[full]]) ** 2).sum(axis=1)
+
+        index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(vectors[changed_rows])
+        depth = min(self.k, len(changed_rows))
+        for start in range(0, len(rows), SEARCH_BATCH_SIZE):
+            batch = slice(start, start + SEARCH_BATCH_SIZE)
+            distances, found = index.search(vectors[rows[batch]], depth)
+            for i in np.flatnonzero(distances[:, 0] < cutoff[batch]):
+                row = rows[batch][i]
+                for distance, hit in zip(distances[i], found[i]):
+                    if hit < 0 or distance >= cutoff[batch][i]:
+                        break
+                    candidate = changed_rows[hit]
+                    if groups[candidate] == groups[row] and candidate != row:
+                        self._offer(neighbors, vectors, row_by_id, row, candidate, product_ids[candidate])
+
+    def _offer(self, neighbors, vectors, row_by_id, row, candidate_row, candidate_id):
+        """Insert candidate_id into row's list if it ranks within the top k"""
+        current = neighbors[row][neighbors[row] >= 0]
+        if candidate_id in current:
+            return
+        ids = np.append(current, candidate_id)
+        rows = np.array([row_by_id[int(product_id)] for product_id in current] + [candidate_row])
+        distances = ((vectors[rows] - vectors[row]) ** 2).sum(axis=1)
+        best = ids[np.argsort(distances, kind='stable')[:self.k]]
+        neighbors[row] = -1
+        neighbors[row, :len(best)] = best
+
+    def stats(self):
+        return {
+            'products': len(self.product_ids),
+            'k': self.k,
+            'filter_by': self.filter_by,
+            'bytes': int(self.product_ids.nbytes + self.neighbors.nbytes)
+        }
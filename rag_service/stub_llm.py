@@ -0,0 +1,86 @@
+"""
+Stub LLM for offline benchmarks and load tests of the StyleMe RAG service.
+
+Stands in for ChatGroq without network access or an API key: it answers with
+the first product IDs found in the prompt's PRODUCT CONTEXT section, in the
+same comma-separated format the real prompt asks for.
+
+Set LLM_PROVIDER=stub to serve with it. Each call sleeps for a latency drawn
+from STUB_LLM_LATENCY_FILE (a JSON list of recorded Groq latencies in seconds,
+see `load_test.py export-latencies`), or from a log-normal distribution with
+STUB_LLM_LATENCY_MEDIAN_MS / STUB_LLM_LATENCY_SIGMA when no file is given.
+"""
+
+import json
+import math
+import os
+import random
+import re
+import time
+
+from langchain_core.messages import AIMessage
+
+PRODUCT_ID_PATTERN = re.compile(r'Product ID: (\d+)')
+
+
+def load_latency_samples(path):
+    """Read recorded latencies (seconds) from a JSON list or {"latencies": [...]}"""
+    with open(path) as f:
+        data = json.load(f)
+    samples = data.get('latencies', []) if isinstance(data, dict) else data
+    samples = [float(sample) for sample in samples if sample is not None and float(sample) >= 0]
+    if not samples:
+        raise ValueError(f"No latency samples found in {path}")
+    return samples
+
+
+class LatencySampler:
+    """Draws call latencies from recorded samples or a log-normal fallback"""
+
+    def __init__(self, samples=None, median_ms=0.0, sigma=0.5, seed=None):
+        self.samples = samples
+        self.median = median_ms / 1000
+        self.sigma = sigma
+        self._random = random.Random(seed)
+
+    def sample(self):
+        if self.samples:
+            return self._random.choice(self.samples)
+        if self.median <= 0:
+            return 0.0
+        return self._random.lognormvariate(math.log(self.median), self.sigma)
+
+
+def create_latency_sampler():
+    """Build the latency sampler configured through the environment"""
+    latency_file = os.getenv('STUB_LLM_LATENCY_FILE')
+    if latency_file:
+        return LatencySampler(samples=load_latency_samples(latency_file))
+    return LatencySampler(
+        median_ms=float(os.getenv('STUB_LLM_LATENCY_MEDIAN_MS', 0)),
+        sigma=float(os.getenv('STUB_LLM_LATENCY_SIGMA', 0.5))
+    )
+
+
+class StubChatModel:
+    """Minimal chat model exposing the invoke() interface used by the RAG chain"""
+
+    def __init__(self, max_ids=10, latency_sampler=None):
+        self.max_ids = max_ids
+        self.latency_sampler = latency_sampler
+
+    def invoke(self, prompt_value, *args, **kwargs):
+        if self.latency_sampler:
+            time.sleep(self.latency_sampler.sample())
+        text = prompt_value.to_string() if hasattr(prompt_value, 'to_string') else str(prompt_value)
+        product_ids = PRODUCT_ID_PATTERN.findall(text)[:self.max_ids]
+        content = ', '.join(product_ids)
+        return AIMessage(
+            content=content,
+            usage_metadata={
+                # Rough 4-characters-per-token estimate, good enough for accounting
+                'input_tokens': len(text) // 4,
+                'output_tokens': len(content) // 4 + 1,
+                'total_tokens': len(text) // 4 + len(content) // 4 + 1
+            }
+        )
@@ -0,0 +1,116 @@
+"""
+Prefix autocomplete for the StyleMe RAG service.
+
+/search costs an embedding and an LLM call, far too much per keystroke.
+SuggestionIndex answers type-ahead from memory instead. It holds the product
+names, brands, categories and colors of the catalog snapshot, plus popular
+queries mined from search_logs weighted by how often they were searched.
+
+Every suggestion is indexed under each of its word starts, so "dre" completes
+both "dress" and "red dress". Keys live in one sorted list, and a prefix is a
+bisect range over it. Suggestions are numbered by descending score, so the
+top-k of a range are its k smallest numbers. Short prefixes match a large
+share of the keys, so their top-k lists (up to `table_depth` characters) are
+precomputed when the index is built.
+"""
+
+import heapq
+from bisect import bisect_left
+from collections import Counter
+
+from cache_warmer import fetch_popular_queries
+from query_cache import normalize_query
+
+# Catalog columns offered as suggestions, weighted by the number of products carrying the term
+TERM_FIELDS = ('brand', 'category', 'color')
+
+
+class SuggestionIndex:
+    """Sorted word-start keys over score-ranked suggestions, with top-k tables for short prefixes"""
+
+    def __init__(self, entries, max_k=10, table_depth=3):
+        # entries: [(text, type, score), ...]; ids follow descending score
+        self.entries = sorted(entries, key=lambda entry: (-entry[2], entry[0]))
+        self.max_k = max_k
+        self.table_depth = table_depth
+
+        keys = []
+        for entry_id, (text, _, _) in enumerate(self.entries):
+            start = 0
+            for word in text.split(' '):
+                keys.append((text[start:], entry_id))
+                start += len(word) + 1
+        keys.sort()
+        self._keys = [key for key, _ in keys]
+        self._ids = [entry_id for _, entry_id in keys]
+
+        self._tables = {}
+        for entry_id, (text, _, _) in enumerate(self.entries):
+            for word in set(text.split(' ')):
+                for length in range(1, min(len(word), table_depth) + 1):
+                    table = self._tables.setdefault(word[:length], [])
+                    if len(table) < max_k and entry_id not in table:
+                        table.append(entry_id)
+
+    @classmethod
+    def build(cls, catalog, popular_queries=(), **kwargs):
+        """Suggestions from a CatalogSnapshot and [(query, searches), ...]"""
+        scores = {}
+
+        def add(text, kind, score):
+            text = normalize_query(text)
+            if text and score > scores.get(text, (None, 0))[1]:
+                scores[text] = (kind, score)
+
+        for name in catalog.column('name'):
+            add(name, 'product', 1)
+        for field in TERM_FIELDS:
+            for term, products in Counter(normalize_query(value) for value in catalog.column(field) if value).items():
+                add(term, field, products)
+        for query, searches in popular_queries:
+            add(query, 'query', searches)
+        return cls([(text, kind, score) for text, (kind, score) in scores.items()], **kwargs)
+
+    def _matches(self, prefix, k):
+        if len(prefix) <= self.table_depth and ' ' not in prefix:
+            return self._tables.get(prefix, [])[:k]
+        lo = bisect_left(self._keys, prefix)
+        hi = bisect_left(self._keys, prefix + '\uffff', lo)
+        return heapq.nsmallest(k, set(self._ids[lo:hi]))
+
+    def suggest(self, prefix, k=None):
+        """Top-k completions for a typed prefix, highest score first"""
+        prefix = normalize_query(prefix)
+        if not prefix:
+            return []
+        k = min(k or self.max_k, self.max_k)
+        return [
+            {'text': text, 'type': kind, 'score': score}
+            for text, kind, score in (self.entries[entry_id] for entry_id in self._matches(prefix, k))
+        ]
+
+    def stats(self):
+        return {
+            'suggestions': len(self.entries),
+            'keys': len(self._keys),
+            'tables': len(self._tables),
+            'types': dict(Counter(kind for _, kind, _ in self.entries))
+        }
+
+
+def load_popular_queries(connect, window_hours, limit):
+    """Popular normalized queries from search_logs; empty when the database is unavailable"""
+    if limit <= 0:
+        return []
+    conn = None
+    try:
+        conn = connect()
+        cursor = conn.cursor(dictionary=True)
+        queries, _ = fetch_popular_queries(cursor, window_hours, limit)
+        return queries
+    except Exception as e:
+        print(f"⚠️ Popular queries unavailable for suggestions: {e}")
+        return []
+    finally:
+        if conn is not None:
+            conn.close()
@@ -0,0 +1,162 @@
+"""
+Per-request tracing and slow-query logging for the StyleMe RAG service.
+
+Search requests record a tree of timed spans (history lookup, embedding, FAISS
+search, LLM call, ...). Clients can ask for the tree in the response with
+`"debug": true` in the JSON body or an `X-Debug-Trace: 1` header, and requests
+slower than SLOW_QUERY_THRESHOLD_MS are written with their full breakdown to a
+rotating slow-query log.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+
+from flask import request, make_response
+
+# Innermost open span of the current request (copied into LangChain worker threads)
+_current_span = ContextVar('rag_current_span', default=None)
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 2000))
+SLOW_QUERY_LOG_PATH = os.getenv('SLOW_QUERY_LOG_PATH', os.path.join('logs', 'slow_queries.log'))
+SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv('SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024))
+SLOW_QUERY_LOG_BACKUPS = int(os.getenv('SLOW_QUERY_LOG_BACKUPS', 5))
+
+_slow_logger = None
+_slow_logger_lock = threading.Lock()
+
+
+class Span:
+    """One timed step of a request, with nested child spans"""
+
+    def __init__(self, name, attributes=None):
+        self.name = name
+        self.attributes = attributes or {}
+        self.children = []
+        self.start = time.perf_counter()
+        self.duration = None
+        self._lock = threading.Lock()
+
+    def add_child(self, span):
+        # Children can be added concurrently from RunnableParallel branches
+        with self._lock:
+            self.children.append(span)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.start
+
+    def to_dict(self, origin=None):
+        origin = self.start if origin is None else origin
+        duration = self.duration if self.duration is not None else time.perf_counter() - self.start
+        node = {
+            'name': self.name,
+            'start_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': round(duration * 1000, 3)
+        }
+        if self.attributes:
+            node['attributes'] = self.attributes
+        if self.children:
+            node['children'] = [child.to_dict(origin) for child in sorted(self.children, key=lambda s: s.start)]
+        return node
+
+
+@contextmanager
+def span(name, **attributes):
+    """Record a child span of the current request; a no-op outside a trace"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(name, attributes)
+    parent.add_child(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.finish()
+        _current_span.reset(token)
+
+
+def current_span():
+    """Return the innermost open span, or None outside a traced request"""
+    return _current_span.get()
+
+
+def _get_slow_logger():
+    global _slow_logger
+    with _slow_logger_lock:
+        if _slow_logger is None:
+            log_dir = os.path.dirname(SLOW_QUERY_LOG_PATH)
+            if log_dir:
+                os.makedirs(log_dir, exist_ok=True)
+            logger = logging.getLogger('styleme.rag.slow_queries')
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            handler = RotatingFileHandler(
+                SLOW_QUERY_LOG_PATH,
+                maxBytes=SLOW_QUERY_LOG_MAX_BYTES,
+                backupCount=SLOW_QUERY_LOG_BACKUPS,
+                encoding='utf-8'
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            _slow_logger = logger
+        return _slow_logger
+
+
+def log_slow_query(endpoint, trace, status_code):
+    """Append one JSON line with the full span breakdown to the slow-query log"""
+    try:
+        _get_slow_logger().info(json.dumps({
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'endpoint': endpoint,
+            'status': status_code,
+            'duration_ms': round(trace.duration * 1000, 3),
+            'trace': trace.to_dict()
+        }, default=str))
+    except Exception as e:
+        print(f"Error writing slow query log: {e}")
+
+
+def _trace_requested(payload):
+    if request.headers.get('X-Debug-Trace', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return isinstance(payload, dict) and bool(payload.get('debug'))
+
+
+def traced_request(endpoint):
+    """Decorator tracing a Flask search view (opt-in response trace + slow-query log)"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            payload = request.get_json(silent=True)
+            attributes = {}
+            if isinstance(payload, dict):
+                attributes = {'user_id': payload.get('user_id'), 'query': payload.get('query')}
+
+            root = Span(endpoint, attributes)
+            token = _current_span.set(root)
+            try:
+                response = make_response(fn(*args, **kwargs))
+            finally:
+                root.finish()
+                _current_span.reset(token)
+
+            if SLOW_QUERY_THRESHOLD_MS > 0 and root.duration * 1000 >= SLOW_QUERY_THRESHOLD_MS:
+                log_slow_query(endpoint, root, response.status_code)
+
+            if _trace_requested(payload) and response.is_json:
+                body = response.get_json()
+                if isinstance(body, dict):
+                    body['trace'] = root.to_dict()
+                    response.set_data(json.dumps(body, default=str))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,110 @@
+"""
+Per-user preference vectors for the StyleMe RAG service.
+
+Instead of pasting a user's recent queries into every prompt, each user gets a
+compact preference vector: an exponentially decayed mean of their query
+embeddings, updated incrementally after every search. Retrieval blends it with
+the query vector, so personalization happens in the FAISS search itself and
+works without the LLM. The prompt then only needs a short, bounded summary.
+
+Vectors are seeded lazily from the user's stored search history on first
+use and kept in an LRU (by user) map.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def _unit(vector):
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def blend(query_vector, profile_vector, weight):
+    """Mix a profile into a query embedding; result is re-normalised like the index vectors"""
+    query = np.asarray(query_vector, dtype=np.float32)
+    if profile_vector is None or weight <= 0:
+        return query
+    return _unit((1 - weight) * query + weight * profile_vector).astype(np.float32)
+
+
+class UserPreferenceVectors:
+    """LRU map of user_id -> exponentially decayed mean of query embeddings"""
+
+    def __init__(self, seed_loader, decay=0.8, max_users=20000):
+        # seed_loader(user_id) -> query embeddings from stored history, oldest first
+        self._seed_loader = seed_loader
+        self.decay = decay
+        self.max_users = max_users
+
+        # user_id -> [decayed sum of embeddings, decayed weight, queries seen]
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _accumulate(self, state, vector):
+        state[0] = self.decay * state[0] + np.asarray(vector, dtype=np.float32)
+        state[1] = self.decay * state[1] + 1.0
+        state[2] += 1
+
+    def _state(self, user_id):
+        """Cached state for a user, seeded from stored history on first use (None if no history)"""
+        with self._lock:
+            state = self._profiles.get(user_id)
+            if state is not None:
+                self._profiles.move_to_end(user_id)
+                return state
+
+        # Seed outside the lock so embedding one user's history doesn't block others
+        vectors = self._seed_loader(user_id)
+        if not vectors:
+            return None
+        seeded = [np.zeros(len(vectors[0]), dtype=np.float32), 0.0, 0]
+        for vector in vectors:
+            self._accumulate(seeded, vector)
+
+        with self._lock:
+            state = self._profiles.setdefault(user_id, seeded)
+            self._store(user_id, state)
+            return state
+
+    def _store(self, user_id, state):
+        self._profiles[user_id] = state
+        self._profiles.move_to_end(user_id)
+        while len(self._profiles) > self.max_users:
+            self._profiles.popitem(last=False)
+
+    def get(self, user_id):
+        """Unit-length preference vector for a user, or None without any history"""
+        state = self._state(user_id)
+        if state is None:
+            return None
+        with self._lock:
+            return _unit(state[0] / state[1]).astype(np.float32)
+
+    def update(self, user_id, query_vector):
+        """Fold a new query embedding into the user's decayed mean"""
+        state = self._state(user_id)
+        with self._lock:
+            if state is None:
+                state = self._profiles.setdefault(user_id, [np.zeros(len(query_vector), dtype=np.float32), 0.0, 0])
+            self._store(user_id, state)
+            self._accumulate(state, query_vector)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._profiles.clear()
+            else:
+                self._profiles.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            dimension = len(next(iter(self._profiles.values()))[0]) if self._profiles else 0
+            return {
+                'users': len(self._profiles),
+                'max_users': self.max_users,
+                'decay': self.decay,
+                'bytes': len(self._profiles) * dimension * 4
+            }